@@ -1,4 +1,8 @@
 from .database import db_session
+from . import config, models
+from .modules.articles import article_ids
+from .modules.prefetch import queue_changed
+from .modules.users import users_changed
 from .models import User, ArticleMetadata, CodeFirstPass, CodeSecondPass, CodeEventCreator, ArticleQueue, SecondPassQueue, EventCreatorQueue, Event
 from sqlalchemy import func, or_, distinct, desc
 from datetime import datetime
@@ -15,6 +19,7 @@ from math import factorial
 def addUser(username, password, authlevel):
     added = db_session.add(User(username = username, password = password, authlevel = authlevel))
     db_session.commit()
+    users_changed(getattr(config, 'CACHE_DIR', None))
 
     return added
 
@@ -27,6 +32,7 @@ def addUsers(filename):
 
     added = db_session.add_all(users)
     db_session.commit()
+    users_changed(getattr(config, 'CACHE_DIR', None))
 
     return added
 
@@ -36,6 +42,8 @@ def deleteUser(username):
 
     user_r = db_session.delete(user)
     db_session.commit()
+    users_changed(getattr(config, 'CACHE_DIR', None))
+    queue_changed(getattr(config, 'CACHE_DIR', None), '1')
 
     if user_r:
         print("User %s deleted, %d article queue items deleted." % (username, aqs) )
@@ -56,7 +64,7 @@ def generateSample(n, db_name = None, pass_number = '1', publication = None):
 
         ## query existing articles and all articles in the specified database.
         existing = [x[0] for x in db_session.query(distinct(ArticleQueue.article_id)).all()]
-        query    = [x.id for x in db_session.query(ArticleMetadata).filter_by(db_name = db_name).all()]
+        query    = article_ids(db_session, models, db_name = db_name)
     elif pass_number == '2':
         ## query existing articles
         existing = [x[0] for x in db_session.query(distinct(SecondPassQueue.article_id)).all()]
@@ -89,11 +97,9 @@ def generateSample(n, db_name = None, pass_number = '1', publication = None):
         ## database will be implicit
         if publication:
             publication = "-".join(publication.split())
-            query = [x.id for x in db_session.query(ArticleMetadata).\
-                     filter(ArticleMetadata.db_id.like('%s%%' % publication)).all()]
+            query = article_ids(db_session, models, ArticleMetadata.db_id.like('%s%%' % publication))
         else:
-            query = [x.id for x in db_session.query(ArticleMetadata).\
-                     filter_by(db_name = db_name).all()]
+            query = article_ids(db_session, models, db_name = db_name)
 
     ## if articles aren't in existing queues, add them to the population
     population = list(set(query) - set(existing))
@@ -113,7 +119,7 @@ def generateSample(n, db_name = None, pass_number = '1', publication = None):
 
 
 def getArticlesbyID(ids):
-    articles = [x.id for x in db_session.query(ArticleMetadata).filter(ArticleMetadata.id.in_(ids)).all()]
+    articles = article_ids(db_session, models, ArticleMetadata.id.in_(ids))
     return articles
 
 
@@ -201,6 +207,7 @@ def assignmentToCoders(article_ids, coder_ids, pass_number):
 
     db_session.add_all(to_add)
     db_session.commit()
+    queue_changed(getattr(config, 'CACHE_DIR', None), pass_number)
 
     return len(to_add)
 
@@ -260,6 +267,7 @@ def transferCoderToCoder(coder1, coder2, pass_number = '1', n_to_assign = 0):
     #     return -1
 
     db_session.commit()
+    queue_changed(getattr(config, 'CACHE_DIR', None), pass_number)
     return n_transferred
 
 
@@ -323,6 +331,7 @@ def deleteDupes(coder):
             db_session.delete(aq)
 
     db_session.commit()
+    queue_changed(getattr(config, 'CACHE_DIR', None), '2')
 
 
 def distributeDupes(coder1, coder2_list):
@@ -380,6 +389,7 @@ def distributeDupes(coder1, coder2_list):
     for k in to_add.keys():
         db_session.add_all(to_add[k])
     db_session.commit()
+    queue_changed(getattr(config, 'CACHE_DIR', None), '2')
 
     return "%d reassigned, %d could not be reassigned." % (len(to_del), len(nope))
 
@@ -401,6 +411,7 @@ def fix_dupes():
         db_session.delete(aq)
 
     db_session.commit()
+    queue_changed(getattr(config, 'CACHE_DIR', None), '1')
 
     return len(to_del)
 
@@ -1,13 +1,32 @@
-from sqlalchemy import Column, Date, DateTime, Integer, String, Unicode, ForeignKey, UniqueConstraint, Text, UnicodeText
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Date, DateTime, Float, Index, Integer, LargeBinary, String, Unicode, ForeignKey, UniqueConstraint, Text, UnicodeText, func, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, backref, deferred
 from flask_login import UserMixin
-from sqlalchemy.sql.expression import desc
+from sqlalchemy.sql.expression import BindParameter, ColumnElement, desc
+from . import config
 from .database import Base
+from .modules.compress import compress_text, decompress_text
+from .modules.fulltext import columns as fulltext_columns
 import datetime as dt
 from pytz import timezone
 
 central = timezone('US/Central')
 
+class MatchAgainst(ColumnElement):
+    """ MySQL MATCH (...) AGAINST (... IN BOOLEAN MODE). Evaluates to the relevance score. """
+    type = Float()
+
+    def __init__(self, columns, query):
+        self.columns = columns
+        self.query   = query if isinstance(query, BindParameter) else literal(query)
+
+@compiles(MatchAgainst, 'mysql')
+def _compile_match_against(element, compiler, **kw):
+    return "MATCH (%s) AGAINST (%s IN BOOLEAN MODE)" % (
+        ", ".join(compiler.process(c, **kw) for c in element.columns),
+        compiler.process(element.query, **kw))
+
 class CoderArticleAnnotation(Base):
     __tablename__ = 'coder_article_annotation'
     id         = Column(Integer, primary_key=True)
@@ -39,7 +58,11 @@ class CanonicalEvent(Base):
     notes        = Column(UnicodeText)
     last_updated = Column(DateTime)
 
-    UniqueConstraint('key', name = 'unique1')
+    ## key is TEXT, so MySQL indexes a prefix of it
+    __table_args__ = (
+        Index('unique1', 'key', unique = True, mysql_length = 255),
+        Index('ft_canonical_event', *fulltext_columns['canonical_event'], mysql_prefix = 'FULLTEXT'),
+    )
 
     def __init__(self, coder_id, key, description, notes = None):
         self.coder_id     = coder_id
@@ -60,7 +83,9 @@ class CanonicalEventLink(Base):
     cec_id       = Column(Integer, ForeignKey('coder_event_creator.id'), nullable = False)
     timestamp    = Column(DateTime)
 
-    UniqueConstraint('canonical_id', 'cec_id', name = 'unique1')
+    __table_args__ = (
+        UniqueConstraint('canonical_id', 'cec_id', name = 'unique1'),
+    )
 
     def __init__(self, coder_id, canonical_id, cec_id):
         self.coder_id     = coder_id
@@ -81,7 +106,10 @@ class CanonicalEventRelationship(Base):
     relationship_type = Column(Text)
     timestamp         = Column(DateTime)
 
-    UniqueConstraint('canonical_id1', 'canonical_id2', 'relationship_type', name = 'unique1')
+    __table_args__ = (
+        Index('unique1', 'canonical_id1', 'canonical_id2', 'relationship_type', unique = True,
+            mysql_length = {'relationship_type': 64}),
+    )
 
     def __init__(self, coder_id, canonical_id1, canonical_id2, relationship_type):
         self.coder_id          = coder_id
@@ -95,6 +123,29 @@ class CanonicalEventRelationship(Base):
             (self.canonical_id1, self.canonical_id2, self.relationship_type)
 
 
+class CanonicalEventClosure(Base):
+    """ Every ancestor of every canonical event in the relationship hierarchy, with the
+        number of paths of each length between them. Maintained by modules/hierarchy.py. """
+    __tablename__ = 'canonical_event_closure'
+    ancestor_id   = Column(Integer, ForeignKey('canonical_event.id'), primary_key = True, autoincrement = False)
+    descendant_id = Column(Integer, ForeignKey('canonical_event.id'), primary_key = True, autoincrement = False)
+    depth         = Column(Integer, primary_key = True, autoincrement = False)
+    paths         = Column(Integer, nullable = False)
+
+    __table_args__ = (
+        Index('ix_descendant', 'descendant_id', 'ancestor_id', 'depth'),
+    )
+
+    def __init__(self, ancestor_id, descendant_id, depth, paths):
+        self.ancestor_id   = ancestor_id
+        self.descendant_id = descendant_id
+        self.depth         = depth
+        self.paths         = paths
+
+    def __repr__(self):
+        return '<CanonicalEventClosure %r -> %r (%r)>' % (self.descendant_id, self.ancestor_id, self.depth)
+
+
 class EventFlag(Base):
     __tablename__ = 'event_flag'
     id        = Column(Integer, primary_key=True)
@@ -103,7 +154,10 @@ class EventFlag(Base):
     flag      = Column(Text)
     timestamp = Column(DateTime)
 
-    UniqueConstraint('event_id', name = 'unique1')
+    ## not unique: an event can have several flags
+    __table_args__ = (
+        Index('ix_event_id', 'event_id'),
+    )
 
     def __init__(self, coder_id, event_id, flag):
         self.coder_id  = coder_id
@@ -132,7 +186,11 @@ class EventMetadata(Base):
     issue        = Column(Text)
     racial_issue = Column(Text)
 
-    UniqueConstraint('event_id', name = 'unique1')
+    ## not unique, since generate_event_metadata.py can write an event twice
+    __table_args__ = (
+        Index('ix_event_id', 'event_id'),
+        Index('ft_event_metadata', *fulltext_columns['event_metadata'], mysql_prefix = 'FULLTEXT'),
+    )
 
     def __init__(self, coder_id, event_id, article_id, article_desc, desc, 
         location, start_date, publication, pub_date, title, 
@@ -162,7 +220,9 @@ class RecentCanonicalEvent(Base):
     canonical_id  = Column(Integer, ForeignKey('canonical_event.id'))
     last_accessed = Column(DateTime)
 
-    UniqueConstraint('coder_id', 'canonical_id', name = 'unique1')
+    __table_args__ = (
+        UniqueConstraint('coder_id', 'canonical_id', name = 'unique1'),
+    )
 
     def __init__(self, coder_id, canonical_id):
         self.coder_id      = coder_id
@@ -180,7 +240,9 @@ class RecentEvent(Base):
     event_id      = Column(Integer, ForeignKey('event.id'))
     last_accessed = Column(DateTime)
 
-    UniqueConstraint('coder_id', 'event_id', name = 'unique1')
+    __table_args__ = (
+        UniqueConstraint('coder_id', 'event_id', name = 'unique1'),
+    )
 
     def __init__(self, coder_id, event_id):
         self.coder_id      = coder_id
@@ -200,7 +262,10 @@ class RecentSearch(Base):
     value         = Column(Text)
     last_accessed = Column(DateTime)
 
-    UniqueConstraint('coder_id', 'field', 'comparison', 'value', name = 'unique1')
+    __table_args__ = (
+        Index('unique1', 'coder_id', 'field', 'comparison', 'value', unique = True,
+            mysql_length = {'field': 64, 'comparison': 16, 'value': 255}),
+    )
 
     def __init__(self, coder_id, field, comparison, value):
         self.coder_id      = coder_id
@@ -269,6 +334,12 @@ class CodeEventCreator(Base):
     coder_id   = Column(Integer, ForeignKey('user.id'))
     timestamp  = Column(DateTime)
 
+    __table_args__ = (
+        Index('ix_article_coder', 'article_id', 'coder_id'),
+        Index('ix_event_coder', 'event_id', 'coder_id'),
+        Index('ix_article_variable_coder', 'article_id', 'variable', 'coder_id'),
+    )
+
     def __init__(self, article_id, event_id, variable, value, coder_id, text = None):
         self.article_id = article_id
         self.event_id   = event_id
@@ -303,7 +374,10 @@ class ArticleQueue(Base):
     coder_id   = Column(Integer, ForeignKey('user.id'), nullable = False)
     coded_dt   = Column(DateTime)
 
-    UniqueConstraint('article_id', 'coder_id', name = 'unique1')
+    __table_args__ = (
+        UniqueConstraint('article_id', 'coder_id', name = 'unique1'),
+        Index('ix_coder_coded', 'coder_id', 'coded_dt'),
+    )
 
     def __init__(self, article_id, coder_id):
         self.article_id = article_id
@@ -320,7 +394,10 @@ class SecondPassQueue(Base):
     coder_id   = Column(Integer, ForeignKey('user.id'), nullable = False)
     coded_dt   = Column(DateTime)
 
-    UniqueConstraint('article_id', 'coder_id', name = 'unique1')
+    __table_args__ = (
+        UniqueConstraint('article_id', 'coder_id', name = 'unique1'),
+        Index('ix_coder_coded', 'coder_id', 'coded_dt'),
+    )
 
     def __init__(self, article_id, coder_id):
         self.article_id = article_id
@@ -337,7 +414,10 @@ class EventCreatorQueue(Base):
     coder_id   = Column(Integer, ForeignKey('user.id'), nullable = False)
     coded_dt   = Column(DateTime)
 
-    UniqueConstraint('article_id', 'coder_id', name = 'unique1')
+    __table_args__ = (
+        UniqueConstraint('article_id', 'coder_id', name = 'unique1'),
+        Index('ix_coder_coded', 'coder_id', 'coded_dt'),
+    )
 
     def __init__(self, article_id, coder_id):
         self.article_id = article_id
@@ -358,8 +438,16 @@ class ArticleMetadata(Base):
     publication         = Column(String(511))
     source_description  = Column(String(511))
     ## FIXME: Collation arg may will break anything but MySQL 5.7
-    text                = Column(UnicodeText(4194300,
-                                 collation='utf8mb4_general_ci'))
+    ## deferred: only loaded on access or with undefer(), since it can be several MB
+    ## read and write the body through .text, which handles compression
+    text_raw            = deferred(Column('text', UnicodeText(4194300,
+                                 collation='utf8mb4_general_ci')))
+
+    ## compress bodies on write. text_compressed is only mapped with COMPRESS_ARTICLES,
+    ## since the column is added by scripts/migrate_compress_articles.py
+    compressed = bool(getattr(config, 'COMPRESS_ARTICLES', False))
+    if compressed:
+        text_compressed = deferred(Column(LargeBinary(16777215)))
 
     firsts  = relationship("CodeFirstPass",  backref = backref("article_metadata", order_by = id))
     seconds = relationship("CodeSecondPass", backref = backref("article_metadata", order_by = id))
@@ -383,10 +471,75 @@ class ArticleMetadata(Base):
         self.source_description = source_description
         self.text               = text
 
+    @hybrid_property
+    def text(self):
+        if self.compressed and self.text_compressed is not None:
+            return decompress_text(self.text_compressed)
+        return self.text_raw
+
+    @text.setter
+    def text(self, value):
+        if not self.compressed:
+            self.text_raw = value
+        elif value is not None:
+            self.text_compressed = compress_text(value)
+            self.text_raw        = None
+        else:
+            self.text_compressed = None
+            self.text_raw        = None
+
+    @text.expression
+    def text(cls):
+        if not cls.compressed:
+            return cls.text_raw
+        return func.coalesce(cls.text_raw, func.uncompress(cls.text_compressed))
+
     def __repr__(self):
         return '<ArticleMetadata %r (%r)>' % (self.title, self.id)
 
 
+class ArticleIngest(Base):
+    """ Parsed title and metadata line of an article, written by scripts/ingest_paragraphs.py. """
+    __tablename__ = 'article_ingest'
+    article_id  = Column(Integer, ForeignKey('article_metadata.id'), primary_key = True)
+    fingerprint = Column(String(64))
+    title       = Column(Unicode(1024))
+    meta        = Column(UnicodeText)
+    paragraphs  = Column(Integer)
+    timestamp   = Column(DateTime)
+
+    def __init__(self, article_id, fingerprint, title, meta, paragraphs):
+        self.article_id  = article_id
+        self.fingerprint = fingerprint
+        self.title       = title
+        self.meta        = meta
+        self.paragraphs  = paragraphs
+        self.timestamp   = dt.datetime.now(tz = central).replace(tzinfo = None)
+
+    def __repr__(self):
+        return '<ArticleIngest %r (%r)>' % (self.article_id, self.fingerprint)
+
+
+class ArticleParagraph(Base):
+    """ Cleaned paragraphs of an article, with character offsets into its plain text. """
+    __tablename__ = 'article_paragraph'
+    article_id      = Column(Integer, ForeignKey('article_metadata.id'), primary_key = True)
+    paragraph_index = Column(Integer, primary_key = True, autoincrement = False)
+    text            = Column(UnicodeText)
+    start_offset    = Column(Integer, nullable = False)
+    end_offset      = Column(Integer, nullable = False)
+
+    def __init__(self, article_id, paragraph_index, text, start_offset, end_offset):
+        self.article_id      = article_id
+        self.paragraph_index = paragraph_index
+        self.text            = text
+        self.start_offset    = start_offset
+        self.end_offset      = end_offset
+
+    def __repr__(self):
+        return '<ArticleParagraph %r-%r>' % (self.article_id, self.paragraph_index)
+
+
 ## All these are manually added
 class User(Base, UserMixin):
     __tablename__ = 'user'
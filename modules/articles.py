@@ -0,0 +1,29 @@
+"""
+Article queries that keep the article text out of the SELECT unless asked.
+
+ArticleMetadata defers its text columns, so list pages, queues and
+assignment only fetch metadata. Pages that show an article ask for the
+text up front, so it isn't fetched with a second statement on first access.
+Models are passed in so this can be tested without the app.
+"""
+
+from sqlalchemy.orm import undefer
+
+## deferred ArticleMetadata attributes holding the article text. text_compressed
+## is only mapped when COMPRESS_ARTICLES is on.
+TEXT_COLUMNS = ['text_raw', 'text_compressed']
+
+def article_query(session, models, text = False):
+    """ Query for ArticleMetadata. With text, the text columns are loaded with the rest of the row. """
+    ArticleMetadata = models.ArticleMetadata
+    query = session.query(ArticleMetadata)
+    if text:
+        query = query.options(*[undefer(getattr(ArticleMetadata, x))
+            for x in TEXT_COLUMNS if hasattr(ArticleMetadata, x)])
+    return query
+
+
+def article_ids(session, models, *criteria, **filters):
+    """ Ids of the articles matching the criteria, or filter_by() keywords. Fetches nothing else. """
+    ArticleMetadata = models.ArticleMetadata
+    return [x[0] for x in session.query(ArticleMetadata.id).filter(*criteria).filter_by(**filters).all()]
@@ -0,0 +1,127 @@
+"""
+In-memory index for autocompleting canonical event keys.
+
+Keys are matched case-insensitively, like LIKE under MySQL's default
+collation. Prefix matches come from binary search over a sorted array of
+the lowercased keys. Substring matches come from an n-gram index, which
+keeps, for every bigram and trigram, the sorted list of keys containing
+it. Only keys on the list of the term's rarest n-gram can contain the
+term, so that list is walked in order, checking each key with a plain
+substring test, until there are enough matches. One-letter terms walk
+the whole array the same way.
+
+Results are the exact match, then prefix matches, then other substring
+matches, each group in alphabetical order.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+def _grams(s, n):
+    return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+
+class KeyIndex(object):
+    def __init__(self, keys = (), sizes = (2, 3)):
+        self.sizes  = sizes
+        self._lock  = threading.Lock()
+        self._keys  = {}
+
+        for key in keys:
+            self._keys[key] = key.lower()
+        self._array = sorted((lower, key) for key, lower in self._keys.items())
+
+        ## entries are added in order, so every list starts out sorted
+        grams = defaultdict(list)
+        for entry in self._array:
+            for g in self._entry_grams(entry[0]):
+                grams[g].append(entry)
+        self._grams = dict(grams)
+
+    def _entry_grams(self, lower):
+        return {lower[i:i + n] for n in self.sizes for i in range(len(lower) - n + 1)}
+
+    def add(self, key):
+        with self._lock:
+            if key in self._keys:
+                return
+
+            lower = key.lower()
+            entry = (lower, key)
+            self._keys[key] = lower
+            insort(self._array, entry)
+            for g in self._entry_grams(lower):
+                insort(self._grams.setdefault(g, []), entry)
+
+    def remove(self, key):
+        with self._lock:
+            lower = self._keys.pop(key, None)
+            if lower is None:
+                return
+
+            entry = (lower, key)
+            del self._array[bisect_left(self._array, entry)]
+            for g in self._entry_grams(lower):
+                entries = self._grams[g]
+                del entries[bisect_left(entries, entry)]
+                if not entries:
+                    del self._grams[g]
+
+    def _prefix(self, term, limit):
+        matches = []
+        i = bisect_left(self._array, (term, ''))
+        while i < len(self._array) and len(matches) < limit and self._array[i][0].startswith(term):
+            matches.append(self._array[i])
+            i += 1
+        return matches
+
+    def _postings(self, term):
+        """ The shortest list of entries which can contain term. """
+        n = max([x for x in self.sizes if x <= len(term)] or [0])
+        if not n:
+            return self._array
+
+        shortest = None
+        for g in _grams(term, n):
+            entries = self._grams.get(g)
+            if not entries:
+                return []
+            if shortest is None or len(entries) < len(shortest):
+                shortest = entries
+        return shortest
+
+    def _substring(self, term, limit):
+        matches = []
+        for lower, key in self._postings(term):
+            ## prefix matches have been found already
+            if term in lower and not lower.startswith(term):
+                matches.append((lower, key))
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def search(self, term, limit = 20):
+        """ Up to limit keys containing term. """
+        term = term.lower()
+        if not term:
+            return []
+
+        with self._lock:
+            prefix = self._prefix(term, limit + 1)
+
+            ## the exact match first, if there is one
+            exact   = [m for m in prefix if m[0] == term]
+            prefix  = [m for m in prefix if m[0] != term]
+            results = (exact + prefix)[:limit]
+
+            if len(results) < limit:
+                results += self._substring(term, limit - len(results))
+
+        return [k for _, k in results]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
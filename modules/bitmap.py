@@ -0,0 +1,227 @@
+"""
+In-memory bitmap index for candidate search filters.
+
+Rows of event_metadata are numbered by position in id order, and for each
+distinct value of an indexed column there is a bitmap of the rows holding
+it. Bitmaps are Python ints, so AND, OR and NOT run in C. As in roaring
+bitmaps, rare values are kept as sorted arrays of positions instead, which
+is far smaller, and only turned into ints when a filter needs them.
+
+Filters are (field, compare, value) rows, as in the adjudication search
+form. Comparisons follow MySQL: = is case-insensitive and ignores trailing
+spaces, LIKE is case-insensitive, and NULL never matches. Date columns
+also have a bitmap per month, so a range is a handful of month bitmaps
+plus the days at its end. match() returns None for any filter it can't
+answer exactly, and the caller falls back to SQL.
+"""
+
+import datetime as dt
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+def _normal(value):
+    return str(value).lower().rstrip(' ')
+
+
+def _positions_to_int(positions, nbytes):
+    buf = bytearray(nbytes)
+    for p in positions:
+        buf[p >> 3] |= 1 << (p & 7)
+    return int.from_bytes(bytes(buf), 'little')
+
+
+def _container(positions, n):
+    """ An int bitmap for common values, a sorted array of positions for rare ones. """
+    if len(positions) * 32 < n:
+        return array('I', positions)
+    return _positions_to_int(positions, (n + 7) // 8)
+
+
+def _union(containers, nbytes):
+    bits = 0
+    buf  = None
+    for c in containers:
+        if isinstance(c, int):
+            bits |= c
+        else:
+            if buf is None:
+                buf = bytearray(nbytes)
+            for p in c:
+                buf[p >> 3] |= 1 << (p & 7)
+
+    if buf is not None:
+        bits |= int.from_bytes(bytes(buf), 'little')
+    return bits
+
+
+def _date(value):
+    if isinstance(value, dt.date):
+        return value
+    try:
+        return dt.datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def popcount(bits):
+    if hasattr(bits, 'bit_count'):
+        return bits.bit_count()
+    return bin(bits).count('1')
+
+
+class ColumnBitmaps(object):
+    """ Bitmaps for each distinct value of one column, given its values in row order. """
+
+    def __init__(self, values, is_date = False, multi = False):
+        """ With multi, each row holds a list of values, as for a table joined in
+            with several rows per row of this one. """
+        self.n       = len(values)
+        self.nbytes  = (self.n + 7) // 8
+        self.is_date = is_date
+        self.multi   = multi
+
+        by_value = {}
+        for i, v in enumerate(values):
+            for x in (v if multi else [v]):
+                if x is not None:
+                    by_value.setdefault(x, []).append(i)
+
+        self.values   = {v: _container(p, self.n) for v, p in by_value.items()}
+        self.not_null = _union(self.values.values(), self.nbytes)
+
+        ## values which MySQL's = treats as the same
+        self.normal = {}
+        for v in self.values:
+            self.normal.setdefault(_normal(v), []).append(v)
+
+        if is_date:
+            self.days   = sorted(self.values)
+            months      = {}
+            for d, p in by_value.items():
+                months.setdefault((d.year, d.month), []).extend(p)
+            self.months = sorted(months)
+            ## there are few months, so they are always kept as ints, ready to OR together
+            self.month_bits = {m: _positions_to_int(p, self.nbytes) for m, p in months.items()}
+
+    def _bits(self, values):
+        return _union([self.values[v] for v in values], self.nbytes)
+
+    def eq(self, value):
+        if self.is_date:
+            d = _date(value)
+            return None if d is None else self._bits([d] if d in self.values else [])
+        return self._bits(self.normal.get(_normal(value), []))
+
+    def ne(self, value, null_matches = False):
+        """ Rows with a value other than value, and rows without one if null_matches. """
+        eq = self.eq(value)
+        if eq is None:
+            return None
+
+        rows = ((1 << self.n) - 1) & ~self.not_null if null_matches else 0
+        if self.multi:
+            ## a row matches if any of its values does
+            d = _date(value) if self.is_date else None
+            others = [v for v in self.values if (v != d if self.is_date else _normal(v) != _normal(value))]
+            return rows | self._bits(others)
+        return rows | (self.not_null & ~eq)
+
+    def like(self, compare, value):
+        """ contains, starts or ends. None for patterns with wildcards of their own. """
+        if self.is_date or '%' in value or '_' in value:
+            return None
+
+        value = value.lower()
+        test  = {'contains': lambda x: value in x,
+                 'starts':   lambda x: x.startswith(value),
+                 'ends':     lambda x: x.endswith(value)}[compare]
+        return self._bits([v for v in self.values if test(str(v).lower())])
+
+    def range(self, compare, value):
+        """ lt, le, gt or ge, on date columns only. """
+        d = _date(value) if self.is_date else None
+        if d is None:
+            return None
+
+        month = (d.year, d.month)
+        if compare in ['lt', 'le']:
+            months = self.months[:bisect_left(self.months, month)]
+            lo     = bisect_left(self.days, dt.date(d.year, d.month, 1))
+            hi     = bisect_left(self.days, d) if compare == 'lt' else bisect_right(self.days, d)
+            days   = self.days[lo:hi]
+        else:
+            months = self.months[bisect_right(self.months, month):]
+            lo     = bisect_right(self.days, d) if compare == 'gt' else bisect_left(self.days, d)
+            days   = [x for x in self.days[lo:] if (x.year, x.month) == month]
+
+        return _union([self.month_bits[m] for m in months] + [self.values[x] for x in days], self.nbytes)
+
+
+class BitmapIndex(object):
+    """ Bitmaps over the rows of a table, numbered by position in id order. """
+
+    def __init__(self, ids, columns, date_columns = (), keys = None):
+        """ ids in ascending order, and a list of values in the same order for each column.
+            keys are columns which other tables join on, kept as they are. """
+        self.ids     = list(ids)
+        self.n       = len(self.ids)
+        self.all     = (1 << self.n) - 1
+        self.keys    = keys or {}
+        self.columns = {name: ColumnBitmaps(values, name in date_columns) for name, values in columns.items()}
+
+    def joined(self, key, mapping):
+        """ ColumnBitmaps for a column of another table, given as a mapping from values of
+            this table's key column to lists of values. """
+        return ColumnBitmaps([mapping.get(k, []) for k in self.keys[key]], multi = True)
+
+    def filter(self, column, compare, value, null_matches_ne = False):
+        """ Bitmap of rows matching one filter, or None if it can't be answered here. """
+        c = column
+        if compare == 'eq':
+            return c.eq(value)
+        elif compare == 'ne':
+            ## NULL != x isn't true in SQL, unless the caller adds OR IS NULL
+            return c.ne(value, null_matches_ne)
+        elif compare in ['contains', 'starts', 'ends']:
+            return c.like(compare, value)
+        elif compare in ['lt', 'le', 'gt', 'ge']:
+            return c.range(compare, value)
+        return None
+
+    def match(self, filters, extra = None, null_matches_ne = ()):
+        """ Bitmap of rows matching every (field, compare, value) filter, or None.
+            extra holds ColumnBitmaps for columns joined in from other tables. """
+        columns = dict(self.columns)
+        columns.update(extra or {})
+
+        bits = self.all
+        for field, compare, value in filters:
+            if field not in columns:
+                return None
+
+            b = self.filter(columns[field], compare, value, field in null_matches_ne)
+            if b is None:
+                return None
+            bits &= b
+        return bits
+
+    def page(self, bits, after_id = None, size = 100):
+        """ Ids of the first size matching rows after after_id, in id order,
+            and whether there are more. """
+        start  = 0 if after_id is None else bisect_right(self.ids, after_id)
+        x      = bits >> start
+        nwords = (x.bit_length() + 63) // 64
+        words  = memoryview(x.to_bytes(nwords * 8, sys.byteorder)).cast('Q')
+
+        ## a word at a time, stopping once the page is full
+        ids = []
+        for w, word in enumerate(words):
+            while word:
+                if len(ids) == size:
+                    return ids, True
+                low = word & -word
+                ids.append(self.ids[start + w * 64 + low.bit_length() - 1])
+                word ^= low
+
+        return ids, False
@@ -0,0 +1,335 @@
+"""
+Small caching helpers shared by the views.
+
+LRUCache is a bounded, thread-safe, in-process cache. DiskCache is an
+optional second tier which lives in a directory shared by every worker
+process on the machine, so an entry computed by one worker can be served
+by another. TieredCache puts the two together.
+
+Generation is a token which changes whenever the data behind a cache does.
+Caches whose entries can't be keyed on the data itself make the current
+token part of their keys, so a bump makes every older entry unreachable.
+Derived holds a single value built from the database, such as an index,
+and rebuilds it when its generation moves on.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """ Bounded least-recently-used cache, safe to share between threads. """
+
+    def __init__(self, maxsize = 512):
+        self.maxsize = maxsize
+        self.hits    = 0
+        self.misses  = 0
+        self._data   = OrderedDict()
+        self._lock   = threading.Lock()
+
+    def get(self, key, default = None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            ## evict the least recently used entries
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last = False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+            'hits': self.hits, 'misses': self.misses}
+
+
+class DiskCache(object):
+    """
+        Pickled entries in a directory, one file per key. Writes go to a temporary
+        file which is renamed into place, so concurrent readers in other processes
+        never see a half-written entry.
+
+        With maxsize, every maxsize / 10 writes the least recently used entries past
+        maxsize are deleted, by file modification time, which reads move forward. Each
+        worker sweeps after its own writes, so the directory can run a little over.
+    """
+
+    def __init__(self, path, namespace = 'default', maxsize = None):
+        self.path    = os.path.join(path, namespace)
+        self.maxsize = maxsize
+        self.hits    = 0
+        self.misses  = 0
+        self.evicted = 0
+        self._writes = 0
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def _filename(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.pkl')
+
+    def get(self, key, default = None):
+        try:
+            with open(self._filename(key), 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+
+        ## guard against hash collisions
+        if stored_key != key:
+            self.misses += 1
+            return default
+
+        ## mark it as recently used
+        if self.maxsize is not None:
+            try:
+                os.utime(self._filename(key))
+            except OSError:
+                pass
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir = self.path, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._filename(key))
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        if self.maxsize is not None:
+            self._writes += 1
+            if self._writes % max(1, self.maxsize // 10) == 0:
+                self.evict()
+
+    def evict(self):
+        """ Delete the least recently used entries past maxsize. Returns the number deleted. """
+        entries = []
+        for fn in os.listdir(self.path):
+            if fn.endswith('.pkl'):
+                path = os.path.join(self.path, fn)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+
+        deleted = 0
+        for _, path in sorted(entries)[:max(0, len(entries) - self.maxsize)]:
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                pass
+        self.evicted += deleted
+        return deleted
+
+    def delete(self, key):
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        self.expire(None)
+
+    def expire(self, max_age):
+        """ Delete entries written more than max_age seconds ago, or all of them if None.
+            Returns the number deleted. """
+        cutoff  = None if max_age is None else time.time() - max_age
+        deleted = 0
+        for fn in os.listdir(self.path):
+            if not fn.endswith('.pkl'):
+                continue
+            path = os.path.join(self.path, fn)
+            try:
+                if cutoff is None or os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+            except OSError:
+                pass
+        return deleted
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize, 'evicted': self.evicted}
+
+
+class TieredCache(object):
+    """ In-memory LRU in front of an optional shared disk tier. """
+
+    def __init__(self, memory, disk = None):
+        self.memory = memory
+        self.disk   = disk
+        self._miss  = object()
+
+    def get(self, key, default = None):
+        value = self.memory.get(key, self._miss)
+        if value is not self._miss:
+            return value
+
+        if self.disk is not None:
+            value = self.disk.get(key, self._miss)
+            if value is not self._miss:
+                ## promote to memory for the next hit in this worker
+                self.memory.set(key, value)
+                return value
+
+        return default
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        s = {'memory': self.memory.stats()}
+        if self.disk is not None:
+            s['disk'] = self.disk.stats()
+        return s
+
+
+class Generation(object):
+    """
+        A token to make part of cache keys, bumped whenever the cached data changes.
+        With a path, the token lives in a file there, so a bump in one worker process
+        is seen by all of them. Without one, it is only shared by this process's threads.
+    """
+
+    def __init__(self, path = None, name = 'default'):
+        self.name     = name
+        self.filename = None
+        self._token   = uuid.uuid4().hex
+
+        if path:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.filename = os.path.join(path, name + '.gen')
+
+    def current(self):
+        if self.filename is None:
+            return self._token
+
+        try:
+            with open(self.filename, 'r') as f:
+                return f.read().strip() or '0'
+        except (IOError, OSError):
+            return '0'
+
+    def bump(self):
+        token = uuid.uuid4().hex
+        if self.filename is None:
+            self._token = token
+            return token
+
+        ## write and rename, so readers never see an empty file
+        fd, tmp = tempfile.mkstemp(dir = os.path.dirname(self.filename), suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(token)
+            os.replace(tmp, self.filename)
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return token
+
+
+class Generations(object):
+    """ Several generations as one, for data derived from more than one table. """
+
+    def __init__(self, *generations):
+        self.generations = generations
+
+    def current(self):
+        return ':'.join(g.current() for g in self.generations)
+
+
+class Derived(object):
+    """
+        A value built from the database, rebuilt on first use after its Generation is
+        bumped, or after max_age seconds to pick up writes from outside the app.
+        A worker which keeps its own copy up to date as it writes can adopt() the
+        bump it makes, so only the other workers rebuild.
+    """
+
+    def __init__(self, generation, build, max_age = None):
+        self.generation = generation
+        self.build      = build
+        self.max_age    = max_age
+        self.builds     = 0
+        self._value     = None
+        self._token     = None
+        self._built     = 0
+        self._lock      = threading.Lock()
+
+    def _stale(self, token):
+        if self._token is None or token != self._token:
+            return True
+        return self.max_age is not None and time.time() - self._built > self.max_age
+
+    def get(self):
+        ## read the token before building, so writes during the build cause another
+        token = self.generation.current()
+        with self._lock:
+            if self._stale(token):
+                self._value  = self.build()
+                self._token  = token
+                self._built  = time.time()
+                self.builds += 1
+            return self._value
+
+    def peek(self):
+        """ The value if it has been built, without checking if it's current. """
+        return self._value
+
+    def adopt(self, old_token, new_token):
+        """ Take a bump from old_token to new_token as applied, if this value was current. """
+        with self._lock:
+            if self._token is not None and self._token == old_token:
+                self._token = new_token
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
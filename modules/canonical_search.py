@@ -0,0 +1,44 @@
+"""
+Canonical event search as a single statement.
+
+Each filter is either on CanonicalEvent itself, and goes straight into the
+WHERE clause, or on CodeEventCreator, and becomes an EXISTS subquery over
+the event's links. Every filter gets its own EXISTS, so different filters
+can be satisfied by different linked rows, the same as intersecting the
+results of one query per filter.
+
+Models are passed in so this can be used by scripts as well as the app.
+"""
+
+from sqlalchemy import and_, exists
+
+def canonical_conditions(CanonicalEvent, CanonicalEventLink, CodeEventCreator, filters):
+    """ WHERE conditions on CanonicalEvent for a list of (model, expression) filters. """
+    conditions = []
+    for model, expr in filters:
+        if model is CodeEventCreator:
+            conditions.append(exists().where(and_(
+                CanonicalEventLink.canonical_id == CanonicalEvent.id,
+                CodeEventCreator.id == CanonicalEventLink.cec_id,
+                expr)))
+        else:
+            conditions.append(expr)
+    return conditions
+
+
+def canonical_ids_query(session, CanonicalEvent, CanonicalEventLink, CodeEventCreator, filters, sorts = ()):
+    """ Query for the ids of canonical events matching every filter, in sort order.
+        filters is a list of (model, expression) pairs. """
+    conditions = canonical_conditions(CanonicalEvent, CanonicalEventLink, CodeEventCreator, filters)
+
+    ## id last, so pages and ties come back in a stable order
+    return session.query(CanonicalEvent.id).\
+        filter(*conditions).\
+        order_by(*(list(sorts) + [CanonicalEvent.id]))
+
+
+def canonical_ids(session, CanonicalEvent, CanonicalEventLink, CodeEventCreator, filters, sorts = (), limit = None):
+    query = canonical_ids_query(session, CanonicalEvent, CanonicalEventLink, CodeEventCreator, filters, sorts)
+    if limit is not None:
+        query = query.limit(limit)
+    return [x[0] for x in query.all()]
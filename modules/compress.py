@@ -0,0 +1,30 @@
+"""
+Compression for stored article bodies.
+
+Blobs use MySQL's COMPRESS() layout: the uncompressed length as a 4-byte
+little-endian integer, followed by a zlib stream. That keeps them readable
+from SQL with UNCOMPRESS() as well as from Python.
+"""
+
+import struct
+import zlib
+
+def compress_text(text, level = 6):
+    if text is None:
+        return None
+
+    raw = text.encode('utf-8')
+    if not raw:
+        return b''
+    return struct.pack('<I', len(raw)) + zlib.compress(raw, level)
+
+
+def decompress_text(blob):
+    if blob is None:
+        return None
+    if len(blob) == 0:
+        return u''
+
+    ## MySQL may append a '.' after the stream, so tolerate trailing bytes
+    raw = zlib.decompressobj().decompress(bytes(blob[4:]))
+    return raw.decode('utf-8')
@@ -0,0 +1,120 @@
+"""
+Parsing the adjudication search box into MySQL FULLTEXT boolean-mode queries.
+
+The search box takes terms joined by AND and OR (AND binds tighter),
+"quoted phrases", and prefixes ending in *. Unquoted terms with several
+words are treated as phrases, which is what the old substring search did.
+
+parse() turns a search string into OR-groups of AND-ed terms. The same
+groups can be compiled to a boolean-mode query with boolean_query(), or
+to LIKE patterns with like_text() when the full-text index can't be used.
+Operator characters are only stripped for boolean mode; LIKE gets the term
+as typed, so keys and dates such as UW-Madison or 2016-04-01 still match.
+"""
+
+import re
+
+## columns in each table's FULLTEXT index. MATCH() has to name exactly these.
+columns = {
+    'event_metadata':  ['article_desc', 'desc', 'location', 'publication', 'title',
+                        'form', 'issue', 'racial_issue'],
+    'canonical_event': ['key', 'description', 'notes']
+}
+
+## InnoDB's default innodb_ft_min_token_size
+min_token_size = 3
+
+_or_re     = re.compile(r'\s+OR\s+')
+_and_re    = re.compile(r'\s+AND\s+')
+_special   = re.compile(r'[+\-<>()~*"@]')
+_word_re   = re.compile(r'\w+', re.UNICODE)
+
+
+class Term(object):
+    def __init__(self, text, kind, raw = None):
+        """ text is cleaned for boolean mode, raw is the term as typed, without quotes or a trailing *. """
+        self.text = text
+        self.kind = kind
+        self.raw  = text if raw is None else raw
+
+    def __eq__(self, other):
+        return (self.text, self.kind) == (other.text, other.kind)
+
+    def __repr__(self):
+        return '<Term %r (%s)>' % (self.text, self.kind)
+
+
+def _split_outside_quotes(s, regex):
+    """ Split on regex, but not inside double quotes. """
+    parts = []
+    last  = 0
+    for m in regex.finditer(s):
+        if s.count('"', 0, m.start()) % 2 == 0:
+            parts.append(s[last:m.start()])
+            last = m.end()
+    parts.append(s[last:])
+    return parts
+
+
+def _term(s):
+    s = s.strip()
+    if not s:
+        return None
+
+    if len(s) > 1 and s.startswith('"') and s.endswith('"'):
+        raw  = s[1:-1].strip()
+        text = _special.sub(' ', raw).strip()
+        return Term(text, 'phrase', raw) if text else None
+
+    prefix = s.endswith('*')
+    raw    = s[:-1].rstrip() if prefix else s
+    text   = ' '.join(_special.sub(' ', s).split())
+    if not text:
+        return None
+    if prefix and ' ' not in text:
+        return Term(text, 'prefix', raw)
+    return Term(text, 'phrase' if ' ' in text else 'word', raw)
+
+
+def parse(search_str):
+    """ Returns a list of OR-groups, each a list of Terms which must all match. """
+    groups = []
+    for clause in _split_outside_quotes(search_str.strip(), _or_re):
+        terms = [_term(x) for x in _split_outside_quotes(clause, _and_re)]
+        terms = [x for x in terms if x is not None]
+        if terms:
+            groups.append(terms)
+    return groups
+
+
+def indexable(groups):
+    """ Whether the full-text index can answer this search. Words shorter than the minimum
+        token size aren't indexed, and numbers are better served by LIKE. """
+    for terms in groups:
+        for t in terms:
+            for w in _word_re.findall(t.text):
+                if len(w) < min_token_size or w.isdigit():
+                    return False
+    return True
+
+
+def _boolean_term(t):
+    if t.kind == 'phrase':
+        return '+"%s"' % t.text
+    elif t.kind == 'prefix':
+        return '+%s*' % t.text
+    return '+%s' % t.text
+
+
+def boolean_query(groups):
+    """ Compile OR-groups into a MySQL boolean-mode query string. """
+    if len(groups) == 1:
+        return ' '.join(_boolean_term(t) for t in groups[0])
+
+    ## each group is optional, but a row has to match at least one of them
+    return ' '.join('(%s)' % ' '.join(_boolean_term(t) for t in terms) for terms in groups)
+
+
+def like_text(t):
+    """ The substring to LIKE for a term: the term as typed. """
+    return t.raw
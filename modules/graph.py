@@ -0,0 +1,251 @@
+"""
+Process-local graph of canonical events and their relationships.
+
+Events are numbered densely as they are added, and everything else is
+kept by that number: the key of each event in a list, and each event's
+parents and children as two parallel arrays, one of event numbers and one
+of relationship type codes. Only the id and key maps are dicts.
+
+A relationship makes canonical_id2 a parent of canonical_id1, as in
+CanonicalEventRelationship. Hierarchy, reachability and connected-component
+questions are answered with breadth-first walks over the arrays, without a
+query. The app updates its graph as it writes, like the key autocomplete.
+"""
+
+import threading
+from array import array
+from collections import deque, namedtuple
+
+from .hierarchy import Hierarchy
+
+Event        = namedtuple('Event', ['id', 'key'])
+Relationship = namedtuple('Relationship', ['canonical_id1', 'canonical_id2', 'relationship_type'])
+
+class CanonicalGraph(object):
+    def __init__(self, events = (), relationships = ()):
+        """ events are (id, key) and relationships (canonical_id1, canonical_id2, type). """
+        self._lock    = threading.RLock()
+        self._ids     = array('l')
+        self._keys    = []
+        self._index   = {}
+        self._key_ids = {}
+        self._types   = []
+        self._codes   = {}
+
+        ## parents and children of each event, as (event numbers, type codes)
+        self._up   = []
+        self._down = []
+
+        for id, key in events:
+            self.set_event(id, key)
+        for id1, id2, rtype in relationships:
+            self.add_edge(id1, id2, rtype)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _code(self, rtype):
+        if rtype not in self._codes:
+            self._codes[rtype] = len(self._types)
+            self._types.append(rtype)
+        return self._codes[rtype]
+
+    ## Writes
+    def set_event(self, id, key):
+        """ Add an event, or change its key. """
+        with self._lock:
+            i = self._index.get(id)
+            if i is None:
+                i = len(self._ids)
+                self._index[id] = i
+                self._ids.append(id)
+                self._keys.append(None)
+                self._up.append((array('l'), array('H')))
+                self._down.append((array('l'), array('H')))
+
+            if self._keys[i] is not None:
+                del self._key_ids[self._keys[i]]
+            self._keys[i] = key
+            self._key_ids[key] = id
+
+    def remove_event(self, id):
+        """ Drop an event and its relationships. Its number is not reused. """
+        with self._lock:
+            i = self._index.pop(id, None)
+            if i is None:
+                return
+
+            for j, code in zip(*self._up[i]):
+                self._unlink(self._down[j], i, code)
+            for j, code in zip(*self._down[i]):
+                self._unlink(self._up[j], i, code)
+
+            del self._key_ids[self._keys[i]]
+            self._keys[i] = None
+            self._up[i]   = (array('l'), array('H'))
+            self._down[i] = (array('l'), array('H'))
+
+    def add_edge(self, id1, id2, rtype):
+        """ Make id2 a parent of id1. Relationships between unknown events are ignored. """
+        with self._lock:
+            i, j = self._index.get(id1), self._index.get(id2)
+            if i is None or j is None:
+                return
+            code = self._code(rtype)
+            for adjacent, other in [(self._up[i], j), (self._down[j], i)]:
+                adjacent[0].append(other)
+                adjacent[1].append(code)
+
+    def remove_edge(self, id1, id2, rtype):
+        with self._lock:
+            i, j = self._index.get(id1), self._index.get(id2)
+            if i is None or j is None or rtype not in self._codes:
+                return
+            code = self._codes[rtype]
+            self._unlink(self._up[i], j, code)
+            self._unlink(self._down[j], i, code)
+
+    def _unlink(self, adjacent, other, code):
+        targets, codes = adjacent
+        for k in range(len(targets)):
+            if targets[k] == other and codes[k] == code:
+                del targets[k]
+                del codes[k]
+                return
+
+    ## Reads
+    def id_of(self, key):
+        return self._key_ids.get(key)
+
+    def key_of(self, id):
+        i = self._index.get(id)
+        return None if i is None else self._keys[i]
+
+    def parents(self, id):
+        """ [(parent id, relationship type)] """
+        return self._adjacent(self._up, id)
+
+    def children(self, id):
+        """ [(child id, relationship type)] """
+        return self._adjacent(self._down, id)
+
+    def _adjacent(self, side, id):
+        with self._lock:
+            i = self._index.get(id)
+            if i is None:
+                return []
+            targets, codes = side[i]
+            return [(self._ids[j], self._types[c]) for j, c in zip(targets, codes)]
+
+    def _walk(self, sides, id, max_depth = None, stop = None):
+        """ {event number: depth of the shortest path}, following the given sides from id. """
+        i = self._index.get(id)
+        if i is None:
+            return {}
+
+        depths = {i: 0}
+        queue  = deque([i])
+        while queue:
+            j = queue.popleft()
+            if max_depth is not None and depths[j] >= max_depth:
+                continue
+            for side in sides:
+                for k in side[j][0]:
+                    if k not in depths:
+                        depths[k] = depths[j] + 1
+                        if k == stop:
+                            return depths
+                        queue.append(k)
+        return depths
+
+    def ancestors(self, id, max_depth = None):
+        """ {ancestor id: depth of the shortest path} """
+        with self._lock:
+            return {self._ids[j]: d for j, d in self._walk([self._up], id, max_depth).items() if d}
+
+    def descendants(self, id, max_depth = None):
+        """ {descendant id: depth of the shortest path} """
+        with self._lock:
+            return {self._ids[j]: d for j, d in self._walk([self._down], id, max_depth).items() if d}
+
+    def is_ancestor(self, ancestor, descendant):
+        with self._lock:
+            i = self._index.get(ancestor)
+            if i is None or ancestor == descendant:
+                return False
+            return i in self._walk([self._up], descendant, stop = i)
+
+    def creates_cycle(self, id1, id2):
+        """ True if making id2 a parent of id1 would make an event its own ancestor. """
+        return id1 == id2 or self.is_ancestor(id1, id2)
+
+    def component(self, id):
+        """ Ids of every event connected to id by relationships, either way, id included. """
+        with self._lock:
+            return sorted(self._ids[j] for j in self._walk([self._up, self._down], id))
+
+    def components(self):
+        """ Ids of the events in each group of related events, largest first. Events with
+            no relationships are left out. """
+        with self._lock:
+            seen, groups = set(), []
+            for id, i in self._index.items():
+                if i in seen or not (self._up[i][0] or self._down[i][0]):
+                    continue
+                group = self._walk([self._up, self._down], id)
+                seen.update(group)
+                groups.append(sorted(self._ids[j] for j in group))
+            return sorted(groups, key = lambda x: (-len(x), x[0]))
+
+    def hierarchy(self, id):
+        """ The same Hierarchy as modules.hierarchy.load(), built from the graph. """
+        with self._lock:
+            if id not in self._index:
+                return Hierarchy({}, {}, {})
+
+            events, parents, children = {}, {}, {}
+            for side, found, up in [(self._up, parents, True), (self._down, children, False)]:
+                for j in self._walk([side], id):
+                    jid = self._ids[j]
+                    if jid != id:
+                        events[jid] = Event(jid, self._keys[j])
+
+                    for k, c in zip(*side[j]):
+                        other = Event(self._ids[k], self._keys[k])
+                        rtype = self._types[c]
+                        rel   = Relationship(jid, other.id, rtype) if up else Relationship(other.id, jid, rtype)
+                        found.setdefault(jid, []).append((other, rel))
+
+            for x in list(parents.values()) + list(children.values()):
+                x.sort(key = lambda y: (y[1].relationship_type, y[0].key))
+
+            if not events:
+                return Hierarchy({}, {}, {})
+            return Hierarchy(events, parents, children)
+
+    def tree(self, id, max_depth = None):
+        """ The event with its ancestors and descendants nested under 'parents' and 'children',
+            for JSON. An event already on the path isn't expanded again. """
+        with self._lock:
+            if id not in self._index:
+                return None
+
+            def nest(side, name, i, path, depth):
+                entries = []
+                targets, codes = side[i]
+                for k, c in sorted(zip(targets, codes), key = lambda x: (self._types[x[1]], self._keys[x[0]])):
+                    entry = {'id': self._ids[k], 'key': self._keys[k], 'type': self._types[c]}
+                    if k not in path and (max_depth is None or depth < max_depth):
+                        entry[name] = nest(side, name, k, path | {k}, depth + 1)
+                    entries.append(entry)
+                return entries
+
+            i = self._index[id]
+            return {'id': id, 'key': self._keys[i],
+                'parents': nest(self._up, 'parents', i, {i}, 1),
+                'children': nest(self._down, 'children', i, {i}, 1)}
+
+    def stats(self):
+        with self._lock:
+            edges = sum(len(x[0]) for x in self._up)
+            return {'events': len(self._index), 'relationships': edges, 'types': len(self._types)}
@@ -0,0 +1,161 @@
+"""
+Everything the expanded adjudication grid shows, in two statements.
+
+The candidate events' metadata, codings and flags come back from one
+UNION ALL, each row tagged with its kind. The canonical event, its links
+and the codings behind them come back from one outer join. However many
+candidate events are open, that is two statements, or one when there is
+no canonical event.
+
+load() returns the same structures adj-grid.html has always taken.
+add_links() links many records to canonical events at once, in a fixed
+number of statements. Models are passed in so this can be used by scripts
+as well as the app.
+"""
+
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import and_, literal, null, or_, type_coerce
+
+Grid = namedtuple('Grid', ['cand_events', 'canonical_event', 'links', 'flags'])
+
+def _candidate_query(session, models, cand_event_ids, metadata_fields):
+    """ Metadata, coding and flag rows of the candidate events as (kind, event_id, id,
+        variable, text, value, timestamp, *metadata_fields). """
+    EventMetadata, CodeEventCreator, EventFlag = models.EventMetadata, models.CodeEventCreator, models.EventFlag
+
+    ## the first query decides the types of the union's columns
+    metadata = session.query(literal('metadata'), EventMetadata.event_id, EventMetadata.id,
+            type_coerce(null(), CodeEventCreator.variable.type),
+            type_coerce(null(), CodeEventCreator.text.type),
+            type_coerce(null(), CodeEventCreator.value.type),
+            type_coerce(null(), CodeEventCreator.timestamp.type),
+            *[getattr(EventMetadata, x) for x in metadata_fields]).\
+        filter(EventMetadata.event_id.in_(cand_event_ids))
+
+    blanks = [null()] * len(metadata_fields)
+    codings = session.query(literal('coding'), CodeEventCreator.event_id, CodeEventCreator.id,
+            CodeEventCreator.variable, CodeEventCreator.text, CodeEventCreator.value,
+            CodeEventCreator.timestamp, *blanks).\
+        filter(CodeEventCreator.event_id.in_(cand_event_ids))
+
+    flags = session.query(literal('flag'), EventFlag.event_id, EventFlag.id,
+            null(), null(), EventFlag.flag, EventFlag.timestamp, *blanks).\
+        filter(EventFlag.event_id.in_(cand_event_ids))
+
+    return metadata.union_all(codings, flags)
+
+
+def load_candidate_events(session, models, cand_event_ids, metadata_fields):
+    """ Candidate events keyed by event id, each a dict of the metadata_fields under
+        'metadata' and (value, cec id, timestamp) lists by variable, and flags by event id. """
+    cand_events = {x: {} for x in cand_event_ids}
+    flags = {}
+    if not cand_event_ids:
+        return cand_events, flags
+
+    rows = _candidate_query(session, models, cand_event_ids, metadata_fields).all()
+    for kind, event_id, id, variable, text, value, timestamp, *meta in sorted(rows, key = lambda x: x[2]):
+        if kind == 'metadata':
+            cand_events[event_id]['metadata'] = dict(zip(metadata_fields, meta))
+        elif kind == 'coding':
+            cand_events[event_id].setdefault(variable, []).append((text if text is not None else value, id, timestamp))
+        else:
+            flags[event_id] = value
+
+    return cand_events, flags
+
+
+def load_canonical_event(session, models, key, usernames):
+    """ The canonical event with this key as a dict of its fields and, by variable, lists of
+        (link id, value, link timestamp, event id, is_dummy), and the ids of the articles
+        linked to it without codings. (None, []) if there is no such event. usernames maps
+        coder ids to usernames; other codings by coders who aren't in it are left out. """
+    CanonicalEvent, CanonicalEventLink, CodeEventCreator = \
+        models.CanonicalEvent, models.CanonicalEventLink, models.CodeEventCreator
+
+    rows = session.query(CanonicalEvent.id, CanonicalEvent.key, CanonicalEvent.description, CanonicalEvent.notes,
+            CanonicalEventLink.id, CanonicalEventLink.timestamp, CodeEventCreator.event_id, CodeEventCreator.article_id,
+            CodeEventCreator.variable, CodeEventCreator.value, CodeEventCreator.text, CodeEventCreator.coder_id).\
+        outerjoin(CanonicalEventLink, CanonicalEventLink.canonical_id == CanonicalEvent.id).\
+        outerjoin(CodeEventCreator, CodeEventCreator.id == CanonicalEventLink.cec_id).\
+        filter(CanonicalEvent.key == key).\
+        order_by(CanonicalEventLink.id).all()
+
+    if not rows:
+        return None, []
+
+    id, key, description, notes = rows[0][:4]
+    canonical_event = {'id': id, 'key': key, 'description': description, 'notes': notes}
+    links = set()
+    for _, _, _, _, cel_id, timestamp, event_id, article_id, variable, value, text, coder_id in rows:
+        if cel_id is None or variable is None:
+            continue
+
+        if variable == 'link':
+            links.add(article_id)
+        if coder_id not in usernames:
+            continue
+
+        ## if this is a dummy value, username starts with adj
+        is_dummy = 1 if 'adj' in usernames[coder_id] else 0
+        canonical_event.setdefault(variable, []).append(
+            (cel_id, text if text is not None else value, timestamp, event_id, is_dummy))
+
+    return canonical_event, sorted(links)
+
+
+def load(session, models, cand_event_ids, canonical_event_key, metadata_fields, usernames):
+    """ The whole grid. """
+    cand_events, flags = load_candidate_events(session, models, cand_event_ids, metadata_fields)
+
+    canonical_event, links = None, []
+    if canonical_event_key:
+        canonical_event, links = load_canonical_event(session, models, canonical_event_key, usernames)
+
+    return Grid(cand_events, canonical_event, links, flags)
+
+
+def records(session, models, cec_ids, event_ids, variables):
+    """ The CEC records with the given ids, and those of the candidate events with the
+        given ids whose variable is one of variables, in one statement. """
+    CodeEventCreator = models.CodeEventCreator
+    return session.query(CodeEventCreator).\
+        filter(or_(CodeEventCreator.id.in_(cec_ids),
+            and_(CodeEventCreator.event_id.in_(event_ids), CodeEventCreator.variable.in_(variables)))).\
+        order_by(CodeEventCreator.id).all()
+
+
+def canonical_ids(session, models, ids):
+    """ Those of the canonical event ids which exist, in one statement, or none if there are no ids. """
+    CanonicalEvent = models.CanonicalEvent
+    if not ids:
+        return set()
+    return set(x[0] for x in session.query(CanonicalEvent.id).filter(CanonicalEvent.id.in_(set(ids))).all())
+
+
+def add_links(session, models, links, coder_id, now):
+    """ Link (cec_id, canonical_id) pairs which aren't linked already, with one insert.
+        Returns the new CanonicalEventLinks in the order given, and the number skipped.
+        Doesn't commit. """
+    CanonicalEventLink = models.CanonicalEventLink
+    links = list(OrderedDict.fromkeys(links))
+
+    def existing():
+        ## every link between any of the records and any of the canonical events, a superset of links
+        if not links:
+            return {}
+        return {(x.cec_id, x.canonical_id): x for x in session.query(CanonicalEventLink).\
+            filter(CanonicalEventLink.cec_id.in_(set(x[0] for x in links)),
+                CanonicalEventLink.canonical_id.in_(set(x[1] for x in links))).all()}
+
+    linked = existing()
+    new    = [x for x in links if x not in linked]
+    if not new:
+        return [], len(links)
+
+    session.execute(CanonicalEventLink.__table__.insert(),
+        [{'coder_id': coder_id, 'canonical_id': c, 'cec_id': r, 'timestamp': now} for r, c in new])
+
+    cels = existing()
+    return [cels[x] for x in new], len(links) - len(new)
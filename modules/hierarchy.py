@@ -0,0 +1,191 @@
+"""
+Closure table over the canonical event hierarchy.
+
+A CanonicalEventRelationship row makes canonical_id2 a parent of
+canonical_id1. canonical_event_closure holds a row for every (ancestor,
+descendant, depth) the relationships imply, with the number of distinct
+paths of that length. Ancestors or descendants of any depth are then one
+indexed lookup, and a relationship would close a cycle exactly when the
+parent is already a descendant of the child.
+
+Adding a relationship adds paths from every ancestor of the parent to
+every descendant of the child; deleting it takes the same paths away.
+Path counts are why deletes are exact: a row goes only when no path is
+left, so other relationships between the same events keep it.
+
+The table starts out empty, so on a database which already has
+relationships it has to be built once with scripts/build_hierarchy_closure.py.
+Until then built() is False, and nothing here gives the right answer.
+
+Models are passed in so this can be used by scripts as well as the app.
+"""
+
+from collections import Counter, namedtuple
+
+from sqlalchemy import and_, bindparam, select
+
+Hierarchy = namedtuple('Hierarchy', ['events', 'parents', 'children'])
+
+def built(session, models):
+    """ False while there are relationships but no closure rows, as before
+        scripts/build_hierarchy_closure.py has been run. """
+    C, R = models.CanonicalEventClosure, models.CanonicalEventRelationship
+    if session.query(R.id).limit(1).first() is None:
+        return True
+    return session.query(C.depth).limit(1).first() is not None
+
+
+def creates_cycle(session, models, child, parent):
+    """ True if making parent a parent of child would make an event its own ancestor. """
+    C = models.CanonicalEventClosure
+    if child == parent:
+        return True
+    return session.query(C.depth).\
+        filter(C.ancestor_id == child, C.descendant_id == parent).first() is not None
+
+
+def ancestors(session, models, cid):
+    """ {ancestor id: depth of the shortest path} """
+    C = models.CanonicalEventClosure
+    rows = session.query(C.ancestor_id, C.depth).filter(C.descendant_id == cid).all()
+    return _nearest(rows)
+
+
+def descendants(session, models, cid):
+    """ {descendant id: depth of the shortest path} """
+    C = models.CanonicalEventClosure
+    rows = session.query(C.descendant_id, C.depth).filter(C.ancestor_id == cid).all()
+    return _nearest(rows)
+
+
+def _nearest(rows):
+    nearest = {}
+    for id, depth in rows:
+        nearest[id] = min(depth, nearest.get(id, depth))
+    return nearest
+
+
+def _paths(up, down):
+    """ Paths a new edge adds, from (ancestor, depth, paths) above it to (descendant, depth, paths) below it. """
+    paths = Counter()
+    for a, d1, n1 in up:
+        for x, d2, n2 in down:
+            paths[(a, x, d1 + d2 + 1)] += n1 * n2
+    return paths
+
+
+def _edge_paths(session, models, child, parent):
+    C = models.CanonicalEventClosure
+    up   = [(parent, 0, 1)] + session.query(C.ancestor_id, C.depth, C.paths).filter(C.descendant_id == parent).all()
+    down = [(child, 0, 1)] + session.query(C.descendant_id, C.depth, C.paths).filter(C.ancestor_id == child).all()
+    return _paths(up, down)
+
+
+def _apply(session, models, paths, sign):
+    """ Add (sign 1) or take away (sign -1) path counts, in at most three writes. """
+    t = models.CanonicalEventClosure.__table__
+    existing = dict(((a, x, d), n) for a, x, d, n in session.execute(
+        select([t.c.ancestor_id, t.c.descendant_id, t.c.depth, t.c.paths]).\
+            where(and_(t.c.ancestor_id.in_(set(k[0] for k in paths)),
+                t.c.descendant_id.in_(set(k[1] for k in paths))))).fetchall())
+
+    inserts, updates, deletes = [], [], []
+    for (a, x, d), n in paths.items():
+        total = existing.get((a, x, d), 0) + sign * n
+        row = {'a': a, 'x': x, 'd': d, 'n': total}
+        if (a, x, d) not in existing:
+            if total > 0:
+                inserts.append({'ancestor_id': a, 'descendant_id': x, 'depth': d, 'paths': total})
+        elif total > 0:
+            updates.append(row)
+        else:
+            deletes.append(row)
+
+    key = and_(t.c.ancestor_id == bindparam('a'), t.c.descendant_id == bindparam('x'), t.c.depth == bindparam('d'))
+    if inserts:
+        session.execute(t.insert(), inserts)
+    if updates:
+        session.execute(t.update().where(key).values(paths = bindparam('n')), updates)
+    if deletes:
+        session.execute(t.delete().where(key), deletes)
+
+
+def add_edge(session, models, child, parent):
+    """ Record a new relationship making parent a parent of child. Check creates_cycle() first. """
+    _apply(session, models, _edge_paths(session, models, child, parent), 1)
+
+
+def remove_edge(session, models, child, parent):
+    """ Record that one relationship between child and parent has gone. """
+    _apply(session, models, _edge_paths(session, models, child, parent), -1)
+
+
+def closure(edges):
+    """ The closure rows of (child, parent) edges as {(ancestor, descendant, depth): paths},
+        and the edges left out because they would close a cycle. """
+    rows, up, down = Counter(), {}, {}
+    skipped = []
+    for child, parent in edges:
+        if child == parent or _descends(down, child, parent):
+            skipped.append((child, parent))
+            continue
+
+        ## (id, depth): paths
+        above = [(parent, 0, 1)] + [k + (n,) for k, n in up.get(parent, {}).items()]
+        below = [(child, 0, 1)] + [k + (n,) for k, n in down.get(child, {}).items()]
+        for (a, x, d), n in _paths(above, below).items():
+            rows[(a, x, d)] += n
+            up.setdefault(x, Counter())[(a, d)] += n
+            down.setdefault(a, Counter())[(x, d)] += n
+
+    return rows, skipped
+
+
+def _descends(down, ancestor, descendant):
+    return any(x == descendant for x, _ in down.get(ancestor, {}))
+
+
+def rebuild(session, models):
+    """ Rebuild the closure table from every relationship. Returns the relationships
+        left out because they close a cycle, as (child, parent). """
+    R = models.CanonicalEventRelationship
+    t = models.CanonicalEventClosure.__table__
+
+    edges = session.query(R.canonical_id1, R.canonical_id2).order_by(R.id).all()
+    rows, skipped = closure(edges)
+
+    session.execute(t.delete())
+    if rows:
+        session.execute(t.insert(), [{'ancestor_id': a, 'descendant_id': x, 'depth': d, 'paths': n}
+            for (a, x, d), n in sorted(rows.items())])
+    return skipped
+
+
+def load(session, models, cid):
+    """ The hierarchy around a canonical event, in two statements whatever its depth: the
+        events by id, and (event, relationship) lists of parents and of children by event id,
+        covering the event's ancestors and descendants. """
+    CanonicalEvent, C, R = models.CanonicalEvent, models.CanonicalEventClosure, models.CanonicalEventRelationship
+
+    above = session.query(CanonicalEvent).join(C, C.ancestor_id == CanonicalEvent.id).filter(C.descendant_id == cid)
+    below = session.query(CanonicalEvent).join(C, C.descendant_id == CanonicalEvent.id).filter(C.ancestor_id == cid)
+    events = {x.id: x for x in above.union_all(below).all()}
+    if not events:
+        return Hierarchy({}, {}, {})
+
+    ids  = set(events) | set([cid])
+    rels = session.query(R).\
+        filter(R.canonical_id1.in_(ids), R.canonical_id2.in_(ids)).\
+        order_by(R.id).all()
+
+    parents, children = {}, {}
+    for r in rels:
+        if r.canonical_id2 in events:
+            parents.setdefault(r.canonical_id1, []).append((events[r.canonical_id2], r))
+        if r.canonical_id1 in events:
+            children.setdefault(r.canonical_id2, []).append((events[r.canonical_id1], r))
+
+    for x in list(parents.values()) + list(children.values()):
+        x.sort(key = lambda y: (y[1].relationship_type, y[0].key))
+
+    return Hierarchy(events, parents, children)
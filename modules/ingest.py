@@ -0,0 +1,170 @@
+"""
+Streaming readers for article source files.
+
+Each reader is a generator which yields one article record at a time, as a
+dict in the same shape as our Solr documents and the LexisNexis splitter's
+output: INTERNAL_ID, PUBLICATION, DATE (YYYY-MM-DD), TITLE, TEXT (paragraphs
+joined by <br/>), and whatever other metadata fields the source has.
+
+Nothing holds more than the current article in memory, so multi-gigabyte
+exports can be read with flat memory use.
+"""
+
+import re
+from datetime import datetime
+
+## LDC New York Times Annotated Corpus (NITF)
+## XPath is compiled once and evaluated relative to each <nitf> element
+_ldc_xpath = {}
+
+def _ldc():
+    """ Compiled XPath expressions for LDC NITF. lxml is only needed for this corpus. """
+    if not _ldc_xpath:
+        from lxml import etree
+        _ldc_xpath.update({
+            'etree':    etree,
+            'headline': etree.XPath("body[1]/body.head/hedline/hl1/text()"),
+            'paras':    etree.XPath("body/body.content/block[@class='full_text']/p"),
+            'byline':   etree.XPath("body/body.head/byline[@class='print_byline']/text()"),
+            'dateline': etree.XPath("body/body.head/dateline/text()"),
+            'doc_id':   etree.XPath("head/docdata/doc-id/@id-string"),
+            'pub_date': etree.XPath("head/pubdata/@date.publication"),
+            'pub_name': etree.XPath("head/pubdata/@name")
+        })
+    return _ldc_xpath
+
+
+def _first(values, default = None):
+    return values[0] if len(values) else default
+
+
+def iter_ldc(source):
+    """ Yield a record for every <nitf> document in an LDC XML file (path or file object). """
+    x = _ldc()
+
+    for _, elem in x['etree'].iterparse(source, events = ('end',), tag = 'nitf'):
+        pub_date = _first(x['pub_date'](elem), '')
+        doc_id   = _first(x['doc_id'](elem))
+
+        record = {
+            'INTERNAL_ID': doc_id,
+            'PUBLICATION': _first(x['pub_name'](elem), 'The New York Times'),
+            'DATE':        '%s-%s-%s' % (pub_date[0:4], pub_date[4:6], pub_date[6:8]) if pub_date else '',
+            'TITLE':       _first(x['headline'](elem), ''),
+            'TEXT':        '<br/>'.join(p.text or '' for p in x['paras'](elem))
+        }
+
+        byline   = _first(x['byline'](elem))
+        dateline = _first(x['dateline'](elem))
+        if byline is not None:
+            record['BYLINE'] = byline
+        if dateline is not None:
+            record['DATELINE'] = dateline
+
+        yield record
+
+        ## drop the parsed document and anything before it
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+## LexisNexis text exports
+_ln_header    = re.compile(r'^\s*(\d+) of \d+ DOCUMENTS\s*$')
+_ln_meta      = re.compile(r'^([A-Z][A-Z-]*?):')
+_ln_copyright = re.compile(r'^Copyright \d+.*$')
+_ln_space     = re.compile(r'\s+')
+
+
+def _ln_blocks(lines):
+    """ Group a document's lines into blocks separated by blank lines. """
+    block = []
+    for line in lines:
+        if line.strip() == '':
+            if block:
+                yield ' '.join(block).strip()
+                block = []
+        else:
+            block.append(line.strip())
+    if block:
+        yield ' '.join(block).strip()
+
+
+def parse_ln_document(search_id, lines):
+    """ Turn the lines of one LexisNexis document into a record, or None for abstracts and fragments. """
+    blocks = list(_ln_blocks(lines))
+    if len(blocks) < 3:
+        return None
+
+    ## skip the whole article if it's an abstract
+    if 'Abstracts' in blocks[0]:
+        return None
+
+    ## remove copyright
+    blocks = [b for b in blocks if not _ln_copyright.match(b) and 'All Rights Reserved' not in b]
+
+    pub     = blocks[0]
+    date_ed = blocks[1]
+    title   = blocks[2]
+
+    ## format date into YYYY-MM-DD
+    ## NYT format: July 27 2008 Sunday                               Late Edition - Final
+    ## USATODAY:   April 7, 1997, Monday, FINAL EDITION
+    ## WaPo:       June 06, 1996, Thursday, Final Edition
+    da = _ln_space.split(date_ed.replace(',', ''))
+    try:
+        date = datetime.strptime(" ".join(da[0:3]), "%B %d %Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+    ed = " ".join(x.strip() for x in da[4:])
+
+    ## if edition is a time or day, skip it
+    if 'GMT' in ed or 'day' in ed:
+        ed = ''
+
+    record = {'PUBLICATION': pub, 'DATE': date, 'TITLE': title, 'EDITION': ed}
+
+    paragraphs = []
+    for block in blocks[3:]:
+        meta = _ln_meta.findall(block)
+
+        ## find out if this block is part of the main text
+        if block[:2] != '  ' and block != block.upper() and not meta and title not in block:
+            paragraphs.append(_ln_space.sub(' ', block).replace('","', '" , "'))
+        elif meta:
+            record[meta[0]] = block.replace(meta[0] + ': ', '')
+
+    ## since JSON won't preserve escaped newlines
+    record['TEXT']        = "<br/>".join(paragraphs)
+    record['INTERNAL_ID'] = "%s_%s_%s" % (pub, date, search_id)
+
+    return record
+
+
+def iter_lexisnexis(source):
+    """ Yield a record for every document in a LexisNexis text export (path or file object). """
+    f = open(source, 'r', encoding = 'utf-8-sig') if isinstance(source, str) else source
+
+    try:
+        search_id = None
+        lines     = []
+        for line in f:
+            m = _ln_header.match(line)
+            if m:
+                if search_id is not None:
+                    record = parse_ln_document(search_id, lines)
+                    if record is not None:
+                        yield record
+
+                search_id = m.group(1)
+                lines     = []
+            elif search_id is not None:
+                lines.append(line.rstrip('\r\n'))
+
+        if search_id is not None:
+            record = parse_ln_document(search_id, lines)
+            if record is not None:
+                yield record
+    finally:
+        if f is not source:
+            f.close()
@@ -0,0 +1,54 @@
+"""
+Invalidating caches when the tables behind them are written to.
+
+A TableWatcher listens to a session. It notes which tables each flush,
+bulk update or bulk delete wrote to, and once the transaction commits it
+calls the callbacks watching any of those tables, typically to bump a
+cache Generation. Nothing is called for rolled back transactions, and
+nothing is called before the commit, so a reader which sees the new
+generation also sees the new data.
+
+Writes made with raw SQL, or from other programs such as the scripts,
+aren't seen; caches which need to pick those up should also expire.
+"""
+
+from sqlalchemy import event
+
+class TableWatcher(object):
+    def __init__(self, session):
+        self.watches = []
+
+        event.listen(session, 'after_flush', self._after_flush)
+        event.listen(session, 'after_bulk_update', self._after_bulk)
+        event.listen(session, 'after_bulk_delete', self._after_bulk)
+        event.listen(session, 'after_commit', self._after_commit)
+        event.listen(session, 'after_soft_rollback', self._after_rollback)
+
+    def watch(self, tables, callback):
+        """ Call callback() after every commit which wrote to any of the tables (names). """
+        self.watches.append((frozenset(tables), callback))
+
+    def _written(self, session):
+        return session.info.setdefault('written_tables', set())
+
+    def _after_flush(self, session, flush_context):
+        written = self._written(session)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, '__table__', None)
+            if table is not None:
+                written.add(table.name)
+
+    def _after_bulk(self, context):
+        self._written(context.session).add(context.mapper.local_table.name)
+
+    def _after_commit(self, session):
+        written = session.info.pop('written_tables', None)
+        if not written:
+            return
+
+        for tables, callback in self.watches:
+            if tables & written:
+                callback()
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('written_tables', None)
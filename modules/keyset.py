@@ -0,0 +1,121 @@
+"""
+Keyset pagination for search results.
+
+A page is ordered by a list of keys, (expression, 'asc' or 'desc') pairs,
+which should end with a unique column so the order is total. Instead of an
+OFFSET, the next page starts after the key values of the last row shown,
+which the client sends back as an opaque cursor.
+
+NULLs sort first ascending and last descending, as in MySQL and SQLite.
+"""
+
+import base64
+import datetime as dt
+import json
+
+from sqlalchemy import and_, bindparam, or_, false
+
+def order_by(keys):
+    """ ORDER BY clauses for the keys. """
+    return [getattr(expr, direction)() for expr, direction in keys]
+
+
+def _equal(expr, value):
+    return expr == None if value is None else expr == value
+
+
+def _after(expr, direction, value):
+    if direction == 'asc':
+        return expr != None if value is None else expr > value
+
+    ## descending, NULLs come last
+    if value is None:
+        return false()
+    return or_(expr < value, expr == None)
+
+
+def after(keys, values):
+    """ Condition for rows which come after the given key values. """
+    clauses = []
+    for i, (expr, direction) in enumerate(keys):
+        prefix = [_equal(e, v) for (e, _), v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*(prefix + [_after(expr, direction, values[i])])))
+    return or_(*clauses)
+
+
+def _typed(expr, value):
+    """ Dates and times come back from a cursor as ISO strings. """
+    try:
+        python_type = expr.type.python_type
+    except NotImplementedError:
+        return value
+    if not isinstance(value, str) or python_type not in (dt.date, dt.datetime):
+        return value
+
+    for fmt in ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d']:
+        try:
+            x = dt.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return x.date() if python_type is dt.date else x
+    return value
+
+
+def page_query(query, keys, values = None, size = 100):
+    """ The query for one page, with one row more than size, to tell if there are more. """
+    if values is not None:
+        query = query.filter(after(keys, values))
+    return query.order_by(*order_by(keys)).limit(size + 1)
+
+
+def split(rows, size):
+    """ The rows of a page_query() result to show, and the key values to continue from,
+        or None on the last page. """
+    if len(rows) > size:
+        return rows[:size], list(rows[size - 1])
+    return rows, None
+
+
+def page(query, keys, values = None, size = 100):
+    """ One page of a query which selects the key expressions, in key order.
+        Returns the rows and the key values to continue from, or None on the last page. """
+    if values is not None:
+        values = [_typed(expr, v) for (expr, _), v in zip(keys, values)]
+    return split(page_query(query, keys, values, size).all(), size)
+
+
+def cursor_params(keys, values, prefix = 'cursor'):
+    """ Bound parameters to give after() in place of cursor values, and the values to
+        bind them to, by name. NULLs change the condition, so they stay as None. """
+    params = []
+    bound  = {}
+    for i, ((expr, _), v) in enumerate(zip(keys, values)):
+        if v is None:
+            params.append(None)
+        else:
+            name = '%s%d' % (prefix, i)
+            params.append(bindparam(name))
+            bound[name] = _typed(expr, v)
+    return params, bound
+
+
+def _json_default(x):
+    if isinstance(x, (dt.date, dt.datetime)):
+        return x.isoformat()
+    raise TypeError('Cannot encode %r in a cursor' % x)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default = _json_default).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, n_keys):
+    """ Key values from a cursor. Raises ValueError if it isn't one for n_keys keys. """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor.')
+
+    if not isinstance(values, list) or len(values) != n_keys:
+        raise ValueError('Invalid cursor.')
+    return values
@@ -0,0 +1,172 @@
+"""
+Parsing articles into title, metadata, and cleaned paragraphs.
+
+Used by the interface when it has to render an article from its source,
+and by scripts/ingest_paragraphs.py, which stores the parsed paragraphs
+in article_paragraph so the interface can skip parsing altogether when
+USE_INGESTED_PARAGRAPHS is on.
+"""
+
+import hashlib
+import os
+import re
+
+from . import ingest
+
+tag_re = re.compile(r'<[^>]*>')
+
+## Solr fields which make up the metadata line, in order
+solr_meta = ['PUBLICATION', 'SECTION', 'BYLINE', 'DATELINE', 'DATE', 'INTERNAL_ID']
+
+metawords = ['DATE', 'PUBLICATION', 'LANGUAGE', 'DATELINE', 'SECTION',
+    'EDITION', 'LENGTH', 'DATE', 'SEARCH_ID', 'Published', 'By', 'AP', 'UPI']
+
+
+def filename_meta(fn):
+    return str('INTERNAL_ID: %s' % fn.encode('utf8'))
+
+
+def split_text(fulltext):
+    """ Split an internally stored article into paragraphs. """
+    return (fulltext or u'').split('<br/>')
+
+
+def parse_txt(path, filename):
+    """ Parse a .txt article: title on the first line, then metadata lines and paragraphs. """
+    i     = 0
+    title = ''
+    pLine = ''
+    meta  = []
+    paras = []
+
+    with open(path, 'r') as f:
+        for line in f:
+            line  = line.strip()
+            words = line.split()
+
+            ## remove colon from first word in the line
+            if len(words) > 0:
+                words[0] = words[0].replace(":", '')
+
+            if line == '':
+                pass
+            elif i == 0:
+                ## first line is title
+                if words[0] == 'TITLE':
+                    line = " ".join(words[1:])
+
+                title = line
+            elif pLine != '' and words[0] in metawords:
+                meta.append(line)
+            else:
+                paras.append(line)
+
+            i += 1
+            pLine = line
+
+    ## append filename info
+    meta.append(filename)
+
+    return title, meta, paras
+
+
+def parse_ldc_xml(path, filename):
+    """ Parse an LDC (NYT corpus) XML article. """
+    record = next(ingest.iter_ldc(path))
+
+    meta = [record[k] for k in ('BYLINE', 'DATELINE') if k in record]
+    meta.append(filename)
+
+    return record['TITLE'], meta, record['TEXT'].split('<br/>')
+
+
+def parse_solr_doc(doc, meta_fields = solr_meta):
+    """ Split a Solr document into title, metadata, and paragraphs. Returns -2 as the title if there is no text. """
+    ## sometimes no text is available with AGW
+    if 'TEXT' not in doc:
+        return (-2, [], [])
+
+    paras = doc['TEXT'].split('<br/>')
+    meta  = []
+    for k in meta_fields:
+        if k in doc:
+            if k == 'DATE':
+                meta.append(doc[k][0].split('T')[0])
+            else:
+                meta.append(doc[k])
+
+    if 'TITLE' in doc:
+        title = doc['TITLE']
+    else:
+        title = paras[0]
+        del paras[0]
+
+    return title, meta, paras
+
+
+def clean_paragraphs(paras):
+    """ Drop a LEAD paragraph which repeats the first paragraph, and strip HTML from every paragraph. """
+    paras = list(paras)
+    if len(paras) > 1:
+        if paras[0].replace("LEAD: ", "") == paras[1]:
+            del paras[0]
+
+    return [tag_re.sub('', x) for x in paras]
+
+
+def meta_line(meta):
+    return " | ".join(map(lambda x: "%s" % x, meta)).strip()
+
+
+def paragraph_offsets(paras):
+    """ Returns (index, text, start, end) for each paragraph, as character offsets into the plain text. """
+    rows  = []
+    start = 0
+    for i, text in enumerate(paras):
+        rows.append( (i, text, start, start + len(text)) )
+
+        ## paragraphs are joined by newlines
+        start += len(text) + 1
+    return rows
+
+
+def render(title, meta, paras):
+    """ Returns the (text, html) pair for cleaned paragraphs. meta is the already-joined metadata line. """
+    ## paste together paragraphs, give them an ID
+    all_paras = ""
+    for i, text in enumerate(paras):
+        all_paras += "<p id='%d'>%s</p>\n" % (i, text)
+    all_paras = all_paras.strip()
+
+    html  = "<h4>%s</h4>\n" % title
+    html += "<p class='meta' id='meta'>%s</p>\n" % meta
+    html += "<div class='bodytext' id='bodytext'>\n%s\n</div>" % all_paras
+
+    return "\n".join(paras), html
+
+
+def stored(session, models, article_id, fingerprint):
+    """ (title, meta, paragraphs) of an article as scripts/ingest_paragraphs.py stored them,
+        in one statement. None if it hasn't been ingested, or has changed since. """
+    ArticleIngest, ArticleParagraph = models.ArticleIngest, models.ArticleParagraph
+    rows = session.query(ArticleIngest.fingerprint, ArticleIngest.title, ArticleIngest.meta, ArticleParagraph.text).\
+        outerjoin(ArticleParagraph, ArticleParagraph.article_id == ArticleIngest.article_id).\
+        filter(ArticleIngest.article_id == article_id).\
+        order_by(ArticleParagraph.paragraph_index).all()
+
+    if not rows or rows[0].fingerprint != fingerprint:
+        return None
+    return rows[0].title, rows[0].meta, [x.text for x in rows if x.text is not None]
+
+
+def text_fingerprint(text):
+    return hashlib.sha1((text or u'').encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path):
+    """ Modification time and size of an article file, or None if it's missing. """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return '%d-%d' % (st.st_mtime, st.st_size)
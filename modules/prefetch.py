@@ -0,0 +1,97 @@
+"""
+Background prefetching for coder queues.
+
+Jobs are keyed (e.g. by coder and pass). Every key carries a generation
+number; invalidating a key bumps its generation, and any job scheduled
+under an older generation drops the rest of its work the next time it
+checks in.
+
+Queues are also changed by assign_lib and the scripts, in other processes.
+A job can be scheduled against a shared cache Generation for its pass as
+well; assign_lib bumps it with queue_changed(), and the job goes stale then
+too. Jobs run on worker threads, so their failures are logged here.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import Generation
+
+log = logging.getLogger(__name__)
+
+
+class Prefetcher(object):
+    def __init__(self, workers = 2):
+        self._executor    = ThreadPoolExecutor(max_workers = workers)
+        self._generations = {}
+        self._pending     = set()
+        self._lock        = threading.Lock()
+
+        self.scheduled = 0
+        self.completed = 0
+        self.dropped   = 0
+        self.failed    = 0
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def invalidate(self, key):
+        """ Mark the queue behind this key as changed. In-flight jobs for it will stop. """
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def schedule(self, key, fn, *args, generation = None):
+        """
+            Run fn(is_stale, *args) on a worker thread. fn should call is_stale()
+            between units of work and return early when it is True. With a
+            generation, the job is also stale once that moves on.
+            Returns False if an identical job is already waiting.
+        """
+        token = generation.current() if generation is not None else None
+        with self._lock:
+            gen = self._generations.get(key, 0)
+            job = (key, gen, token) + args
+            if job in self._pending:
+                return False
+            self._pending.add(job)
+            self.scheduled += 1
+
+        def is_stale():
+            if self.generation(key) != gen:
+                return True
+            return generation is not None and generation.current() != token
+
+        def run():
+            try:
+                if is_stale():
+                    self.dropped += 1
+                    return
+
+                fn(is_stale, *args)
+
+                if is_stale():
+                    self.dropped += 1
+                else:
+                    self.completed += 1
+            except Exception:
+                self.failed += 1
+                log.exception("Prefetching for %r failed.", key)
+            finally:
+                with self._lock:
+                    self._pending.discard(job)
+
+        self._executor.submit(run)
+        return True
+
+    def stats(self):
+        return {'scheduled': self.scheduled, 'completed': self.completed,
+            'dropped': self.dropped, 'failed': self.failed, 'pending': len(self._pending)}
+
+
+def queue_changed(cache_dir, pass_number):
+    """ Tell the app's workers that queues for this pass changed, so they stop prefetching
+        for them. Without a cache_dir, they only hear of changes the app makes itself. """
+    if cache_dir:
+        Generation(cache_dir, 'queue_' + pass_number).bump()
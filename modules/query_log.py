@@ -0,0 +1,85 @@
+"""
+Recording the shapes of the queries the app issues, for
+scripts/explain_queries.py to run EXPLAIN on, and counting them.
+
+A shape is a statement with its IN lists collapsed to one placeholder, so
+the same query with different numbers of ids is recorded once. Each
+worker appends the first statement and parameters it sees of every
+shape to a JSON lines file; writes aren't recorded.
+
+A QueryCounter counts every statement run on an engine, per thread, so
+a view can report how many queries it took.
+"""
+
+import json
+import re
+import threading
+
+from sqlalchemy import event
+
+_in_list = re.compile(r'\(\s*(%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)')
+_space   = re.compile(r'\s+')
+
+## EXPLAIN access types which read the whole table or index
+full_scan_types = ['ALL', 'index']
+
+def shape(statement):
+    return _in_list.sub(r'(\1)', _space.sub(' ', statement).strip())
+
+
+def explainable(statement):
+    return statement.lstrip().split(None, 1)[0].upper() in ['SELECT', 'UPDATE', 'DELETE']
+
+
+class QueryLog(object):
+    def __init__(self, engine, path):
+        self.path  = path
+        self.seen  = set()
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not explainable(statement):
+            return
+
+        s = shape(statement)
+        with self._lock:
+            if s in self.seen:
+                return
+            self.seen.add(s)
+
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'shape': s, 'statement': statement,
+                    'parameters': parameters}, default = str) + '\n')
+
+
+def read(path):
+    """ The first statement and parameters logged for each shape, by shape. """
+    shapes = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            shapes.setdefault(entry['shape'], entry)
+    return shapes
+
+
+def full_scans(plan):
+    """ The rows of an EXPLAIN, as dicts, which scan a whole table or index. """
+    return [x for x in plan if x.get('type') in full_scan_types and x.get('table')]
+
+
+class QueryCounter(object):
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = self.count() + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    def count(self):
+        """ Statements run by this thread since the last reset. """
+        return getattr(self._local, 'count', 0)
+
@@ -0,0 +1,105 @@
+"""
+Recently viewed events, written off the request path.
+
+Each grid load marks its events as accessed by the coder. RecentWriter
+holds those marks and writes them on a background thread. Marks that
+arrive before the thread gets to them are merged, keeping the latest
+time for each (coder, key), so a burst of grid loads becomes a single
+write. Each table is written with one INSERT ... ON DUPLICATE KEY UPDATE,
+which depends on the unique keys on (coder_id, event_id) and
+(coder_id, canonical_id).
+
+prune() keeps the last few rows per coder. scripts/prune_recent.py runs
+it and is meant to be run from cron.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import and_, desc, or_, select
+from sqlalchemy.dialects import mysql
+
+
+def upsert(table, column, rows):
+    """ One statement which inserts (coder_id, key, last_accessed) rows into a recent table,
+        or moves last_accessed forward where the coder already has the key. """
+    stmt = mysql.insert(table).values([{'coder_id': c, column: k, 'last_accessed': t} for c, k, t in rows])
+    return stmt.on_duplicate_key_update(last_accessed = stmt.inserted.last_accessed)
+
+
+def prune(conn, table, keep):
+    """ Delete all but the keep most recently accessed rows of each coder. Returns rows deleted. """
+    t = table
+    deleted = 0
+    for coder_id, in conn.execute(select([t.c.coder_id]).distinct()).fetchall():
+        cutoff = conn.execute(select([t.c.last_accessed, t.c.id]).\
+            where(t.c.coder_id == coder_id).\
+            order_by(desc(t.c.last_accessed), desc(t.c.id)).\
+            limit(1).offset(keep - 1)).first()
+        if cutoff is None:
+            continue
+
+        last_accessed, id = cutoff
+        older = t.c.last_accessed == None
+        if last_accessed is not None:
+            older = or_(older, t.c.last_accessed < last_accessed,
+                and_(t.c.last_accessed == last_accessed, t.c.id < id))
+        else:
+            older = and_(older, t.c.id < id)
+
+        deleted += conn.execute(t.delete().where(and_(t.c.coder_id == coder_id, older))).rowcount
+    return deleted
+
+
+class RecentWriter(object):
+    def __init__(self, write):
+        """ write(batch) is called on the writer's thread with a dict of kind to a list
+            of (coder_id, key, last_accessed) rows. """
+        self._write     = write
+        self._executor  = ThreadPoolExecutor(max_workers = 1)
+        self._pending   = {}
+        self._scheduled = False
+        self._lock      = threading.Lock()
+
+        self.touches = 0
+        self.writes  = 0
+        self.failed  = 0
+
+    def touch(self, kind, coder_id, keys, now):
+        """ Mark keys as accessed by coder_id at now. Returns without waiting for the write. """
+        with self._lock:
+            pending = self._pending.setdefault(kind, {})
+            for key in keys:
+                pending[(coder_id, key)] = max(now, pending.get((coder_id, key), now))
+            self.touches += 1
+
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        self._executor.submit(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+
+        batch = {kind: [k + (t,) for k, t in sorted(rows.items())] for kind, rows in pending.items() if rows}
+        if not batch:
+            return
+
+        try:
+            self._write(batch)
+            self.writes += 1
+        except Exception:
+            self.failed += 1
+            raise
+
+    def wait(self):
+        """ Block until every mark made so far has been written. """
+        self._executor.submit(lambda: None).result()
+
+    def stats(self):
+        with self._lock:
+            pending = sum(len(x) for x in self._pending.values())
+        return {'touches': self.touches, 'writes': self.writes, 'failed': self.failed, 'pending': pending}
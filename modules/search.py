@@ -0,0 +1,96 @@
+"""
+Search expressions with bound parameters, compiled once per shape.
+
+The shape of a search is everything which decides its SQL: the fields
+and comparisons of its filters, how many terms its search box has, its
+sorts, and which cursor values are NULL. Expressions are built with named
+bound parameters in place of the values, so every search of a shape has
+the same statement. StatementCache builds and compiles that statement the
+first time the shape is seen, and later searches only bind their values.
+
+LIKE patterns escape %, _ and the escape character in the user's text, so
+that they match literally.
+
+An event can have several flags, so flags are filtered with EXISTS and
+sorted on by the first of them, rather than joined in, which would give
+an event once per flag.
+"""
+
+import operator
+
+from sqlalchemy import and_, bindparam, exists, func, or_, select
+
+from .cache import LRUCache
+
+ESCAPE = '\\'
+
+_patterns = {'contains': u'%{}%', 'starts': u'{}%', 'ends': u'%{}'}
+
+_operators = {'eq': operator.eq, 'ne': operator.ne, 'lt': operator.lt,
+    'le': operator.le, 'gt': operator.gt, 'ge': operator.ge}
+
+def escape_like(value):
+    return value.replace(ESCAPE, ESCAPE * 2).replace('%', ESCAPE + '%').replace('_', ESCAPE + '_')
+
+
+def bound_value(compare, value):
+    """ The value to bind for a comparison: an escaped pattern for LIKE comparisons. """
+    if compare in _patterns:
+        return _patterns[compare].format(escape_like(value))
+    return value
+
+
+def compare(column, compare, param):
+    """ column compared to param, a bound parameter or a value from bound_value(). """
+    if compare in _patterns:
+        return column.like(param, escape = ESCAPE)
+    if compare not in _operators:
+        raise Exception('Invalid filter compare: {}'.format(compare))
+    return _operators[compare](column, param)
+
+
+def param(name):
+    """ A bound parameter whose value is given when the statement is run. """
+    return bindparam(name)
+
+
+def flag_filter(event_id, flags, filter_compare, param):
+    """ Condition for events with a flag for which the comparison holds. event_id is the
+        event's column, flags the model of its flags. As in the bitmap index, 'ne' also
+        matches events without any flags. """
+    matches = exists().where(and_(flags.event_id == event_id, compare(flags.flag, filter_compare, param)))
+    if filter_compare == 'ne':
+        return or_(matches, ~exists().where(flags.event_id == event_id))
+    return matches
+
+
+def flag_sort(event_id, flags):
+    """ The first of an event's flags, NULL if it has none, to sort events on. """
+    return select([func.min(flags.flag)]).where(flags.event_id == event_id).as_scalar()
+
+
+class StatementCache(object):
+    """ Compiled statements keyed on shape. Compiled statements don't change once
+        built, so one can be run by any number of threads at once. """
+
+    def __init__(self, maxsize = 256):
+        self.compiled = LRUCache(maxsize)
+        self.builds   = 0
+
+    def compile(self, shape, dialect, build):
+        """ The compiled statement for shape, calling build() for the statement the first time. """
+        key = (dialect.name, shape)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = build().compile(dialect = dialect)
+            self.compiled.set(key, compiled)
+            self.builds += 1
+        return compiled
+
+    def execute(self, session, shape, build, params):
+        """ Run the statement for shape in the session's transaction, with params by name. """
+        conn = session.connection()
+        return conn.execute(self.compile(shape, conn.dialect, build), params)
+
+    def stats(self):
+        return dict(self.compiled.stats(), builds = self.builds)
@@ -0,0 +1,127 @@
+"""
+Pooled HTTP client for Apache Solr.
+
+Connections are kept alive and reused between requests, every request has
+a timeout, and failed requests are retried a small number of times on a
+fresh connection before giving up with a SolrError.
+"""
+
+import json
+import threading
+
+try:
+    ## Python 3
+    import http.client as httplib
+    from queue import LifoQueue, Empty, Full
+    from urllib.parse import urlencode, urlsplit
+except ImportError:
+    ## Python 2
+    import httplib
+    from Queue import LifoQueue, Empty, Full
+    from urllib import urlencode
+    from urlparse import urlsplit
+
+
+class SolrError(Exception):
+    pass
+
+
+def quote_term(term):
+    """ Quote a term for use in a Solr query, escaping quotes and backslashes. """
+    return '"%s"' % term.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class SolrClient(object):
+    def __init__(self, base_url, timeout = 5.0, retries = 2, pool_size = 8):
+        url = urlsplit(base_url)
+
+        self.scheme    = url.scheme
+        self.host      = url.hostname
+        self.port      = url.port
+        self.path      = url.path.rstrip('/')
+        self.timeout   = timeout
+        self.retries   = retries
+        self._pool     = LifoQueue(maxsize = pool_size)
+        self._lock     = threading.Lock()
+
+        self.requests    = 0
+        self.connections = 0
+        self.failures    = 0
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            with self._lock:
+                self.connections += 1
+            if self.scheme == 'https':
+                return httplib.HTTPSConnection(self.host, self.port, timeout = self.timeout)
+            return httplib.HTTPConnection(self.host, self.port, timeout = self.timeout)
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def select(self, params, handler = 'select'):
+        """ POST a query to the handler and return the decoded JSON response. """
+        params = dict(params)
+        params['wt'] = 'json'
+        body    = urlencode(params, True).encode('utf-8')
+        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+            'Connection': 'keep-alive'}
+
+        last_error = None
+        for _ in range(self.retries + 1):
+            conn = self._acquire()
+            try:
+                with self._lock:
+                    self.requests += 1
+                conn.request('POST', '%s/%s' % (self.path, handler), body, headers)
+                res  = conn.getresponse()
+                data = res.read()
+            except (httplib.HTTPException, IOError, OSError) as e:
+                ## stale keep-alive connection or timeout, try again on a fresh one
+                conn.close()
+                last_error = e
+                continue
+
+            if res.status >= 500:
+                conn.close()
+                last_error = SolrError('Solr returned HTTP %d' % res.status)
+                continue
+
+            self._release(conn)
+
+            if res.status != 200:
+                raise SolrError('Solr returned HTTP %d' % res.status)
+
+            return json.loads(data.decode('utf-8'))
+
+        with self._lock:
+            self.failures += 1
+        raise SolrError('Cannot connect to Solr: %s' % last_error)
+
+    def get_by_ids(self, ids, chunk_size = 200):
+        """ Fetch documents by id with one query per chunk. Returns a dict of id -> document. """
+        docs = {}
+        ids  = list(ids)
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            res   = self.select({
+                'q': 'id:(%s)' % ' OR '.join(quote_term(x) for x in chunk),
+                'rows': len(chunk)
+            })
+
+            if res['responseHeader']['status'] != 0:
+                raise SolrError('Solr returned status %d' % res['responseHeader']['status'])
+
+            for doc in res['response']['docs']:
+                docs[doc['id']] = doc
+
+        return docs
+
+    def stats(self):
+        return {'requests': self.requests, 'connections': self.connections,
+            'failures': self.failures, 'idle': self._pool.qsize()}
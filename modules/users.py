@@ -0,0 +1,66 @@
+"""
+A snapshot of the user table, for looking up usernames without a query.
+
+The app keeps one UserDirectory per worker, rebuilt when the user table's
+generation is bumped. Rows are plain tuples rather than ORM objects, so
+they can be shared between requests; detached() turns one back into a
+User which can be merged into a session without loading it again.
+
+The app bumps the generation itself when it writes to the user table.
+Code which writes users with a session of its own, such as setup.py or
+assign_lib run from a shell, calls users_changed() after committing.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from .cache import Generation
+
+UserRow = namedtuple('UserRow', ['id', 'username', 'password', 'authlevel'])
+
+class UserDirectory(object):
+    def __init__(self, rows = ()):
+        self._rows  = sorted((UserRow(*x) for x in rows), key = lambda x: x.id)
+        self._by_id = {x.id: x for x in self._rows}
+        self._names = {x.id: x.username for x in self._rows}
+        self._ids   = {x.username: x.id for x in self._rows}
+
+    def get(self, id):
+        """ The row for a user id, or None. """
+        return self._by_id.get(id)
+
+    def username(self, id):
+        row = self._by_id.get(id)
+        return row.username if row is not None else None
+
+    def names(self):
+        """ Usernames keyed by id. Shared by every caller, so don't modify it. """
+        return self._names
+
+    def ids(self):
+        """ Ids keyed by username. Shared by every caller, so don't modify it. """
+        return self._ids
+
+    def rows(self):
+        """ All users, in id order. """
+        return list(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def detached(model, row):
+    """ A detached instance of the User model for a row, as if it had been loaded and
+        expunged. session.merge(instance, load = False) attaches it without a query. """
+    user = model(username = row.username, password = row.password, authlevel = row.authlevel)
+    user.id = row.id
+    make_transient_to_detached(user)
+    return user
+
+
+def users_changed(cache_dir):
+    """ Tell the app's workers to rebuild their directories. Without a cache_dir, they
+        pick the change up after USER_CACHE_MAX_AGE seconds. """
+    if cache_dir:
+        Generation(cache_dir, 'users').bump()
@@ -9,12 +9,15 @@
 """
 
 ## base
+import gzip
+import hashlib
 import json
 import math
 import os
 import re
 import string
 import sys
+import time
 import urllib
 import datetime as dt
 from random import choice
@@ -27,8 +30,7 @@ import urllib.request
 import pandas as pd
 import numpy as np
 
-## lxml, time
-from lxml import etree
+## time
 from pytz import timezone
 
 ## flask
@@ -43,14 +45,27 @@ import jinja2
 from .assign_lib import *
 
 ## db
-from sqlalchemy import func, desc, distinct, and_, or_
+from sqlalchemy import bindparam, func, desc, distinct, and_, or_, select
 
 ## app-specific
-from .database import db_session
+from .database import db_session, mysql_engine
+from . import models
+from .modules import fulltext, grid, hierarchy, keyset, paragraphs, query_log, search
+from .modules.articles import article_ids, article_query
+from .modules.autocomplete import KeyIndex
+from .modules.bitmap import BitmapIndex, popcount
+from .modules.cache import Derived, DiskCache, Generation, Generations, LRUCache, TieredCache
+from .modules.canonical_search import canonical_conditions
+from .modules.graph import CanonicalGraph
+from .modules.invalidation import TableWatcher
+from .modules.prefetch import Prefetcher
+from .modules.recent import RecentWriter, upsert
+from .modules.solr_client import SolrClient, SolrError, quote_term
+from .modules.users import UserDirectory, detached
 
 from .models import ArticleMetadata, ArticleQueue, CanonicalEvent, CanonicalEventLink, CanonicalEventRelationship, \
     CoderArticleAnnotation, CodeFirstPass, CodeSecondPass, CodeEventCreator, \
-    Event, EventCreatorQueue, EventFlag, EventMetadata, \
+    Event, EventCreatorQueue, EventFlag, EventMetadata, MatchAgainst, \
     RecentEvent, RecentCanonicalEvent, SecondPassQueue, User
 
 ##### Enable OrderedDict with PyYAML
@@ -167,7 +182,181 @@ event_creator_single_value = app.config['SINGLE_VALUE_VARS']
 event_creator_single_value.extend([[x[0] for x in v] for k, v in yes_no_vars.iteritems()])
 
 ## metadata for Solr
-meta_solr = ['PUBLICATION', 'SECTION', 'BYLINE', 'DATELINE', 'DATE', 'INTERNAL_ID']
+meta_solr = paragraphs.solr_meta
+
+## pooled keep-alive connections to Solr
+solr = SolrClient(app.config['SOLR_ADDR'],
+    timeout = app.config.get('SOLR_TIMEOUT', 5),
+    retries = app.config.get('SOLR_RETRIES', 2)) if app.config.get('SOLR_ADDR') else None
+
+## brotli is optional; gzip is used when it isn't installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+## cache of rendered articles, shared by every view which calls prepText
+## keyed on (article id, content fingerprint)
+article_cache = TieredCache(
+    LRUCache(app.config.get('ARTICLE_CACHE_SIZE', 512)),
+    DiskCache(app.config['ARTICLE_CACHE_DIR'], 'article', app.config.get('ARTICLE_CACHE_DIR_SIZE', 20000))
+        if app.config.get('ARTICLE_CACHE_DIR') else None)
+
+## bumps cache generations after commits which write to the tables behind them
+table_watcher = TableWatcher(db_session)
+
+## compiled adjudication search statements, one for each shape of search
+search_statements = search.StatementCache()
+
+## records the shape of every query for scripts/explain_queries.py
+if app.config.get('QUERY_LOG'):
+    query_log.QueryLog(mysql_engine, app.config['QUERY_LOG'])
+
+## counts the queries each request runs, for the Query-Count header
+query_counter = query_log.QueryCounter(mysql_engine) if app.config.get('COUNT_QUERIES', False) else None
+
+## cache of adjudication search result ids, keyed on the normalised search and the
+## generation of the tables searched. with CACHE_DIR set, the generations and the
+## second tier are shared by every worker.
+search_generations = {
+    'candidate': Generation(app.config.get('CACHE_DIR'), 'search_candidate'),
+    'canonical': Generation(app.config.get('CACHE_DIR'), 'search_canonical')}
+search_cache = TieredCache(
+    LRUCache(app.config.get('SEARCH_CACHE_SIZE', 256)),
+    DiskCache(app.config['CACHE_DIR'], 'search') if app.config.get('CACHE_DIR') else None)
+search_cache_ttl = app.config.get('SEARCH_CACHE_TTL', 600)
+
+def _search_tables_changed(search_mode):
+    search_generations[search_mode].bump()
+
+    ## entries under the old generation are never read again. the memory tier drops
+    ## them as it fills; files on disk go once they are past the TTL.
+    if search_cache.disk is not None:
+        search_cache.disk.expire(search_cache_ttl)
+
+## candidate searches only read event metadata and flags. canonical searches filter on
+## codings through the links, so code_event_creator counts for them.
+table_watcher.watch(['event_metadata', 'event_flag'], lambda: _search_tables_changed('candidate'))
+table_watcher.watch(['canonical_event', 'canonical_event_link', 'code_event_creator'],
+    lambda: _search_tables_changed('canonical'))
+
+## usernames and authlevels, for looking up users without a query. rebuilt after
+## any commit in the app which writes to the user table, e.g. _add_user, and when
+## setup.py or assign_lib bump the generation with users_changed().
+user_generation = Generation(app.config.get('CACHE_DIR'), 'users')
+user_directory = Derived(user_generation,
+    lambda: UserDirectory(db_session.query(User.id, User.username, User.password, User.authlevel).all()),
+    max_age = app.config.get('USER_CACHE_MAX_AGE', 600))
+
+table_watcher.watch(['user'], user_generation.bump)
+
+## bitmap index over event_metadata, answering candidate search filters in memory.
+## rebuilt when generate_event_metadata.py bumps the generation, the app writes to the
+## table, or after BITMAP_MAX_AGE seconds. flags change far more often, so they are
+## kept apart and rebuilt on their own.
+bitmap_columns = ['publication', 'form', 'issue', 'racial_issue', 'coder_id', 'start_date']
+event_metadata_generation = Generation(app.config.get('CACHE_DIR'), 'event_metadata')
+event_flag_generation     = Generation(app.config.get('CACHE_DIR'), 'event_flag')
+table_watcher.watch(['event_metadata'], event_metadata_generation.bump)
+table_watcher.watch(['event_flag'], event_flag_generation.bump)
+
+def _build_event_bitmaps():
+    rows = db_session.query(EventMetadata.id, EventMetadata.event_id, 
+        *[getattr(EventMetadata, x) for x in bitmap_columns]).order_by(EventMetadata.id).all()
+    return BitmapIndex([x[0] for x in rows], 
+        {name: [x[i + 2] for x in rows] for i, name in enumerate(bitmap_columns)},
+        date_columns = ['start_date'],
+        keys = {'event_id': [x[1] for x in rows]})
+
+def _build_flag_bitmaps():
+    ## an event can have several flags
+    flags = {}
+    for event_id, flag in db_session.query(EventFlag.event_id, EventFlag.flag).all():
+        flags.setdefault(event_id, []).append(flag)
+    return event_bitmaps.get().joined('event_id', flags)
+
+event_bitmaps = None
+flag_bitmaps  = None
+if app.config.get('BITMAP_INDEX', False):
+    ## without CACHE_DIR, other workers' flag writes and generate_event_metadata.py
+    ## can't bump this worker's generations, so the indexes also expire
+    bitmap_max_age = app.config.get('BITMAP_MAX_AGE', 300)
+    event_bitmaps = Derived(event_metadata_generation, _build_event_bitmaps, max_age = bitmap_max_age)
+    flag_bitmaps  = Derived(Generations(event_metadata_generation, event_flag_generation), _build_flag_bitmaps,
+        max_age = bitmap_max_age)
+
+## index of canonical event keys for the autocomplete. modal_edit and delete_canonical
+## are the only places keys change; they update this worker's index, and bump the
+## generation so other workers rebuild theirs.
+canonical_key_generation = Generation(app.config.get('CACHE_DIR'), 'canonical_keys')
+canonical_keys = Derived(canonical_key_generation,
+    lambda: KeyIndex(x[0] for x in db_session.query(CanonicalEvent.key).all()),
+    max_age = app.config.get('AUTOCOMPLETE_MAX_AGE', 3600))
+
+def _canonical_keys_changed(removed = None, added = None):
+    """ Call after committing a change to canonical event keys. """
+    old   = canonical_key_generation.current()
+    index = canonical_keys.peek()
+    if index is not None:
+        if removed is not None:
+            index.remove(removed)
+        if added is not None:
+            index.add(added)
+
+    canonical_keys.adopt(old, canonical_key_generation.bump())
+
+## graph of canonical events and their relationships, for the hierarchy view. kept up
+## to date like the key index: writes here update this worker's graph and bump the
+## generation so other workers rebuild theirs.
+canonical_graph_generation = Generation(app.config.get('CACHE_DIR'), 'canonical_graph')
+
+def _build_canonical_graph():
+    return CanonicalGraph(db_session.query(CanonicalEvent.id, CanonicalEvent.key).all(),
+        db_session.query(CanonicalEventRelationship.canonical_id1, CanonicalEventRelationship.canonical_id2,
+            CanonicalEventRelationship.relationship_type).order_by(CanonicalEventRelationship.id).all())
+
+canonical_graph = None
+if app.config.get('CANONICAL_GRAPH', True):
+    canonical_graph = Derived(canonical_graph_generation, _build_canonical_graph,
+        max_age = app.config.get('CANONICAL_GRAPH_MAX_AGE', 3600))
+
+def _canonical_graph_changed(update):
+    """ Call after committing a change to canonical events or relationships, with
+        a function which makes the same change to a CanonicalGraph. """
+    if canonical_graph is None:
+        return
+
+    old   = canonical_graph_generation.current()
+    graph = canonical_graph.peek()
+    if graph is not None:
+        update(graph)
+
+    canonical_graph.adopt(old, canonical_graph_generation.bump())
+
+## relationship writes keep canonical_event_closure up to date, but on an existing
+## database it starts out empty and has to be built once with
+## scripts/build_hierarchy_closure.py. until it is, cycle checks would pass everything.
+## once built it stays built, so each worker only checks until it sees that.
+closure_built = False
+closure_missing = "The canonical event hierarchy hasn't been built. Run scripts/build_hierarchy_closure.py."
+
+def _closure_built():
+    global closure_built
+    if not closure_built:
+        closure_built = hierarchy.built(db_session, models)
+    return closure_built
+
+## renders the next few articles in a coder's queue in the background
+## number of articles to prefetch, per pass
+prefetch_n = app.config.get('PREFETCH_ARTICLES', {'1': 3, '2': 3, 'ec': 3})
+prefetcher = Prefetcher(app.config.get('PREFETCH_WORKERS', 2))
+
+## bumped by assign_lib when it changes a pass's queues, which stops prefetching for
+## that pass in every worker. the app also invalidates the queues it changes itself.
+queue_generations = {pn: Generation(app.config.get('CACHE_DIR'), 'queue_' + pn) for pn in ['1', '2', 'ec']}
+
+## writes recently viewed events in the background
+recent_writer = RecentWriter(lambda batch: _write_recent(batch))
 
 #####
 ##### Helper functions
@@ -175,168 +364,152 @@ meta_solr = ['PUBLICATION', 'SECTION', 'BYLINE', 'DATELINE', 'DATE', 'INTERNAL_I
 
 ##### load text from Solr database
 def loadSolr(solr_id):
-    solr_id    = urllib.quote(solr_id)
-    url        = '%s/select?q=id:"%s"&wt=json' % (app.config['SOLR_ADDR'], solr_id)
     not_found  = (0, [], [])
     no_connect = (-1, [], [])
 
     try:
-        if (sys.version_info < (3, 0)):
-            ## Python 2
-            req  = urllib2.Request(url)
-            res  = urllib2.urlopen(req)
-        else:
-            ## Python 3
-            res = urllib.request.urlopen(url)
-    except:
+        res = solr.select({'q': 'id:%s' % quote_term(solr_id)})
+    except SolrError:
         return no_connect
-    res = json.loads(res.read())
+
     if res['responseHeader']['status'] != 0:
         return not_found
 
     if len(res['response']['docs']) != 1:
         return not_found
 
-    doc = res['response']['docs'][0]
+    return parseSolrDoc(res['response']['docs'][0])
 
-    ## sometimes no text is available with AGW
-    if 'TEXT' not in doc:
-        return (-2, [], [])
+def loadSolrMany(solr_ids):
+    """ Load many articles from Solr in batched id:(...) queries. 
+        Returns a dict of Solr ID -> (title, meta, paras), using the same error codes as loadSolr. """
+    try:
+        docs = solr.get_by_ids(solr_ids)
+    except SolrError:
+        return {x: (-1, [], []) for x in solr_ids}
 
-    paras = doc['TEXT'].split('<br/>')
-    meta  = []
-    for k in meta_solr:
-        if k in doc:
-            if k == 'DATE':
-                meta.append(doc[k][0].split('T')[0])
-            else:
-                meta.append(doc[k])
+    return {x: parseSolrDoc(docs[x]) if x in docs else (0, [], []) for x in solr_ids}
 
-    if 'TITLE' in doc:
-        title = doc['TITLE']
-    else:
-        title = paras[0]
-        del paras[0]
+def parseSolrDoc(doc):
+    """ Split a Solr document into title, metadata, and paragraphs. """
+    return paragraphs.parse_solr_doc(doc, meta_solr)
+
+def articleFingerprint(article):
+    """ Cheap fingerprint of the article contents, so cached renderings go stale when the text changes. """
+    if app.config['STORE_ARTICLES_INTERNALLY'] == True:
+        return paragraphs.text_fingerprint(article.text)
+    elif app.config['SOLR'] == True:
+        return article.db_id
 
-    return title, meta, paras
+    ## files on disk: use modification time and size
+    return paragraphs.file_fingerprint(app.config['DOC_ROOT'] + article.filename)
+
+def articleQuery():
+    """ Query for articles to display. Loads the deferred text column up front when articles are stored internally. """
+    return article_query(db_session, models, text = app.config['STORE_ARTICLES_INTERNALLY'] == True)
 
 ## prep any article for display
-def prepText(article):
-    fn                 = article.filename
-    db_id              = article.db_id
-    atitle             = article.title
-    pub_date           = article.pub_date
-    publication        = article.publication
-    fulltext           = article.text
-
-    metawords = ['DATE', 'PUBLICATION', 'LANGUAGE', 'DATELINE', 'SECTION',
-    'EDITION', 'LENGTH', 'DATE', 'SEARCH_ID', 'Published', 'By', 'AP', 'UPI']
-
-    text  = ''
-    html  = ''
-    title = ''
-    meta  = []
-    paras = []
-    path  = app.config['DOC_ROOT'] + fn
-
-    filename = str('INTERNAL_ID: %s' % fn.encode('utf8'))
+def prepText(article, solr_result = None):
+    """ Returns the (text, html) pair for the article, from the rendered-article cache if possible.
+        solr_result can pass in an already-fetched result from loadSolrMany. """
+    fingerprint = articleFingerprint(article)
+    key    = (article.id, fingerprint)
+    cached = article_cache.get(key)
+    if cached is not None:
+        return cached
+
+    text, html, cacheable = _renderText(article, solr_result, fingerprint)
+
+    ## don't hold on to Solr errors
+    if cacheable:
+        article_cache.set(key, (text, html))
+
+    return text, html
+
+def _renderText(article, solr_result = None, fingerprint = None):
+    cacheable = True
+
+    ## use the paragraphs stored at ingest, unless the article has changed since
+    ingested = None
+    if app.config.get('USE_INGESTED_PARAGRAPHS', False) == True:
+        ingested = paragraphs.stored(db_session, models, article.id, fingerprint)
+
+    if ingested is not None:
+        title, meta, paras = ingested
+    else:
+        title, meta, paras = parseArticle(article, solr_result)
+
+        ## don't hold on to Solr errors
+        if title in (0, -1, -2):
+            cacheable = False
 
-    if app.config['STORE_ARTICLES_INTERNALLY'] == True:
-        title = atitle
-        meta = [publication, pub_date, db_id]
-        paras = fulltext.split('<br/>')
-    elif app.config['SOLR'] == True:
-        title, meta, paras = loadSolr(db_id)
         if title == 0:
             title = "Cannot find article in Solr."
         elif title == -1:
             title = "Cannot connect to Solr."
         elif title == -2:
             title = "No text. Skip article."
-    elif re.match(r"^.+txt$", fn):
-        i     = 0
-        title = ''
-        pLine = ''
-
-        f = open(path, 'r')
-
-        for line in f:
-            line  = line.strip()
-            words = line.split()
-
-            ## remove colon from first word in the line
-            if len(words) > 0:
-                words[0] = words[0].replace(":", '')
-
-            if False:
-                pass
-            elif line == '':
-                pass
-            elif i == 0:
-                ## first line is title
-                if words[0] == 'TITLE':
-                    line = " ".join(words[1:])
-
-                title = line
-            elif pLine != '' and words[0] in metawords:
-                meta.append(line)
-            else:
-                ## add to html
-                paras.append(line)
 
-            i += 1
-            pLine = line
+        paras = paragraphs.clean_paragraphs(paras)
+        meta  = paragraphs.meta_line(meta)
 
-        ## append filename info
-        meta.append(filename)
-    elif re.match(r"^.+xml$", fn):
-        ## this format only works for LDC XML files
-        tree     = etree.parse(open(path, "r"))
-        headline = tree.xpath("/nitf/body[1]/body.head/hedline/hl1")
-        paras    = tree.xpath("/nitf/body/body.content/block[@class='full_text']/p")
-        lead     = tree.xpath("/nitf/body/body.content/block[@class='lead_paragraph']/p")
-        byline   = tree.xpath("/nitf/body/body.head/byline[@class='print_byline']")
-        dateline = tree.xpath("/nitf/body/body.head/dateline")
-
-        if len(byline):
-            meta.append(byline[0].text)
-
-        if len(dateline):
-            meta.append(dateline[0].text)
-
-        meta.append(filename)
-
-        title = headline[0].text
-        paras = [x.text for x in paras]
-
-    ## get rid of lead if it says the same thing
-    if len(paras) > 0:
-        p0 = paras[0]
-        p0 = p0.replace("LEAD: ", "")
-        if len(paras) > 1:
-            if p0 == paras[1]:
-                del paras[0]
-
-    ## remove HTML from every paragraph
-    paras = [re.sub(r'<[^>]*>', '', x) for x in paras]
-             
-    ## paste together paragraphs, give them an ID
-    all_paras = ""
-    for i, text in enumerate(paras):
-        all_paras += "<p id='%d'>%s</p>\n" % (i, text)
-    all_paras = all_paras.strip()
-
-    html  = "<h4>%s</h4>\n" % title
-    html += "<p class='meta' id='meta'>%s</p>\n" % " | ".join(map(lambda x: "%s" % x, meta)).strip()
-    html += "<div class='bodytext' id='bodytext'>\n%s\n</div>" % all_paras
-
-    ## plain-text
-    text = "\n".join(paras)
+    text, html = paragraphs.render(title, meta, paras)
 
     text = text.encode("utf-8")
     html = html.encode("utf-8")
 
-    return text, html
+    return text, html, cacheable
+
+def parseArticle(article, solr_result = None):
+    """ Parse an article from wherever it is stored into (title, meta, paragraphs). """
+    fn       = article.filename
+    path     = app.config['DOC_ROOT'] + fn
+    filename = paragraphs.filename_meta(fn)
+
+    if app.config['STORE_ARTICLES_INTERNALLY'] == True:
+        return article.title, [article.publication, article.pub_date, article.db_id], \
+            paragraphs.split_text(article.text)
+    elif app.config['SOLR'] == True:
+        return solr_result if solr_result else loadSolr(article.db_id)
+    elif re.match(r"^.+txt$", fn):
+        return paragraphs.parse_txt(path, filename)
+    elif re.match(r"^.+xml$", fn):
+        ## this format only works for LDC XML files
+        return paragraphs.parse_ldc_xml(path, filename)
+
+    return '', [], []
+
+def _prefetchArticles(is_stale, coder_id, pn, current_aid):
+    """ Render the next unfinished articles in this coder's queue into the article cache. """
+    model = {'1': ArticleQueue, '2': SecondPassQueue, 'ec': EventCreatorQueue}[pn]
+
+    try:
+        next_ids = [x[0] for x in db_session.query(model.article_id).\
+            filter(model.coder_id == coder_id, model.coded_dt == None, model.article_id != current_aid).\
+            order_by(model.id).limit(prefetch_n[pn]).all()]
+
+        articles = articleQuery().filter(ArticleMetadata.id.in_(next_ids)).all()
+
+        ## fetch all the Solr documents in one go
+        solr_results = {}
+        if app.config['SOLR'] == True and app.config['STORE_ARTICLES_INTERNALLY'] != True:
+            solr_results = loadSolrMany([x.db_id for x in articles])
+
+        for article in articles:
+            ## queue changed underneath us, stop
+            if is_stale():
+                return
+
+            prepText(article, solr_results.get(article.db_id))
+    finally:
+        ## this runs on a worker thread, which gets its own scoped session
+        db_session.remove()
+
+def schedulePrefetch(coder_id, pn, current_aid):
+    """ Queue up prefetching for the articles after current_aid. """
+    if prefetch_n.get(pn, 0) > 0:
+        prefetcher.schedule((coder_id, pn), _prefetchArticles, coder_id, pn, int(current_aid),
+            generation = queue_generations[pn])
 
 def validate( x ):
     """ replace newlines, returns, and tabs with blank space """
@@ -414,6 +587,83 @@ def hashcode(s):
 def shutdown_session(exception=None):
     db_session.remove()
 
+@app.before_request
+def startQueryCount():
+    if query_counter is not None:
+        query_counter.reset()
+
+@app.after_request
+def queryCountHeader(response):
+    """ Report how many queries the request took, when COUNT_QUERIES is on. """
+    if query_counter is not None:
+        response.headers['Query-Count'] = query_counter.count()
+    return response
+
+## responses which get ETags and compression
+compress_mimetypes = ['text/html', 'application/json', 'text/css', 'application/javascript']
+
+def _pickEncoding():
+    """ Content-Encoding to use for this request, or None. """
+    if not app.config.get('COMPRESS_RESPONSES', True):
+        return None
+
+    accepted = request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    elif 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def _notModified(etag):
+    """ Returns a 304 response if the client already has the content behind this ETag, 
+        in any of its encodings, otherwise None. """
+    for suffix in ('', '-gzip', '-br'):
+        if request.if_none_match.contains(etag + suffix):
+            response = app.response_class(status = 304)
+            response.set_etag(etag + suffix)
+            response.vary.add('Accept-Encoding')
+            response.cache_control.private  = True
+            response.cache_control.no_cache = True
+            return response
+    return None
+
+@app.after_request
+def conditionalResponse(response):
+    """ Set strong ETags on GET responses, answer If-None-Match with a 304, and compress large bodies.
+        Views which can compute an ETag before rendering set it themselves with response.set_etag. """
+    if request.method != 'GET' or response.status_code != 200 or response.direct_passthrough:
+        return response
+    if response.mimetype not in compress_mimetypes or 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    etag = response.get_etag()[0] or hashlib.sha1(data).hexdigest()
+
+    not_modified = _notModified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    ## pages depend on who is logged in, so only the browser may keep them,
+    ## and it has to check back with us before reusing them
+    response.cache_control.private  = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+
+    encoding = _pickEncoding()
+    if encoding is None or len(data) < app.config.get('COMPRESS_MIN_SIZE', 1024):
+        response.set_etag(etag)
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality = 5))
+    else:
+        response.set_data(gzip.compress(data, compresslevel = 6))
+
+    response.headers['Content-Encoding'] = encoding
+    response.set_etag('%s-%s' % (etag, encoding))
+
+    return response
+
 ### auth stuff
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -437,7 +687,12 @@ def logout():
 
 @lm.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    row = user_directory.get().get(int(id))
+    if row is None:
+        return None
+
+    ## attach the cached user to this request's session without loading it again
+    return db_session.merge(detached(User, row), load = False)
 
 ## views
 @app.route('/')
@@ -478,11 +733,13 @@ def code1Next():
 @app.route('/code1/<aid>')
 @login_required
 def code1(aid):
-    article    = db_session.query(ArticleMetadata).filter_by(id = aid).first()
+    article    = articleQuery().filter_by(id = aid).first()
     text, html = prepText(article)
 
     aq = db_session.query(ArticleQueue).filter_by(coder_id = current_user.id, article_id = aid).first()
 
+    schedulePrefetch(current_user.id, '1', aid)
+
     return render_template("code1.html", vars = vars, aid = aid, text = html.decode('utf-8'))
 
 
@@ -549,9 +806,11 @@ def code2(aid):
             ## else, just mark existence
             cfp_dict[cfp.variable] += 1
 
-    article    = db_session.query(ArticleMetadata).filter_by(id = aid).first()
+    article    = articleQuery().filter_by(id = aid).first()
     text, html = prepText(article)
 
+    schedulePrefetch(current_user.id, '2', aid)
+
     return render_template(
         "code2.html",
         vars       = vars,
@@ -583,9 +842,11 @@ def ecNext():
 @login_required
 def eventCreator(aid):
     aid        = int(aid)
-    article    = db_session.query(ArticleMetadata).filter_by(id = aid).first()
+    article    = articleQuery().filter_by(id = aid).first()
     text, html = prepText(article)
 
+    schedulePrefetch(current_user.id, 'ec', aid)
+
     return render_template("event-creator.html", aid = aid, text = html.decode('utf-8'))
 
 #####
@@ -653,18 +914,25 @@ def load_adj_grid():
     ## store recent events
     _store_recent_events(cand_event_ids, canonical_event_key)
 
-    ## do loading for the grid    
-    cand_events = _load_candidate_events(cand_event_ids)
-    canonical_event = _load_canonical_event(key = canonical_event_key)
-    links = _load_links(canonical_event_key)
-    event_flags = _load_event_flags(cand_event_ids)
+    ## skip rendering if nothing in the grid has changed since the client last loaded it
+    etag = _adj_grid_etag(cand_event_ids, canonical_event_key)
+    not_modified = _notModified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    ## do loading for the grid, in two statements however many events are open
+    data = grid.load(db_session, models, cand_event_ids, canonical_event_key,
+        app.config['ADJ_METADATA'], user_directory.get().names())
 
-    return render_template('adj-grid.html',
-        canonical_event = canonical_event,
-        cand_events = cand_events,
-        links = links,
-        flags = event_flags, 
-        adj_grid_order = adj_grid_order)
+    response = make_response(render_template('adj-grid.html',
+        canonical_event = data.canonical_event,
+        cand_events = data.cand_events,
+        links = data.links,
+        flags = data.flags, 
+        adj_grid_order = adj_grid_order))
+    response.set_etag(etag)
+
+    return response
 
 
 @app.route('/load_recent_candidate_events', methods = ['POST'])
@@ -688,7 +956,7 @@ def load_recent_canonical_events():
         .filter(RecentCanonicalEvent.coder_id == current_user.id)\
         .order_by(desc(RecentCanonicalEvent.last_accessed)).limit(5).all()
 
-    users = {x.id: x.username for x in  db_session.query(User).all()}
+    users = user_directory.get().names()
 
     return render_template('adj-canonical-search-block.html', 
         events = events, 
@@ -701,170 +969,108 @@ def load_recent_canonical_events():
 def load_canonical_hierarchy():
     """ Load and render canonical event hierarchy. """
     key = request.form['key']
-    cid = _load_canonical_id_from_key(key)
+
+    ## ancestors and descendants of any depth, from the graph or the closure table
+    if canonical_graph is not None:
+        graph = canonical_graph.get()
+        cid   = graph.id_of(key)
+    else:
+        cid = _load_canonical_id_from_key(key)
 
     if not cid:
         return make_response("Invalid key.", 400)
 
-    parents = db_session.query(CanonicalEvent, CanonicalEventRelationship)\
-        .join(CanonicalEventRelationship, CanonicalEvent.id == CanonicalEventRelationship.canonical_id2)\
-        .filter(CanonicalEventRelationship.canonical_id1 == cid)\
-        .order_by(CanonicalEventRelationship.relationship_type, CanonicalEvent.key).all()
-
-    children = db_session.query(CanonicalEvent, CanonicalEventRelationship)\
-        .join(CanonicalEventRelationship, CanonicalEvent.id == CanonicalEventRelationship.canonical_id1)\
-        .filter(CanonicalEventRelationship.canonical_id2 == cid)\
-        .order_by(CanonicalEventRelationship.relationship_type, CanonicalEvent.key).all()            
-
-    gcs = db_session.query(CanonicalEvent, CanonicalEventRelationship)\
-        .join(CanonicalEventRelationship, CanonicalEvent.id == CanonicalEventRelationship.canonical_id1)\
-        .filter(CanonicalEventRelationship.canonical_id2.in_([x[0].id for x in children])).all()
-
-    ## index GCs by parents
-    grandchildren = {}
-    for ce, cer in gcs:
-        if cer.canonical_id2 not in grandchildren:
-            grandchildren[cer.canonical_id2] = [] 
-        grandchildren[cer.canonical_id2].append((ce, cer))
+    if canonical_graph is not None:
+        data = graph.hierarchy(cid)
+    elif not _closure_built():
+        return make_response(closure_missing, 500)
+    else:
+        data = hierarchy.load(db_session, models, cid)
 
     return render_template('adj-canonical-hierarchy.html',
         key = key,
         cid = cid,
-        parents = parents, 
-        children = children,
-        grandchildren = grandchildren)
+        parents = data.parents, 
+        children = data.children)
 
-#####
-## Search functions
-#####
 
-@app.route('/do_search/<search_mode>', methods = ['POST'])
+@app.route('/canonical_hierarchy', methods = ['GET'])
 @login_required
-def do_search(search_mode):
-    """Takes the URL params and searches events which meet the search criteria."""
+def canonical_hierarchy_json():
+    """ The hierarchy around a canonical event as JSON, with its ancestors and descendants
+        nested up to depth levels, and every event related to it at all. """
+    if canonical_graph is None:
+        return make_response("The canonical event graph is turned off.", 404)
 
-    if search_mode not in ['candidate', 'canonical']:
-        return make_response("Invalid search mode.", 400)
+    key   = request.args.get('key')
+    depth = request.args.get('depth', None, type = int)
 
-    search_str = request.form[search_mode + '_search_input']
-    users = {x.id: x.username for x in db_session.query(User).all()}
+    graph = canonical_graph.get()
+    cid   = graph.id_of(key)
+    if cid is None:
+        return make_response("Invalid key.", 400)
 
-    ## get multiple filters and sorting
-    filters = []
-    sorts = []
+    data = graph.tree(cid, depth)
+    data['component'] = [{'id': x, 'key': graph.key_of(x)} for x in graph.component(cid)]
 
-    ## cycle through all the filter and sort fields
-    for i in range(4):
-        filter_field = request.form[search_mode + '_filter_field_{}'.format(i)]
-        filter_value = request.form[search_mode + '_filter_value_{}'.format(i)]
-        filter_compare = request.form[search_mode + '_filter_compare_{}'.format(i)]
+    return jsonify(result={"status": 200, "data": data})
 
-        if filter_field and filter_value and filter_compare:
-            _model, filter_field, filter_value, _filter2 = _get_model_and_field(search_mode, filter_field, filter_value)
-
-            ## Translate the filter compare to a SQLAlchemy expression.
-            if filter_compare == 'eq':
-                _filter = getattr(getattr(_model, filter_field), '__eq__')(filter_value)
-            elif filter_compare == 'ne':
-                _filter = getattr(getattr(_model, filter_field), '__ne__')(filter_value)
-                ## in the case where we're excluding a flag, need to OR "flag IS NULL"
-                if filter_field == 'flag' and search_mode == 'candidate':
-                    _filter2 = getattr(getattr(_model, filter_field), '__eq__')(None)
-                    _filter = or_(_filter, _filter2)
-            elif filter_compare == 'lt':
-                _filter = getattr(getattr(_model, filter_field), '__lt__')(filter_value)
-            elif filter_compare == 'le':
-                _filter = getattr(getattr(_model, filter_field), '__le__')(filter_value)
-            elif filter_compare == 'gt':
-                _filter = getattr(getattr(_model, filter_field), '__gt__')(filter_value)
-            elif filter_compare == 'ge':
-                _filter = getattr(getattr(_model, filter_field), '__ge__')(filter_value)
-            elif filter_compare == 'contains':
-                _filter = getattr(getattr(_model, filter_field), 'like')(u'%{}%'.format(filter_value))
-            # TODO: Add when we convert this to Python 3
-            # elif filter_compare == 'not_contains': 
-            #     _filter = getattr(getattr(_model, filter_field), 'not_like')(u'%{}%'.format(filter_value))
-            elif filter_compare == 'starts':
-                _filter = getattr(getattr(_model, filter_field), 'like')(u'{}%'.format(filter_value))
-            elif filter_compare == 'ends':
-                _filter = getattr(getattr(_model, filter_field), 'like')(u'%{}'.format(filter_value))
-            else:
-                raise Exception('Invalid filter compare: {}'.format(filter_compare))
+#####
+## Search functions
+#####
 
-            ## AND the two filters together
-            _filter = and_(_filter, _filter2)
-            
-            ## add to list of filters
-            filters.append(_filter)
+def _search_cache_key(search_mode, form):
+    """ The parts of a search which determine its results, normalised so that the
+        same search entered differently shares a cache entry. """
+    filters = set()
+    sorts   = []
+    for i in range(4):
+        _filter = tuple(form.get(search_mode + '_filter_{}_{}'.format(x, i), '') for x in ['field', 'compare', 'value'])
+        if all(_filter):
+            filters.add(_filter)
 
-        sort_field = request.form[search_mode + '_sort_field_{}'.format(i)]
-        sort_order = request.form[search_mode + '_sort_order_{}'.format(i)]
+        _sort = tuple(form.get(search_mode + '_sort_{}_{}'.format(x, i), '') for x in ['field', 'order'])
+        if all(_sort):
+            sorts.append(_sort)
 
-        if sort_field and sort_order:
-            _model, sort_field, _, _ = _get_model_and_field(search_mode, sort_field, None)
+    ## filters are ANDed together, so their order doesn't matter, but sort order does
+    return (search_mode, form.get(search_mode + '_search_input', '').strip(), tuple(sorted(filters)), tuple(sorts),
+        form.get('cursor') or None, app.config.get('SEARCH_PAGE_SIZE', 100), app.config.get('FULLTEXT_SEARCH', False))
 
-            _sort = getattr(getattr(_model, sort_field), sort_order)()
-            sorts.append(_sort)
 
-    ## AND all the filters together
-    filter_expr = and_(*filters)
+@app.route('/do_search/<search_mode>', methods = ['POST'])
+@login_required
+def do_search(search_mode):
+    """Takes the URL params and searches events which meet the search criteria."""
 
-    search_expr = None
-    if search_str:
-        ## Build the search expression. For now, it can only do an AND or OR search.
-        operator = and_
-        if ' AND ' in search_str:
-            search_terms = map(lambda x: x.strip(), search_str.split(' AND '))
-            operator = and_
-        elif ' OR ' in search_str:
-            search_terms = map(lambda x: x.strip(), search_str.split(' OR '))
-            operator = or_
-        else:
-            search_terms = [search_str.strip()]
+    if search_mode not in ['candidate', 'canonical']:
+        return make_response("Invalid search mode.", 400)
 
-        ## only allow the free-form search in EventMetadata and CanonicalEvent fields
-        _model = EventMetadata if search_mode == 'candidate' else CanonicalEvent
+    ## repeated searches come from the cache. read the generation before searching,
+    ## so that results are never stored under a generation newer than they are.
+    cache_key = (search_generations[search_mode].current(), _search_cache_key(search_mode, request.form))
+    cached = search_cache.get(cache_key) if search_cache_ttl else None
 
-        ## get searchable metadata
-        search_fields = _model.__table__.columns.keys()
-        search_fields.remove('id')
-
-        ## Build the search by creating an expression for each search term and search field.
-        search_expr = []
-        for term in search_terms:
-            term_expr = []
-            for field in search_fields:
-                term_expr.append(getattr(getattr(_model, field), 'like')(u'%{}%'.format(term)))
-            search_expr.append(or_(*term_expr))
-        search_expr = operator(*search_expr) 
-
-    ## Combine filters.
-    a_filter_expr = None
-    if search_mode == 'candidate':
-        ## Filter out null start dates to account for disqualifying information.
-        date_filter = EventMetadata.start_date != None
-        if filter_expr is not None and search_expr is not None:
-            a_filter_expr = and_(filter_expr, search_expr, date_filter)
-        elif filter_expr is not None:
-            a_filter_expr = and_(filter_expr, date_filter)
-        elif search_expr is not None:
-            a_filter_expr = and_(search_expr, date_filter)
-        else:
-            return make_response("Please enter a search term or a filter.", 400)
+    if cached is not None and time.time() - cached[0] < search_cache_ttl:
+        _, search_events_ids, next_cursor, n_results = cached
+        cache_status = 'hit'
     else:
-        if len(filters) == 0 and search_expr is None:
-            return make_response("Please enter a search term or a filter.", 400)
+        result = _search_ids(search_mode)
+        if not isinstance(result, tuple):
+            ## an error response
+            return result
 
-    ## Perform the search on a left join to get all the candidate events.
-    search_events = []
-    if search_mode == 'candidate':
-        search_events = db_session.query(EventMetadata).\
-            join(EventFlag, EventMetadata.event_id == EventFlag.event_id, isouter = True).\
-            filter(a_filter_expr).\
-            order_by(*sorts).all()
+        search_events_ids, next_cursor, n_results = result
+        if search_cache_ttl:
+            search_cache.set(cache_key, (time.time(), search_events_ids, next_cursor, n_results))
+        cache_status = 'miss'
 
-        if len(search_events) > 1000:
-            return make_response("Too many results. Please refine your search.", 400)
+    is_page = bool(request.form.get('cursor'))
+    if search_mode == 'candidate':
+        ## get the full events, in the order of the search
+        em_by_id = {x.id: x for x in db_session.query(EventMetadata).\
+            filter(EventMetadata.id.in_(search_events_ids)).all()} if search_events_ids else {}
+        search_events = [em_by_id[x] for x in search_events_ids if x in em_by_id]
 
         ## get all flags for these events
         flags = _load_event_flags([x.event_id for x in search_events])
@@ -872,39 +1078,17 @@ def do_search(search_mode):
         response = make_response(
             render_template('adj-search-block.html', 
                 events = search_events,
-                flags = flags)
+                flags = flags,
+                is_page = is_page,
+                next_cursor = next_cursor)
             )
     else:
-        search_events_ids = None
-
-        if search_str:
-            filters.append(search_expr)
+        users = user_directory.get().names()
 
-        ## need to do the intersect between different filterings
-        for _filter in filters:
-            rs = db_session.query(CanonicalEvent).\
-                join(CanonicalEventLink, CanonicalEventLink.canonical_id == CanonicalEvent.id, isouter = True).\
-                join(CodeEventCreator, CodeEventCreator.id == CanonicalEventLink.cec_id, isouter = True).\
-                filter(_filter).all()
-
-            rs = set([x.id for x in rs])
-            print(search_expr, len(rs))
-
-            ## if search_events is not null, then return the intersection of these two
-            if search_events_ids is not None:
-                search_events_ids = search_events_ids.intersection(rs)
-            else:
-                search_events_ids = rs
-
-        ## lastly, get the full CanonicalEvents, sorted by key
-        search_events = db_session.query(CanonicalEvent).\
-            join(CanonicalEventLink, CanonicalEventLink.canonical_id == CanonicalEvent.id, isouter = True).\
-            join(CodeEventCreator, CodeEventCreator.id == CanonicalEventLink.cec_id, isouter = True).\
-            filter(CanonicalEvent.id.in_(search_events_ids)).\
-            order_by(*sorts).all()
-        
-        if len(search_events) > 1000:
-            return make_response("Too many results. Please refine your search.", 400)
+        ## get the full CanonicalEvents, in the order of the search
+        ce_by_id = {x.id: x for x in db_session.query(CanonicalEvent).\
+            filter(CanonicalEvent.id.in_(search_events_ids)).all()} if search_events_ids else {}
+        search_events = [ce_by_id[x] for x in search_events_ids if x in ce_by_id]
 
         ## get the associated candidate events
         rs = db_session.query(CanonicalEvent, EventMetadata).\
@@ -914,7 +1098,7 @@ def do_search(search_mode):
             filter(
                 CanonicalEvent.id.in_(search_events_ids), 
                 CodeEventCreator.variable != 'link' 
-            ).all()
+            ).all() if search_events_ids else []
 
         ## create a hashtable which maps canonical event keys to candidate events
         cand_events = {}
@@ -928,28 +1112,329 @@ def do_search(search_mode):
                 events = search_events,
                 cand_events = cand_events,
                 users = users,
-                is_search = True)
+                is_search = True,
+                is_page = is_page,
+                next_cursor = next_cursor)
         )
 
-    url_params = {k: v for k, v in request.form.iteritems()}
+    url_params = {k: v for k, v in request.form.iteritems() if k != 'cursor'}
 
-    ## make and return results. add in the number of results to update the button.
-    response.headers['Search-Results'] = len(search_events)
+    ## make and return results. add in the number of results to update the button,
+    ## and the cursor for the next page, if there is one.
+    if n_results is not None:
+        response.headers['Search-Results'] = n_results
+    response.headers['Search-Cursor'] = next_cursor or ''
+    response.headers['Search-Cache'] = cache_status
     response.headers['Query'] = json.dumps(url_params)
     return response
 
 
+def _filter_expr(search_mode, filter_field, filter_compare, name):
+    """ The model and SQLAlchemy expression for one row of the search filters, comparing
+        against the bound parameter name. Its value comes from _filter_value(). """
+    _model, filter_field, _, _filter2 = _get_model_and_field(search_mode, filter_field, None)
+
+    ## events can have several flags, so they're matched with EXISTS rather than joined
+    if filter_field == 'flag' and search_mode == 'candidate':
+        return EventMetadata, search.flag_filter(EventMetadata.event_id, EventFlag, filter_compare, search.param(name))
+
+    ## Translate the filter compare to a SQLAlchemy expression.
+    _filter = search.compare(getattr(_model, filter_field), filter_compare, search.param(name))
+
+    ## AND the two filters together
+    return _model, and_(_filter, _filter2)
+
+
+def _filter_value(search_mode, filter_field, filter_compare, filter_value):
+    """ The value to bind to the parameter of a filter row. """
+    _, _, filter_value, _ = _get_model_and_field(search_mode, filter_field, filter_value)
+    return search.bound_value(filter_compare, filter_value)
+
+
+def _use_fulltext(search_groups):
+    return app.config.get('FULLTEXT_SEARCH', False) and fulltext.indexable(search_groups)
+
+
+def _text_search_expr(_model, search_groups, name = 'term'):
+    """ Expression for the free-form search box on a model, and the relevance to sort by
+        when the FULLTEXT index answers it (otherwise None). Terms are bound parameters
+        named after name, with values from _text_search_params(). """
+    if _use_fulltext(search_groups):
+        ## use the FULLTEXT index
+        search_rank = MatchAgainst(
+            [getattr(_model, x) for x in fulltext.columns[_model.__tablename__]],
+            search.param(name))
+        return search_rank > 0, search_rank
+
+    ## get searchable metadata
+    search_fields = _model.__table__.columns.keys()
+    search_fields.remove('id')
+
+    ## Build the search by creating an expression for each search term and search field.
+    search_expr = or_(*[
+        and_(*[
+            or_(*[search.compare(getattr(_model, field), 'contains', search.param('{}_{}_{}'.format(name, i, j)))
+                for field in search_fields])
+            for j, term in enumerate(terms)])
+        for i, terms in enumerate(search_groups)])
+    return search_expr, None
+
+
+def _text_search_params(search_groups, name = 'term'):
+    if _use_fulltext(search_groups):
+        return {name: fulltext.boolean_query(search_groups)}
+
+    return {'{}_{}_{}'.format(name, i, j): search.bound_value('contains', fulltext.like_text(term))
+        for i, terms in enumerate(search_groups) for j, term in enumerate(terms)}
+
+
+def _text_search_shape(search_groups):
+    """ What decides the text search expression: the index used and the number of terms. """
+    return (bool(_use_fulltext(search_groups)), tuple(len(x) for x in search_groups))
+
+
+def _search_ids(search_mode):
+    """ Runs the search in the URL params. Returns the ids of one page of results, the cursor
+        for the next page (None on the last page), and the total number of results (None after
+        the first page). Returns an error response if the search is invalid. """
+    search_str = request.form[search_mode + '_search_input']
+
+    ## get multiple filters and sorting
+    filter_rows = []
+    sort_rows = []
+
+    ## cycle through all the filter and sort fields
+    for i in range(4):
+        filter_field = request.form[search_mode + '_filter_field_{}'.format(i)]
+        filter_value = request.form[search_mode + '_filter_value_{}'.format(i)]
+        filter_compare = request.form[search_mode + '_filter_compare_{}'.format(i)]
+
+        if filter_field and filter_value and filter_compare:
+            filter_rows.append((filter_field, filter_compare, filter_value))
+
+        sort_field = request.form[search_mode + '_sort_field_{}'.format(i)]
+        sort_order = request.form[search_mode + '_sort_order_{}'.format(i)]
+
+        if sort_field and sort_order in ['asc', 'desc']:
+            sort_rows.append((sort_field, sort_order))
+
+    ## OR-groups of terms in the search box
+    search_groups = fulltext.parse(search_str) if search_str else []
+    if search_str and not search_groups:
+        return make_response("Please enter a search term or a filter.", 400)
+    if search_mode == 'canonical' and not filter_rows and not search_groups:
+        return make_response("Please enter a search term or a filter.", 400)
+
+    ## values are bound to the statement, which is the same for every search of this shape
+    params = {'filter_{}'.format(i): _filter_value(search_mode, *x) for i, x in enumerate(filter_rows)}
+    params.update(_text_search_params(search_groups))
+    shape  = (search_mode, tuple(x[:2] for x in filter_rows), _text_search_shape(search_groups), tuple(sort_rows))
+
+    ## filters alone can be answered from the bitmap index, if it covers all of them
+    matches = None
+    if search_mode == 'candidate' and event_bitmaps is not None and not search_groups:
+        matches = _bitmap_matches(filter_rows)
+
+    def build_keys():
+        """ The sort keys, ending with the relevance, if there is one, and the id. """
+        _model = EventMetadata if search_mode == 'candidate' else CanonicalEvent
+        sort_keys = []
+        for sort_field, sort_order in sort_rows:
+            _sort_model, sort_field, _, _ = _get_model_and_field(search_mode, sort_field, None)
+            if _sort_model is EventFlag:
+                sort_keys.append((search.flag_sort(EventMetadata.event_id, EventFlag), sort_order))
+            else:
+                sort_keys.append((getattr(_sort_model, sort_field), sort_order))
+
+        ## rank results by relevance after any chosen sorts
+        if search_groups:
+            _, search_rank = _text_search_expr(_model, search_groups)
+            if search_rank is not None:
+                sort_keys.append((search_rank, 'desc'))
+
+        sort_keys.append((_model.id, 'asc'))
+        return sort_keys
+
+    ## results come a page at a time, continuing from the cursor of the last page
+    page_size = app.config.get('SEARCH_PAGE_SIZE', 100)
+    sort_keys = build_keys()
+
+    cursor = request.form.get('cursor')
+    cursor_values = None
+    if cursor:
+        try:
+            cursor_values = keyset.decode_cursor(cursor, len(sort_keys))
+        except ValueError as e:
+            return make_response(str(e), 400)
+
+    ## the ids of the bitmap's matches stand in for the filters, if there aren't too many
+    by_ids = False
+    if matches is not None:
+        n_matches = popcount(matches)
+
+        ## in id order, the page comes straight from the bitmap
+        if len(sort_keys) == 1:
+            search_events_ids, more = event_bitmaps.get().page(matches, 
+                cursor_values[0] if cursor_values else None, page_size)
+            next_cursor = keyset.encode_cursor([search_events_ids[-1]]) if more else None
+            return search_events_ids, next_cursor, n_matches if cursor_values is None else None
+
+        ## otherwise SQL sorts the matching rows, found by id
+        if n_matches == 0:
+            return [], None, 0 if cursor_values is None else None
+        elif n_matches <= app.config.get('BITMAP_MAX_IDS', 10000):
+            by_ids = True
+            params['ids'] = event_bitmaps.get().page(matches, None, n_matches)[0]
+
+    if cursor_values is not None:
+        _, cursor_bound = keyset.cursor_params(sort_keys, cursor_values)
+        params.update(cursor_bound)
+
+    def build_conditions():
+        """ The WHERE conditions of the search. """
+        filters = [_filter_expr(search_mode, field, compare, 'filter_{}'.format(i))
+            for i, (field, compare, _) in enumerate(filter_rows)]
+
+        if search_mode == 'candidate':
+            if by_ids:
+                return [EventMetadata.id.in_(bindparam('ids', expanding = True))]
+
+            conditions = [x[1] for x in filters]
+            if search_groups:
+                conditions.append(_text_search_expr(EventMetadata, search_groups)[0])
+
+            ## Filter out null start dates to account for disqualifying information.
+            return conditions + [EventMetadata.start_date != None]
+
+        if search_groups:
+            filters.append((CanonicalEvent, _text_search_expr(CanonicalEvent, search_groups)[0]))
+
+        ## one statement for all the filters
+        return canonical_conditions(CanonicalEvent, CanonicalEventLink, CodeEventCreator, filters)
+
+    def build_query(*columns):
+        if search_mode == 'candidate':
+            return db_session.query(*columns).select_from(EventMetadata).filter(*build_conditions())
+        return db_session.query(*columns).filter(*build_conditions())
+
+    def build_page():
+        sort_keys = build_keys()
+        cursor = keyset.cursor_params(sort_keys, cursor_values)[0] if cursor_values is not None else None
+        return keyset.page_query(build_query(*[x[0] for x in sort_keys]), sort_keys, cursor, page_size).statement
+
+    def build_count():
+        _model = EventMetadata if search_mode == 'candidate' else CanonicalEvent
+        return build_query(func.count(distinct(_model.id))).statement
+
+    ## NULL cursor values change the statement, other values are bound
+    cursor_shape = tuple(x is None for x in cursor_values) if cursor_values is not None else None
+    rows = search_statements.execute(db_session, shape + (by_ids, cursor_shape, page_size), build_page, params).fetchall()
+    rows, next_values = keyset.split(rows, page_size)
+    search_events_ids = [x[-1] for x in rows]
+    next_cursor = keyset.encode_cursor(next_values) if next_values is not None else None
+
+    ## the total is only counted for the first page
+    n_results = None
+    if cursor_values is None:
+        if matches is not None:
+            n_results = n_matches
+        else:
+            n_results = search_statements.execute(db_session, shape + ('count',), build_count, params).scalar()
+
+    return search_events_ids, next_cursor, n_results
+
+
+def _bitmap_matches(filter_rows):
+    """ Bitmap of the candidate events matching every filter row and having a start date,
+        or None if the bitmap index can't answer one of the filters. """
+    index = event_bitmaps.get()
+    matches = index.match(filter_rows, extra = {'flag': flag_bitmaps.get()}, null_matches_ne = ['flag'])
+    if matches is None:
+        return None
+
+    ## the same as the date filter in the SQL
+    return matches & index.columns['start_date'].not_null
+
+
+## candidate search fields with few enough distinct values to count
+candidate_facet_fields = ['publication', 'form', 'issue', 'racial_issue', 'location', 'flag', 'coder_id', 'start_date']
+
+@app.route('/search_facets/candidate', methods = ['POST'])
+@login_required
+def search_facets():
+    """ Counts of candidate events for each value of the facet_field(s), among events matching
+        the rest of the search. The filter row being edited, facet_row, is left out. """
+    fields = request.form.getlist('facet_field')
+    if not fields or any(x not in candidate_facet_fields for x in fields):
+        return make_response("Invalid facet field.", 400)
+
+    ## drop the row being edited, so its own value doesn't narrow the counts
+    form = request.form.to_dict()
+    facet_row = request.form.get('facet_row')
+    if facet_row is not None:
+        for x in ['field', 'compare', 'value']:
+            form['candidate_filter_{}_{}'.format(x, facet_row)] = ''
+
+    cache_key = (search_generations['candidate'].current(), 'facets', tuple(fields), _search_cache_key('candidate', form))
+    cached = search_cache.get(cache_key) if search_cache_ttl else None
+    if cached is not None and time.time() - cached[0] < search_cache_ttl:
+        return jsonify(result={"status": 200, "data": cached[1]})
+
+    ## the same conditions as the search, including leaving out events with no start date
+    conditions = [EventMetadata.start_date != None]
+    params = {}
+    for i in range(4):
+        filter_field, filter_compare, filter_value = [form.get('candidate_filter_{}_{}'.format(x, i), '') 
+            for x in ['field', 'compare', 'value']]
+        if filter_field and filter_value and filter_compare:
+            name = 'filter_{}'.format(i)
+            conditions.append(_filter_expr('candidate', filter_field, filter_compare, name)[1])
+            params[name] = _filter_value('candidate', filter_field, filter_compare, filter_value)
+
+    search_groups = fulltext.parse(form.get('candidate_search_input', ''))
+    if search_groups:
+        conditions.append(_text_search_expr(EventMetadata, search_groups)[0])
+        params.update(_text_search_params(search_groups))
+
+    ## one grouped query per facet, most common values first. flag filters are EXISTS
+    ## subqueries, so event_flag is only joined for the flag facet, and events with
+    ## several flags are still counted once for each value.
+    facets = {}
+    n = func.count(distinct(EventMetadata.id))
+    for field in fields:
+        query = db_session.query(EventMetadata.id).select_from(EventMetadata)
+        if field == 'flag':
+            col   = EventFlag.flag
+            query = query.join(EventFlag, EventMetadata.event_id == EventFlag.event_id)
+        else:
+            col   = getattr(EventMetadata, field)
+
+        rs = query.with_entities(col, n).\
+            filter(*conditions).\
+            group_by(col).\
+            order_by(desc(n), col).\
+            limit(app.config.get('FACET_LIMIT', 50)).\
+            params(params).all()
+
+        facets[field] = [[x.isoformat() if isinstance(x, dt.date) else x, count] for x, count in rs if x is not None]
+
+    if search_cache_ttl:
+        search_cache.set(cache_key, (time.time(), facets))
+
+    return jsonify(result={"status": 200, "data": facets})
+
+
 @app.route('/search_canonical_autocomplete', methods=['POST'])
 @login_required
 def search_canonical_events():
     """Returns a list of canonical event keys based on search term for the autocomplete."""
     term = request.form['term']
 
-    ## search for the canonical event in key 
-    rs = db_session.query(CanonicalEvent).filter(CanonicalEvent.key.like('%{}%'.format(term))).all()
+    ## prefix matches first, then keys containing the term
+    keys = canonical_keys.get().search(term, app.config.get('AUTOCOMPLETE_LIMIT', 20))
 
     ## return the list of canonical event keys
-    return jsonify(result={"status": 200, "data": [x.key for x in rs]})
+    return jsonify(result={"status": 200, "data": keys})
 
 
 #####
@@ -1036,6 +1521,62 @@ def add_canonical_record():
         cel_id = cel.id) 
 
 
+@app.route('/add_canonical_records', methods = ['POST'])
+@login_required
+def add_canonical_records():
+    """ Adds many candidate event data to canonical events at once: the CEC records in
+        cec_ids and every record of the candidate events in event_ids go to canonical_event_id,
+        and pairs of cec_id:canonical_id go where they say. Records already there are skipped.
+        Returns all the new canonical cells together. Takes five statements however
+        many records there are. """
+    try:
+        canonical_event_id = request.form.get('canonical_event_id')
+        canonical_event_id = int(canonical_event_id) if canonical_event_id else None
+        cec_ids   = set(int(x) for x in request.form.get('cec_ids', '').split(',') if x)
+        event_ids = set(int(x) for x in request.form.get('event_ids', '').split(',') if x)
+        pairs     = [tuple(int(y) for y in x.split(':')) for x in request.form.get('pairs', '').split(',') if x]
+    except ValueError:
+        return make_response("Invalid ids.", 400)
+
+    if (cec_ids or event_ids) and canonical_event_id is None:
+        return make_response("Please select a canonical event first.", 400)
+
+    if any(len(x) != 2 for x in pairs):
+        return make_response("Pairs should be cec_id:canonical_id.", 400)
+
+    ## the same fields the grid has add buttons for
+    variables = [x[0] for x in adj_grid_order if x[0] not in ['article-desc', 'desc']]
+    wanted    = cec_ids | set(x[0] for x in pairs)
+    by_id     = OrderedDict((x.id, x) for x in grid.records(db_session, models, wanted, event_ids, variables))
+
+    if wanted - set(by_id):
+        return make_response("No such CEC record: {}.".format(min(wanted - set(by_id))), 404)
+
+    canonical_ids = set(x[1] for x in pairs) | ({canonical_event_id} if canonical_event_id is not None else set())
+    missing       = canonical_ids - grid.canonical_ids(db_session, models, canonical_ids)
+    if missing:
+        return make_response("No such canonical event: {}.".format(min(missing)), 404)
+
+    links = [(x.id, canonical_event_id) for x in by_id.values()
+        if x.id in cec_ids or (x.event_id in event_ids and x.variable in variables)]
+    cels, skipped = grid.add_links(db_session, models, links + pairs, current_user.id,
+        dt.datetime.now(tz = central).replace(tzinfo = None))
+
+    ## render before committing, which would expire every record and link
+    cells = []
+    for cel in cels:
+        record = by_id[cel.cec_id]
+        cells.append({'canonical_id': cel.canonical_id, 'var': record.variable, 'cel_id': cel.id,
+            'html': render_template('canonical-cell.html',
+                var = record.variable,
+                value = record.text if record.text is not None else record.value,
+                timestamp = cel.timestamp,
+                cel_id = cel.id)})
+    db_session.commit()
+
+    return jsonify(result={"status": 200, "data": cells, "skipped": skipped})
+
+
 @app.route('/add_canonical_relationship', methods = ['POST'])
 @login_required
 def add_canonical_relationship():
@@ -1067,10 +1608,19 @@ def add_canonical_relationship():
     if res:
         return make_response("Relationship of this type already exists.", 400)
 
+    if not _closure_built():
+        return make_response(closure_missing, 500)
+
+    if hierarchy.creates_cycle(db_session, models, id1, id2):
+        return make_response("%s is already above %s in the hierarchy." % (key1, key2), 400)
+
     ## commit
     db_session.add(CanonicalEventRelationship(current_user.id, id1, id2, rtype))
+    hierarchy.add_edge(db_session, models, id1, id2)
     db_session.commit()
 
+    _canonical_graph_changed(lambda graph: graph.add_edge(id1, id2, rtype))
+
     return make_response("Relationship added.", 200)
 
 
@@ -1092,10 +1642,16 @@ def delete_canonical_relationship():
     if not res:
         return make_response("Relationship does not exist.", 400)
 
+    if not _closure_built():
+        return make_response(closure_missing, 500)
+
     ## commit
     db_session.delete(res)
+    hierarchy.remove_edge(db_session, models, id1, id2)
     db_session.commit()
 
+    _canonical_graph_changed(lambda graph: graph.remove_edge(id1, id2, rtype))
+
     return make_response("Relationship deleted.", 200)
 
 
@@ -1137,6 +1693,9 @@ def delete_canonical():
                 CanonicalEventRelationship.canonical_id2 == ce.id)
         ).all()
 
+    if relationships and not _closure_built():
+        return make_response(closure_missing, 500)
+
     ## remove these first to avoid FK error
     for cel in cels:
         db_session.delete(cel)
@@ -1144,11 +1703,17 @@ def delete_canonical():
         db_session.delete(rce)
     for relationship in relationships:
         db_session.delete(relationship)
+        hierarchy.remove_edge(db_session, models, relationship.canonical_id1, relationship.canonical_id2)
     db_session.commit()
 
     ## delete the actual event
+    ce_id = ce.id
     db_session.delete(ce)
     db_session.commit()
+
+    ## keep the autocomplete and graph up to date
+    _canonical_keys_changed(removed = key)
+    _canonical_graph_changed(lambda graph: graph.remove_event(ce_id))
     
     return make_response("Canonical event deleted.", 200)
 
@@ -1227,6 +1792,7 @@ def download_canonical(event_ids):
     """ Downloads canonical events based on IDs. Serves it as a CSV. """
     event_ids = [int(x) for x in event_ids.split(',')]
     all_data = []
+    users = user_directory.get()
 
     for canonical_id in event_ids:
         data = {}
@@ -1237,7 +1803,7 @@ def download_canonical(event_ids):
 
         ## get all canonical metadata
         data['key'] = ce.key
-        data['coder'] = db_session.query(User).filter(User.id == ce.coder_id).first().username
+        data['coder'] = users.username(ce.coder_id)
         data['description'] = ce.description
         data['notes'] = ce.notes
 
@@ -1318,6 +1884,10 @@ def modal_edit(variable, mode):
         db_session.add(ce)
         db_session.commit()
 
+        ## keep the autocomplete and graph up to date
+        _canonical_keys_changed(removed = original_key if mode == 'edit' else None, added = key)
+        _canonical_graph_changed(lambda graph: graph.set_event(ce.id, key))
+
         ## Return new event and put the new ID in the header.
         return make_response("Canonical event {}ed.".format(mode), 200)
     else:
@@ -1417,8 +1987,7 @@ def _check_or_add_dummy_value(article_id, variable, value):
 @login_required
 def _get_model_and_field(search_mode, field, value):
     """ Return the correct model and field for filter and sort in searches. """
-    users = {x.id: x.username for x in db_session.query(User).all()}
-    rev_users = {v: k for k,v in users.iteritems()}
+    rev_users = user_directory.get().ids()
 
     _model = None
     _field = field
@@ -1453,91 +2022,40 @@ def _get_model_and_field(search_mode, field, value):
 
     return (_model, _field, _value, _filter2)
 
-@app.route('/_load_candidate_events')
-@login_required
-def _load_candidate_events(cand_event_ids):
-    """Helper function to load candidate events from the database.
-    Returns a dict of candidate events, keyed by id."""
-    cand_events = {x: {} for x in cand_event_ids}
-
-    ## load in metadata
-    for metadata in db_session.query(EventMetadata).\
-        filter(EventMetadata.event_id.in_(cand_event_ids)).all():
-        cand_events[metadata.event_id]['metadata'] = {}
-
-        for field in app.config['ADJ_METADATA']:
-            cand_events[metadata.event_id]['metadata'][field] = metadata.__getattribute__(field)
-
-    for field in db_session.query(CodeEventCreator).\
-        filter(CodeEventCreator.event_id.in_(cand_event_ids)).all():
-
-        ## create a new list if it doesn't exist
-        if not cand_events[field.event_id].get(field.variable):
-            cand_events[field.event_id][field.variable] = []
-        
-        ## insert in record
-        if field.text is not None:
-            value = field.text
-        else:
-            value = field.value
-
-        cand_events[field.event_id][field.variable].append((value, field.id, field.timestamp))
-    
-    return cand_events
-
-
-@app.route('/_load_canonical_event')
-@login_required
-def _load_canonical_event(id = None, key = None):
-    """Loads the canonical event and related CEC links from the database.
-       To be displayed in the expanded event view grid."""
-    if not id and not key:
-        return None
+def _adj_grid_etag(cand_event_ids, canonical_event_key):
+    """ Version of everything the grid shows, from aggregates over the rows behind it.
+        Changes whenever a linked CanonicalEventLink, CodeEventCreator, or EventFlag row 
+        is added, removed, or edited, or the canonical event itself changes. """
+    def checksum(*cols):
+        return func.concat_ws(':', func.count(), func.coalesce(func.sum(func.crc32(func.concat_ws('|', *cols))), 0))
 
-    canonical_event = {}
-    ces = None
-    _filter = None
-    if id:
-        canonical_event['id'] = id
-        _filter = CanonicalEvent.id == id
-    else:
-        canonical_event['key'] = key
-        _filter = CanonicalEvent.key == key
+    parts = [current_user.id, cand_event_ids, canonical_event_key]
 
-    ce  = db_session.query(CanonicalEvent).filter(_filter).first()
-    ces = db_session.query(CanonicalEvent, CanonicalEventLink, CodeEventCreator, User).\
-        join(CanonicalEventLink, CanonicalEvent.id == CanonicalEventLink.canonical_id).\
-        join(CodeEventCreator, CanonicalEventLink.cec_id == CodeEventCreator.id).\
-        join(User, CodeEventCreator.coder_id == User.id).\
-        filter(_filter).all()
+    ## each part is a scalar subquery, so they all come back in one statement
+    versions = []
+    if cand_event_ids:
+        versions.append(db_session.query(checksum(CodeEventCreator.id, CodeEventCreator.variable, 
+                CodeEventCreator.value, CodeEventCreator.text, CodeEventCreator.timestamp)).\
+            filter(CodeEventCreator.event_id.in_(cand_event_ids)).as_scalar())
 
-    if not ce:
-        return None
+        versions.append(db_session.query(checksum(EventFlag.id, EventFlag.flag, EventFlag.timestamp)).\
+            filter(EventFlag.event_id.in_(cand_event_ids)).as_scalar())
 
-    ## load CE data
-    canonical_event['id'] = ce.id
-    canonical_event['key'] = ce.key
-    canonical_event['description'] = ce.description
-    canonical_event['notes'] = ce.notes
-
-    for _, cel, cec, user in ces:
-        ## create a new list if it doesn't exist
-        if not canonical_event.get(cec.variable):
-            canonical_event[cec.variable] = []
-
-        ## insert in record
-        value = None
-        if cec.text is not None:
-            value = cec.text
-        else:
-            value = cec.value
+    if canonical_event_key:
+        versions.append(db_session.query(func.concat_ws(':', CanonicalEvent.id, CanonicalEvent.last_updated,
+                func.crc32(func.concat_ws('|', CanonicalEvent.description, CanonicalEvent.notes)))).\
+            filter(CanonicalEvent.key == canonical_event_key).limit(1).as_scalar())
 
-        ## if this is a dummy value, username starts with adj
-        is_dummy = 1 if 'adj' in user.username else 0
+        versions.append(db_session.query(checksum(CanonicalEventLink.id, CanonicalEventLink.timestamp, 
+                CodeEventCreator.id, CodeEventCreator.variable, CodeEventCreator.value, CodeEventCreator.text)).\
+            join(CanonicalEvent, CanonicalEventLink.canonical_id == CanonicalEvent.id).\
+            join(CodeEventCreator, CanonicalEventLink.cec_id == CodeEventCreator.id).\
+            filter(CanonicalEvent.key == canonical_event_key).as_scalar())
 
-        canonical_event[cec.variable].append((cel.id, value, cel.timestamp, cec.event_id, is_dummy))
+    if versions:
+        parts.append(db_session.query(*versions).first())
 
-    return canonical_event
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
 
 
 @app.route('/_load_canonical_id_from_key')
@@ -1563,77 +2081,37 @@ def _load_event_flags(events):
     return {x.event_id: x.flag for x in efs}
 
 
-@app.route('/_load_links')
-@login_required
-def _load_links(canonical_event_key):
-    """Loads the links to the canonical event that do not have a record in the CEC table."""
-
-    cecs = db_session.query(CodeEventCreator).\
-        join(CanonicalEventLink, CodeEventCreator.id == CanonicalEventLink.cec_id).\
-        join(CanonicalEvent, CanonicalEventLink.canonical_id == CanonicalEvent.id).\
-        filter(CanonicalEvent.key == canonical_event_key, CodeEventCreator.variable == 'link').all()
-
-    links = list(set([cec.article_id for cec in cecs]))
-        
-    return links
-
-
 @app.route('/_store_recent_events')
 @login_required
 def _store_recent_events(cand_event_ids, canonical_event_key):
-    """ Stores the recent events. Occurs with the grid reload. """
+    """ Stores the recent events. Occurs with the grid reload. The write happens on
+        recent_writer's thread, so the grid doesn't wait for it. """
+    now = dt.datetime.now()
 
     if cand_event_ids:
-        for ce_id in cand_event_ids:
-            ## load recent events for this user
-            events = db_session.query(RecentEvent).\
-                filter(
-                    RecentEvent.event_id == ce_id, 
-                    RecentEvent.coder_id == current_user.id
-                ).order_by(desc(RecentEvent.last_accessed)).all()
-
-            ## if there's more than one event record, delete the oldest ones
-            if len(events) > 1:
-                for event in events[1:]:
-                    db_session.delete(event)
-                    db_session.commit()
-            elif len(events) == 1:
-                events[0].last_accessed = dt.datetime.now()
-                db_session.add(events[0])
-                db_session.commit()
-            else:
-                event = RecentEvent(current_user.id, ce_id)
-                db_session.add(event)
-                db_session.commit()
-    
-    if canonical_event_key:
-        ## load the canonical event
-        canonical_id = db_session.query(CanonicalEvent).\
-            filter(CanonicalEvent.key == canonical_event_key).first().id
+        recent_writer.touch('event', current_user.id, cand_event_ids, now)
 
-        ## load recent events for this user
-        events = db_session.query(RecentCanonicalEvent).\
-            filter(
-                RecentCanonicalEvent.canonical_id == canonical_id, 
-                RecentCanonicalEvent.coder_id == current_user.id
-            ).order_by(desc(RecentCanonicalEvent.last_accessed)).all()
-
-        ## if there's more than one canonical event record, delete the oldest ones
-        if len(events) > 1:
-            for event in events[1:]:
-                db_session.delete(event)
-                db_session.commit()
-        elif len(events) == 1:
-            events[0].last_accessed = dt.datetime.now()
-            db_session.add(events[0])
-            db_session.commit()
-        else:
-            event = RecentCanonicalEvent(current_user.id, canonical_id)
-            db_session.add(event)
-            db_session.commit()
+    if canonical_event_key:
+        recent_writer.touch('canonical_event', current_user.id, [canonical_event_key], now)
 
     return None
 
+
+def _write_recent(batch):
+    """ Writes marks from recent_writer, one upsert per table. Canonical events are
+        marked by key, and keys with no canonical event are dropped. """
+    with mysql_engine.begin() as conn:
+        if batch.get('event'):
+            conn.execute(upsert(RecentEvent.__table__, 'event_id', batch['event']))
+
+        if batch.get('canonical_event'):
+            t = CanonicalEvent.__table__
+            ids = dict(conn.execute(select([t.c.key, t.c.id]).\
+                where(t.c.key.in_(set(x[1] for x in batch['canonical_event'])))).fetchall())
+            rows = [(c, ids[k], now) for c, k, now in batch['canonical_event'] if k in ids]
+            if rows:
+                conn.execute(upsert(RecentCanonicalEvent.__table__, 'canonical_id', rows))
+
 #####
 ##### Pagination helpers
 #####
@@ -1849,7 +2327,7 @@ def _pubCount():
         TODO: One day, convert this to a pure sqlalchemy solution.
     """
 
-    df_am = pd.DataFrame([(x.id, x.db_name, x.db_id)  for x in db_session.query(ArticleMetadata).all()],\
+    df_am = pd.DataFrame(db_session.query(ArticleMetadata.id, ArticleMetadata.db_name, ArticleMetadata.db_id).all(),\
         columns = ['article_id', 'db_name', 'db_id'])
     df_am = df_am.set_index('article_id')
 
@@ -1940,7 +2418,7 @@ def admin():
     if current_user.authlevel < 3:
         return redirect(url_for('index'))
 
-    ura   = {u.id: u.username for u in db_session.query(User).filter(User.authlevel == 1).all()}
+    ura   = {u.id: u.username for u in user_directory.get().rows() if u.authlevel == 1}
     coded = {user: {} for user in ura.keys()}
     dbs   = [x[0] for x in db_session.query(ArticleMetadata.db_name).distinct()]
     pubs  = []
@@ -1952,19 +2430,13 @@ def admin():
                    order_by(ArticleMetadata.publication)
         pubs = [row.publication for row in pubquery]
     elif app.config['SOLR']:
-        url = '{}/select?q=Database:"University%20Wire"&rows=0&wt=json'.format(app.config['SOLR_ADDR'])
-        fparams = 'facet=true&facet.field=PUBLICATION&facet.limit=1000'
-
-        if (sys.version_info < (3, 0)):
-            ## Python 2
-            import urllib2
-            req  = urllib2.Request(url + '&' + fparams)
-            res  = urllib2.urlopen(req)
-        else:
-            ## Python 3
-            res = urllib.request.urlopen(url + '&' + fparams)
-
-        jobj = json.loads(res.read())
+        jobj = solr.select({
+            'q': 'Database:"University Wire"',
+            'rows': 0,
+            'facet': 'true',
+            'facet.field': 'PUBLICATION',
+            'facet.limit': 1000
+        })
 
         ## get every other entry in this list
         pubs = sorted(jobj['facet_counts']['facet_fields']['PUBLICATION'][0::2])
@@ -1985,7 +2457,7 @@ def admin():
     #assigned_metadata = db_session.query(EventCreatorQueue).all()
 
     for db in dbs:
-        unassigned.append( (db, len( set([x.id for x in db_session.query(ArticleMetadata).filter_by(db_name = db).all()]) - \
+        unassigned.append( (db, len( set(article_ids(db_session, models, db_name = db)) - \
         set([x[0] for x in db_session.query(distinct(EventCreatorQueue.article_id)).all()]))) )
 
     return render_template(
@@ -2019,10 +2491,11 @@ def coderStats():
         last_cec = None
     else:
         ## first pass coders
-        ura = [u.username for u in db_session.query(User).filter(User.authlevel == 1).all()]
+        users = user_directory.get().rows()
+        ura = [u.username for u in users if u.authlevel == 1]
 
         ## Add stats for second pass coders
-        gra = [u.username for u in db_session.query(User).filter(User.authlevel > 1).all()]
+        gra = [u.username for u in users if u.authlevel > 1]
 
         ## get most recent DB updates
         last_cfp = db_session.query(CodeFirstPass, User).join(User).order_by(desc(CodeFirstPass.timestamp)).first()
@@ -2170,7 +2643,7 @@ def userArticleListAdmin(coder_id, is_coded, pn, page = 1):
                      filter(model.coder_id == coder_id, is_coded_condition).\
                      join(ArticleMetadata).\
                      order_by(model.id), page, 10000, True)
-    username = db_session.query(User).filter(User.id == int(coder_id)).first().username
+    username = user_directory.get().username(int(coder_id))
 
     return render_template("list.html", 
         pn  = pn,
@@ -2191,7 +2664,7 @@ def generateCoderAudit():
     action = request.form['action']
 
     # last_month = dt.datetime.now(tz = central) - dt.timedelta(weeks=4)
-    users = {u.id: u.username for u in db_session.query(User).all()}
+    users = user_directory.get().names()
 
     if pn == '1':
         model = CodeFirstPass
@@ -2603,6 +3076,8 @@ def addQueue(pn):
         db_session.add(spq)
         db_session.commit()
 
+        prefetcher.invalidate((int(coder_id), '2'))
+
     return jsonify(result={"status": 200})
 
 
@@ -2835,7 +3310,7 @@ def modifyEvents():
 @login_required
 def dynamic_form():
     aid = 23317
-    article = db_session.query(ArticleMetadata).filter_by(id=aid).first()
+    article = articleQuery().filter_by(id=aid).first()
     text, html = prepText(article)
 
     aq = db_session.query(ArticleQueue).filter_by(coder_id=current_user.id, article_id=aid).first()
@@ -2886,7 +3361,7 @@ def highlightVar():
 
     aid       = int(request.args.get('article'))
     var       = request.args.get('variable')
-    body,html = prepText(db_session.query(ArticleMetadata).filter_by(id = aid).first())
+    body,html = prepText(articleQuery().filter_by(id = aid).first())
     text_para = body.strip().split("\n")
     paras     = {}
     bounds    = {}
@@ -3029,6 +3504,20 @@ def addUser():
     return jsonify(result={"status": 200, "password": password})
 
 
+@app.route('/_article_cache_stats')
+@login_required
+def articleCacheStats():
+    """ Hit and miss counters for the rendered-article cache, prefetcher and recent event writer in this worker. """
+    if current_user.authlevel < 3:
+        return redirect(url_for('index'))
+
+    return jsonify(result={"status": 200, 
+        "stats": article_cache.stats(), 
+        "prefetch": prefetcher.stats(),
+        "recent": recent_writer.stats(),
+        "solr": solr.stats() if solr else None})
+
+
 @app.route('/_assign_articles', methods=['POST'])
 @login_required
 def assignArticles():
@@ -3065,11 +3554,10 @@ def assignArticles():
         ## get number of unassigned articles
         if pub:
             pub = "-".join(pub.split())
-            full_set = set([x.id for x in db_session.query(ArticleMetadata).\
-                            filter(ArticleMetadata.db_id.like('%s%%' % pub)).all()])
+            full_set = set(article_ids(db_session, models,
+                            search.compare(ArticleMetadata.db_id, 'starts', search.bound_value('starts', pub))))
         else:
-            full_set = set([x.id for x in db_session.query(ArticleMetadata).\
-                            filter_by(db_name = db_name).all()])
+            full_set = set(article_ids(db_session, models, db_name = db_name))
 
         assigned   = set([x[0] for x in db_session.query(distinct(EventCreatorQueue.article_id)).all()])
         unassigned = len( full_set - assigned )
@@ -3082,6 +3570,10 @@ def assignArticles():
 
     user_ids = map(lambda x: int(x), users.split(','))
 
+    ## these queues are about to change, so drop any prefetching for them
+    for u in users.split(','):
+        prefetcher.invalidate((int(u), 'ec'))
+
     if group_size != '':
         try:
             group_size = int(group_size)
@@ -3152,6 +3644,10 @@ def transferArticles():
     except:
         return make_response('Please enter a valid number.', 500)
    
+    ## these queues are about to change, so drop any prefetching for them
+    for u in from_users.split(',') + to_users.split(','):
+        prefetcher.invalidate((int(u), 'ec'))
+
     from_users = map(lambda x: int(x), from_users.split(','))
     to_users = map(lambda x: int(x), to_users.split(','))
 
@@ -3192,20 +3688,27 @@ def searchSolr():
         return make_response('End date needs a matching start date.', 500)
 
     if publication:
-        query.append('PUBLICATION:"%s"' % publication)
+        query.append('PUBLICATION:%s' % quote_term(publication))
 
     if start_date:
         ## set end date to now
         if not end_date:
             end_date = dt.datetime.now().strftime('%Y-%m-%d')
 
+        ## the dates go into the query as they are, so they have to be dates
+        try:
+            for d in [start_date, end_date]:
+                dt.datetime.strptime(d, '%Y-%m-%d')
+        except ValueError:
+            return make_response('Dates must be in YYYY-MM-DD format.', 500)
+
         query.append('DATE:[%sT00:00:00.000Z TO %sT00:00:00.000Z]' % (start_date, end_date))
 
     if search_str:
         query.append('(%s)' % search_str)
 
     if solr_ids:
-        query.append('id:(%s)' % " ".join(solr_ids.split('\n')))
+        query.append('id:(%s)' % " ".join(quote_term(x.strip()) for x in solr_ids.split('\n') if x.strip()))
 
     qstr = ' AND '.join(query)
 
@@ -1,6 +1,5 @@
 import sys
 import datetime
-import urllib
 
 import pandas as pd
 import sqlalchemy
@@ -31,43 +30,8 @@ am_id_df = pd.read_sql("SELECT DISTINCT db_id FROM article_metadata",
 ## Put IDs from MySQL into a SOLR query string
 ids = am_id_df['db_id'].tolist()
 
-def testURLEncoding(id):
-    data = {
-        'q':     id,
-        'start': 0,
-        'rows':  10,
-        'wt':    'json'
-        }
-    try:
-        urllib.urlencode(data)
-    except UnicodeEncodeError:
-        print("#### Bad encoding: %s" % id)
-
-[testURLEncoding(id) for id in ids]
-
-def getQueryChunk(ids):
-    ids_qclause = '"' + '" OR "'.join(ids) + '"'
-    ids_q = 'id: (' + ids_qclause + ')'
-
-    print("Retrieving %d articles..." % sobj.getResultsFound(ids_q))
-
-    import time
-    t0    = time.time()
-    docs  = sobj.getDocuments(ids_q)
-    test_time = time.time() - t0
-    print("Loading time:  %0.3fs" % test_time)
-    return docs
-
-# Chunk trick from https://stackoverflow.com/questions/312443/how-do-you-split-a-list-into-evenly-sized-chunks
-id_chunks = [ids[i:i + 1024] for i in xrange(0, len(ids), 1024)]
-
-docs = list()
-# NB: making copies of this list will use up memory fast!
-for i in range(len(id_chunks)):
-    print("### Chunk %d of %d" % (i, len(id_chunks)))
-    docs.extend(getQueryChunk(id_chunks[i]))
-
-solr_df = pd.DataFrame(docs)
+## stream documents straight into the data frame rather than building a list first
+solr_df = pd.DataFrame.from_records(sobj.iterDocumentsFromIDs(ids))
 
 print("Article count: %d" % solr_df.shape[0])
 
@@ -76,7 +40,7 @@ print("Article count: %d" % solr_df.shape[0])
 
 def clean_lists(listcell):
     if isinstance(listcell, list):
-        listcell = '|||'.join(unicode(v) for v in listcell)
+        listcell = '|||'.join(str(v) for v in listcell)
     return listcell
 
 solr_df = solr_df.applymap(clean_lists)
@@ -124,8 +88,8 @@ maxentries = (solr_df
                 # sort changed to sort_values at pandas 0.17 or so
                 #.sort('maxn', ascending=False)
                 )
-print '\n\nLargest multi-entry cell in each column:'
-print maxentries
+print('\n\nLargest multi-entry cell in each column:')
+print(maxentries)
 
 ## Nonempty analysis
 
@@ -134,5 +98,5 @@ nonmissing = (solr_df
                 # sort changed to sort_values at pandas 0.17 or so
                 #.sort(ascending=False)
                 )
-print '\n\nNonmissing entries in each column:'
-print nonmissing
+print('\n\nNonmissing entries in each column:')
+print(nonmissing)
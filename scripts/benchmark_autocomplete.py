@@ -0,0 +1,62 @@
+"""
+Times canonical key autocomplete against a synthetic set of keys, with the
+in-memory index and with the scan it replaced. No database is needed.
+
+Usage: python scripts/benchmark_autocomplete.py [n_keys]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath('.'))
+
+from modules.autocomplete import KeyIndex
+
+cities = ['Madison_WI', 'Chicago_IL', 'Berkeley_CA', 'Austin_TX', 'AnnArbor_MI', 'NewYork_NY',
+    'Durham_NC', 'Seattle_WA', 'Columbus_OH', 'Atlanta_GA']
+issues = ['Tuition', 'BLM', 'Labor', 'Divestment', 'Racism', 'Climate', 'Immigration', 'Title_IX']
+
+def make_keys(n, rng):
+    keys = set()
+    while len(keys) < n:
+        keys.add('%s_%s_%d%02d%02d' % (rng.choice(cities), rng.choice(issues),
+            rng.randint(2012, 2018), rng.randint(1, 12), rng.randint(1, 28)))
+    return sorted(keys)
+
+def scan(keys, term):
+    """ The old LIKE '%term%' with no limit. """
+    term = term.lower()
+    return [k for k in keys if term in k.lower()]
+
+def typed(word):
+    """ The terms sent as a word is typed, one per keystroke. """
+    return [word[:i] for i in range(2, len(word) + 1)]
+
+def main():
+    n   = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = random.Random(1)
+
+    keys = make_keys(n, rng)
+    t0 = time.time()
+    index = KeyIndex(keys)
+    print("%d keys, index built in %.0f ms\n" % (n, (time.time() - t0) * 1000))
+
+    print("%-22s %10s %10s %8s" % ('typed', 'index ms', 'scan ms', 'matches'))
+    for word in ['Madison_WI_BLM', 'blm_2016', 'Divest', 'ann', 'zzz', keys[n // 2]]:
+        t_index = t_scan = 0.0
+        terms   = typed(word)
+        for term in terms:
+            t0 = time.time()
+            index.search(term)
+            t_index += time.time() - t0
+
+            t0 = time.time()
+            matches = scan(keys, term)
+            t_scan += time.time() - t0
+
+        print("%-22s %10.3f %10.3f %8d" % (word, t_index * 1000 / len(terms), t_scan * 1000 / len(terms), len(matches)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Regression benchmark for canonical event search with 1-4 filters.
+
+Builds a synthetic dataset of canonical events, linked candidate event
+codings, and users, then times:
+
+  - per-filter: one join query per filter, intersecting id sets in Python,
+    then one more query with the ids in an IN list (the old do_search)
+  - single: modules.canonical_search, one statement with EXISTS subqueries
+
+By default everything happens in an in-memory SQLite database. Pass a
+SQLAlchemy URL for a scratch MySQL database to measure there instead.
+Never point it at the production database; it creates and fills tables.
+
+Usage: python scripts/benchmark_canonical_search.py [n_canonical] [url]
+"""
+
+import os
+import random
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import models
+from modules.canonical_search import canonical_ids
+
+import bulk
+
+CanonicalEvent     = models.CanonicalEvent
+CanonicalEventLink = models.CanonicalEventLink
+CodeEventCreator   = models.CodeEventCreator
+
+vocab = {
+    'location':     ['Madison, WI', 'Chicago, IL', 'Berkeley, CA', 'Austin, TX', 'Ann Arbor, MI',
+                     'New York, NY', 'Durham, NC', 'Seattle, WA'],
+    'form':         ['March', 'Rally', 'Sit-in', 'Vigil', 'Blockade', 'Strike', 'Occupation'],
+    'issue':        ['Tuition', 'Racism', 'Labor', 'Environment', 'Divestment', 'Sexual assault'],
+    'racial-issue': ['Police violence', 'Campus climate', 'Affirmative action', 'Hate speech'],
+    'start-date':   ['2012-%02d-%02d' % (m, d) for m in range(1, 13) for d in range(1, 29)]
+}
+
+def make_filters():
+    """ The filters to time, as (model, expression) pairs, in the order they are added. """
+    return [
+        (CodeEventCreator, sqlalchemy.and_(CodeEventCreator.variable == 'location',
+                                           CodeEventCreator.value == 'Madison, WI')),
+        (CodeEventCreator, sqlalchemy.and_(CodeEventCreator.variable == 'form',
+                                           CodeEventCreator.value.like(u'%March%'))),
+        (CodeEventCreator, sqlalchemy.and_(CodeEventCreator.variable == 'issue',
+                                           CodeEventCreator.value != 'Labor')),
+        (CanonicalEvent, CanonicalEvent.key.like(u'%1%'))
+    ]
+
+def generate(engine, n):
+    """ n canonical events, each linked to 2-6 codings of a handful of candidate events. """
+    tables = [models.User.__table__, CanonicalEvent.__table__, CodeEventCreator.__table__,
+        CanonicalEventLink.__table__]
+    models.Base.metadata.drop_all(engine, tables = tables[::-1])
+    models.Base.metadata.create_all(engine, tables = tables)
+
+    rng = random.Random(1)
+    users, ces, cecs, cels = [], [], [], []
+    for i in range(1, 21):
+        users.append({'id': i, 'username': 'coder%d' % i, 'password': 'x', 'authlevel': 1})
+
+    cec_id = 0
+    for i in range(1, n + 1):
+        ces.append({'id': i, 'coder_id': rng.randint(1, 20), 'key': 'Event_%06d' % i,
+            'description': 'Synthetic event %d' % i})
+
+        for event_id in range(i * 3, i * 3 + rng.randint(1, 3)):
+            for variable in rng.sample(sorted(vocab.keys()), rng.randint(2, 5)):
+                cec_id += 1
+                cecs.append({'id': cec_id, 'article_id': event_id, 'event_id': event_id,
+                    'variable': variable, 'value': rng.choice(vocab[variable]), 'coder_id': 1})
+                cels.append({'id': cec_id, 'coder_id': 1, 'canonical_id': i, 'cec_id': cec_id})
+
+    with engine.connect() as conn:
+        ## article_metadata and event rows aren't needed, so don't enforce the foreign keys
+        if engine.dialect.name == 'mysql':
+            conn.execute(sqlalchemy.text('SET FOREIGN_KEY_CHECKS = 0'))
+
+        for table, rows in [(models.User.__table__, users), (CanonicalEvent.__table__, ces),
+            (CodeEventCreator.__table__, cecs), (CanonicalEventLink.__table__, cels)]:
+            bulk.insert_rows(conn, table, rows, chunk_size = 1000)
+
+    return len(cecs)
+
+def per_filter(session, flts, sorts):
+    """ The old do_search: one query per filter, intersect in Python, then an IN query. """
+    ids = None
+    for _, f in flts:
+        rs = session.query(CanonicalEvent).\
+            join(CanonicalEventLink, CanonicalEventLink.canonical_id == CanonicalEvent.id, isouter = True).\
+            join(CodeEventCreator, CodeEventCreator.id == CanonicalEventLink.cec_id, isouter = True).\
+            filter(f).all()
+        rs  = set(x.id for x in rs)
+        ids = rs if ids is None else ids.intersection(rs)
+
+    rs = session.query(CanonicalEvent).\
+        join(CanonicalEventLink, CanonicalEventLink.canonical_id == CanonicalEvent.id, isouter = True).\
+        join(CodeEventCreator, CodeEventCreator.id == CanonicalEventLink.cec_id, isouter = True).\
+        filter(CanonicalEvent.id.in_(ids)).\
+        order_by(*sorts).all()
+    return [x.id for x in rs]
+
+def single(session, flts, sorts):
+    ids = canonical_ids(session, CanonicalEvent, CanonicalEventLink, CodeEventCreator, flts, sorts)
+    session.query(CanonicalEvent).filter(CanonicalEvent.id.in_(ids)).all()
+    return ids
+
+def timed(fn, session, flts, sorts, repeat):
+    times = []
+    for _ in range(repeat):
+        session.expunge_all()
+        t0 = time.time()
+        ids = fn(session, flts, sorts)
+        times.append(time.time() - t0)
+    times.sort()
+    return times[len(times) // 2], ids
+
+def main():
+    n      = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    url    = sys.argv[2] if len(sys.argv) > 2 else 'sqlite://'
+    repeat = 5
+
+    engine  = sqlalchemy.create_engine(url)
+    n_cec   = generate(engine, n)
+    session = sessionmaker(bind = engine)()
+    sorts   = [CanonicalEvent.key.asc()]
+
+    print("%d canonical events, %d linked codings (%s)\n" % (n, n_cec, engine.dialect.name))
+    print("%-8s %8s %14s %12s %9s" % ('filters', 'results', 'per-filter ms', 'single ms', 'speedup'))
+
+    all_filters = make_filters()
+    for k in range(1, len(all_filters) + 1):
+        flts = all_filters[:k]
+        t_old, ids_old = timed(per_filter, session, flts, sorts, repeat)
+        t_new, ids_new = timed(single, session, flts, sorts, repeat)
+
+        ## same events, and in the same order
+        assert ids_old == ids_new, "results differ with %d filters" % k
+
+        print("%-8d %8d %14.1f %12.1f %8.1fx" % (k, len(ids_new), t_old * 1000, t_new * 1000,
+            t_old / t_new if t_new else 0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare storing article bodies plain against compressed.
+
+Copies a sample of articles into two scratch tables, one plain and one
+compressed, then reports for each:
+
+  - table size on disk (data_length after ANALYZE TABLE)
+  - InnoDB buffer pool hit rate for a full scan of the table
+  - per-article render latency: fetch one row by id, decompress if needed,
+    and run the same split/clean/render steps as prepText
+
+Buffer pool counters are server-wide, so run it on a quiet server.
+
+Usage: python scripts/benchmark_compression.py [n_articles] [n_renders]
+"""
+
+import os
+import random
+import sys
+import time
+
+import sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config
+from modules import paragraphs
+from modules.compress import compress_text, decompress_text
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+tables = {
+    'plain':      ('bench_article_plain', 'MEDIUMTEXT CHARACTER SET utf8mb4'),
+    'compressed': ('bench_article_z',     'MEDIUMBLOB')
+}
+
+## text_compressed only exists once migrate_compress_articles.py has added it
+compress = getattr(config, 'COMPRESS_ARTICLES', False) == True
+
+def load_sample(conn, n):
+    """ Pull n articles, whichever way they are currently stored. """
+    if not compress:
+        return [tuple(r) for r in conn.execute(sqlalchemy.text(
+            'SELECT id, title, text FROM article_metadata '
+            'WHERE text IS NOT NULL ORDER BY id LIMIT :n'), n = n).fetchall()]
+
+    rows = conn.execute(sqlalchemy.text(
+        'SELECT id, title, text, text_compressed FROM article_metadata '
+        'WHERE text IS NOT NULL OR text_compressed IS NOT NULL ORDER BY id LIMIT :n'), n = n).fetchall()
+    return [(r.id, r.title, decompress_text(r.text_compressed) if r.text_compressed is not None else r.text) for r in rows]
+
+def buffer_pool(conn):
+    status = dict(conn.execute(sqlalchemy.text("SHOW GLOBAL STATUS LIKE 'Innodb_buffer_pool_read%%'")).fetchall())
+    return int(status['Innodb_buffer_pool_read_requests']), int(status['Innodb_buffer_pool_reads'])
+
+def main():
+    n         = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_renders = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    with mysql_engine.connect() as conn:
+        sample = load_sample(conn, n)
+        if not sample:
+            sys.exit("No internally stored articles to sample.")
+        ids = [x[0] for x in sample]
+
+        for mode, (table, coltype) in tables.items():
+            conn.execute(sqlalchemy.text('DROP TABLE IF EXISTS %s' % table))
+            conn.execute(sqlalchemy.text(
+                'CREATE TABLE %s (id INT PRIMARY KEY, title VARCHAR(1024), body %s) ENGINE=InnoDB' % (table, coltype)))
+
+            encode = compress_text if mode == 'compressed' else (lambda x: x)
+            insert = sqlalchemy.text('INSERT INTO %s (id, title, body) VALUES (:id, :title, :body)' % table)
+            with conn.begin():
+                for i in range(0, len(sample), 500):
+                    conn.execute(insert, [{'id': aid, 'title': title, 'body': encode(text)}
+                        for aid, title, text in sample[i:i + 500]])
+            conn.execute(sqlalchemy.text('ANALYZE TABLE %s' % table))
+
+        print("%d articles, %d renders\n" % (len(sample), n_renders))
+        print("%-11s %10s %10s %12s %12s" % ('mode', 'size MB', 'bp hit %', 'render ms', 'p95 ms'))
+
+        for mode, (table, _) in tables.items():
+            size = conn.execute(sqlalchemy.text(
+                "SELECT data_length + index_length FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t"), t = table).scalar()
+
+            req0, reads0 = buffer_pool(conn)
+            conn.execute(sqlalchemy.text('SELECT SUM(LENGTH(body)) FROM %s' % table)).scalar()
+            req1, reads1 = buffer_pool(conn)
+            requests = req1 - req0
+            hit_rate = 100.0 * (1 - float(reads1 - reads0) / requests) if requests else 100.0
+
+            decode = decompress_text if mode == 'compressed' else (lambda x: x)
+            select = sqlalchemy.text('SELECT title, body FROM %s WHERE id = :id' % table)
+            times  = []
+            for aid in random.sample(ids, min(n_renders, len(ids))):
+                t0 = time.time()
+                title, body = conn.execute(select, id = aid).fetchone()
+                paras = paragraphs.clean_paragraphs(paragraphs.split_text(decode(body)))
+                paragraphs.render(title, '', paras)
+                times.append((time.time() - t0) * 1000)
+
+            times.sort()
+            print("%-11s %10.1f %10.2f %12.3f %12.3f" % (mode, size / 1e6, hit_rate,
+                sum(times) / len(times), times[int(len(times) * 0.95) - 1]))
+
+        for table, _ in tables.values():
+            conn.execute(sqlalchemy.text('DROP TABLE %s' % table))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark of statement building and compilation per adjudication search.
+
+Times the SQL side of a candidate search in do_search without a database:
+building the page and count statements, and compiling them for MySQL.
+
+  - per search: the old way, a new statement with the values in it for
+    every search, compiled every time
+  - cached: modules.search, one statement per shape with bound parameters,
+    compiled once; each search only builds its parameters
+
+Each search has two filters, a two-term search box (the LIKE fallback,
+which compares every term with every column) and a cursor, with random
+values, so no two searches have the same values.
+
+Usage: python scripts/benchmark_search_compile.py [searches]
+"""
+
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Query
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import models
+from modules import keyset, search
+
+EventFlag     = models.EventFlag
+EventMetadata = models.EventMetadata
+
+dialect   = mysql.dialect()
+page_size = 100
+words     = ['march', 'rally', 'tuition', 'madison', 'police', 'campus', 'divest', 'strike']
+
+def make_search(rng):
+    filters = [('form', 'contains', rng.choice(words)), ('publication', 'eq', 'Paper %d' % rng.randrange(50))]
+    terms   = rng.sample(words, 2)
+    cursor  = ['2016-%02d-01' % rng.randint(1, 12), rng.randrange(100000)]
+    return filters, terms, cursor
+
+def _keys():
+    return [(EventMetadata.start_date, 'desc'), (EventMetadata.id, 'asc')]
+
+def _statements(conditions, cursor):
+    keys  = _keys()
+    query = Query([x[0] for x in keys]).\
+        select_from(EventMetadata).\
+        join(EventFlag, EventMetadata.event_id == EventFlag.event_id, isouter = True).\
+        filter(*conditions)
+    count = Query(func.count(EventMetadata.id)).\
+        select_from(EventMetadata).\
+        join(EventFlag, EventMetadata.event_id == EventFlag.event_id, isouter = True).\
+        filter(*conditions)
+    return keyset.page_query(query, keys, cursor, page_size).statement, count.statement
+
+def _text_search(term_params):
+    fields = [x for x in EventMetadata.__table__.columns.keys() if x != 'id']
+    return and_(*[or_(*[search.compare(getattr(EventMetadata, f), 'contains', p) for f in fields])
+        for p in term_params])
+
+def per_search(filters, terms, cursor):
+    """ The old do_search: values in the statement, compiled every time. """
+    conditions = [search.compare(getattr(EventMetadata, f), c, search.bound_value(c, v)) for f, c, v in filters]
+    conditions.append(_text_search([search.bound_value('contains', t) for t in terms]))
+    page, count = _statements(conditions + [EventMetadata.start_date != None],
+        list(keyset.cursor_params(_keys(), cursor)[1].values()))
+    return page.compile(dialect = dialect), count.compile(dialect = dialect)
+
+def cached(statements, filters, terms, cursor):
+    """ modules.search: parameters only, statements compiled once per shape. """
+    params = {'filter_%d' % i: search.bound_value(c, v) for i, (f, c, v) in enumerate(filters)}
+    params.update({'term_%d' % i: search.bound_value('contains', t) for i, t in enumerate(terms)})
+    params.update(keyset.cursor_params(_keys(), cursor)[1])
+
+    def build():
+        conditions = [search.compare(getattr(EventMetadata, f), c, search.param('filter_%d' % i))
+            for i, (f, c, _) in enumerate(filters)]
+        conditions.append(_text_search([search.param('term_%d' % i) for i in range(len(terms))]))
+        return _statements(conditions + [EventMetadata.start_date != None], keyset.cursor_params(_keys(), cursor)[0])
+
+    shape = (tuple(x[:2] for x in filters), len(terms), tuple(x is None for x in cursor))
+    page  = statements.compile(shape + ('page',), dialect, lambda: build()[0])
+    count = statements.compile(shape + ('count',), dialect, lambda: build()[1])
+    return page.construct_params(params), count.construct_params(params)
+
+def main():
+    n   = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(1)
+    searches = [make_search(rng) for _ in range(n)]
+
+    t0 = time.time()
+    for s in searches:
+        per_search(*s)
+    old = (time.time() - t0) / n
+
+    statements = search.StatementCache()
+    t0 = time.time()
+    for s in searches:
+        cached(statements, *s)
+    new = (time.time() - t0) / n
+
+    print("%d searches, %d statements compiled by the cache\n" % (n, statements.builds))
+    print("%-12s %10s" % ('', 'ms/search'))
+    print("%-12s %10.3f" % ('per search', old * 1000))
+    print("%-12s %10.3f" % ('cached', new * 1000))
+    print("\nspeedup %.0fx" % (old / new))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare ways of fetching articles from Solr against a local stand-in core
+with simulated latency:
+
+  - a fresh urlopen per article (what loadSolr used to do)
+  - the pooled keep-alive client, one query per article
+  - the pooled client with batched id lookups
+
+Usage: python scripts/benchmark_solr.py [n_articles] [latency_ms]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tests')))
+
+from urllib.parse import quote
+from urllib.request import urlopen
+
+from modules.solr_client import SolrClient, quote_term
+from solr_stub import SolrStub, make_docs
+
+def fresh_urlopen(url, ids):
+    for i in ids:
+        res = json.loads(urlopen('%s/select?q=id:%s&wt=json' % (url, quote(quote_term(i)))).read())
+        assert res['response']['numFound'] == 1
+
+def pooled(url, ids):
+    solr = SolrClient(url)
+    for i in ids:
+        res = solr.select({'q': 'id:%s' % quote_term(i)})
+        assert res['response']['numFound'] == 1
+
+def batched(url, ids):
+    solr = SolrClient(url)
+    assert len(solr.get_by_ids(ids)) == len(ids)
+
+def main():
+    n       = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    docs = make_docs(n)
+    ids  = [d['id'] for d in docs]
+
+    for name, fn in [('fresh urlopen', fresh_urlopen), ('pooled', pooled), ('batched', batched)]:
+        stub = SolrStub(docs, delay = latency / 1000.0).start()
+        t0   = time.time()
+        fn(stub.url, ids)
+        elapsed = time.time() - t0
+        print("%-14s %8.3fs  %7.1f articles/s  %4d requests  %4d connections" %
+            (name, elapsed, n / elapsed, stub.requests, stub.connections))
+        stub.stop()
+
+if __name__ == '__main__':
+    main()
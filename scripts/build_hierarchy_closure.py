@@ -0,0 +1,51 @@
+"""
+Builds canonical_event_closure, the closure table over canonical event
+relationships, from scratch. The app keeps it up to date as relationships
+are added and deleted; run this once to create it, and again whenever
+relationships are changed outside the app.
+
+Relationships which would make an event its own ancestor are left out of
+the closure and listed, so they can be fixed by hand.
+
+Usage: python scripts/build_hierarchy_closure.py
+"""
+
+import os
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config, models
+from modules import hierarchy
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+def main():
+    models.Base.metadata.create_all(mysql_engine, tables = [models.CanonicalEventClosure.__table__])
+
+    t0 = time.time()
+    session = sessionmaker(bind = mysql_engine)()
+    try:
+        skipped = hierarchy.rebuild(session, models)
+        session.commit()
+        rows = session.query(models.CanonicalEventClosure).count()
+    finally:
+        session.close()
+
+    print("Built %d closure rows in %.1fs." % (rows, time.time() - t0))
+    for child, parent in skipped:
+        print("Left out %d -> %d: it closes a cycle." % (child, parent))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Helpers for writing many rows to MySQL from scripts.
+
+insert_rows sends multi-row INSERT statements, chunk_size rows at a time,
+instead of one statement per row or pandas' to_sql.
+"""
+
+import sys
+import time
+
+from itertools import islice
+
+def chunks(rows, chunk_size):
+    """ Split any iterable into lists of at most chunk_size items, lazily. """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Rate(object):
+    """ Counts rows and reports rows per second. """
+    def __init__(self, label = 'rows', every = 10000, out = sys.stdout):
+        self.label = label
+        self.every = every
+        self.out   = out
+        self.n     = 0
+        self.t0    = time.time()
+        self._next = every
+
+    def add(self, n):
+        self.n += n
+        if self.n >= self._next:
+            self.report()
+            self._next = (self.n // self.every + 1) * self.every
+
+    def per_second(self):
+        elapsed = time.time() - self.t0
+        return self.n / elapsed if elapsed > 0 else 0.0
+
+    def report(self, prefix = ''):
+        self.out.write("%s%d %s in %.1fs (%.0f/s)\n" %
+            (prefix, self.n, self.label, time.time() - self.t0, self.per_second()))
+
+
+def insert_rows(conn, table, rows, chunk_size = 1000, prefixes = None, rate = None):
+    """ Insert dicts into a table with one multi-row INSERT per chunk, each in its own transaction.
+        prefixes are passed to Insert.prefix_with, e.g. ['IGNORE']. Returns the number of rows sent. """
+    n = 0
+    for chunk in chunks(rows, chunk_size):
+        stmt = table.insert().values(chunk)
+        if prefixes:
+            stmt = stmt.prefix_with(*prefixes)
+
+        with conn.begin():
+            conn.execute(stmt)
+
+        n += len(chunk)
+        if rate is not None:
+            rate.add(len(chunk))
+    return n
@@ -5,6 +5,7 @@ import sqlalchemy
 #import sqlalchemy.orm
 
 from context import config
+import bulk
 import solr
 
 ## MySQL setup
@@ -29,9 +30,10 @@ am_id_df = (am_id_df
             )
 ids = am_id_df['db_id'].tolist()
 
-## Query SOLR for IDs
-docs = sobj.getDocumentsFromIDs(ids)
-solr_df = pd.DataFrame(docs)
+## Query SOLR for IDs, streaming only the fields we use
+solr_df = pd.DataFrame.from_records(
+    sobj.iterDocumentsFromIDs(ids, fl = 'id,DATE,PUBLICATION,DOCSOURCE,TEXT'),
+    columns = ['id', 'DATE', 'PUBLICATION', 'DOCSOURCE', 'TEXT'])
 
 ## Trim and clean dataframe
 etl_df = (
@@ -65,21 +67,19 @@ createtemp = sqlalchemy.sql.text(
         )
 mysql_engine.execute(createtemp)
 
-## Split to keep query packets small
-etl_dfs = [etl_df[i:i+100] for i in range(0, len(etl_df), 100)]
-
-for df in etl_dfs:
-  ## Write temporary DB table
-  df.to_sql('temp_etl_table',
-            mysql_engine,
-            if_exists='append',
-            index=False,
-            dtype={'id': sqlalchemy.types.String(255),
-                   'DATE': sqlalchemy.types.Date,
-                   'PUBLICATION': sqlalchemy.types.String(511),
-                   'DOCSOURCE': sqlalchemy.types.String(511),
-                   'TEXT': sqlalchemy.types.UnicodeText(16777200)
-                   })
+## Write temporary DB table, many rows per INSERT
+temp_etl_table = sqlalchemy.table('temp_etl_table',
+    *[sqlalchemy.column(c) for c in ['id', 'DATE', 'PUBLICATION', 'DOCSOURCE', 'TEXT']])
+
+etl_rows = (etl_df
+            .astype(object)
+            .where(etl_df.notnull(), None)
+            .to_dict('records'))
+
+rate = bulk.Rate('rows', every = 5000)
+with mysql_engine.connect() as conn:
+    bulk.insert_rows(conn, temp_etl_table, etl_rows, chunk_size = 500, rate = rate)
+rate.report("Loaded temp_etl_table: ")
 
 ## Update canonical table with new data
 updatecleaned = sqlalchemy.sql.text(
@@ -0,0 +1,77 @@
+"""
+Index advisor: runs EXPLAIN on every query shape the app has issued and
+reports the ones which scan a whole table or index.
+
+Set QUERY_LOG in config.py to a file path and use the app for a while, so
+each worker records the shapes it issues there. Then run this against the
+same database. Shapes are listed worst first, by the rows MySQL expects to
+examine, with the indexes it considered.
+
+Usage: python scripts/explain_queries.py [query log] [--all]
+"""
+
+import argparse
+import os
+import sys
+
+import sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config
+from modules import query_log
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+def explain(conn, entry):
+    """ EXPLAIN rows for a logged statement, as dicts. """
+    cursor = conn.connection.cursor()
+    try:
+        parameters = entry['parameters']
+        cursor.execute('EXPLAIN ' + entry['statement'], tuple(parameters) if isinstance(parameters, list) else parameters)
+        columns = [x[0] for x in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'EXPLAIN the logged query shapes.')
+    parser.add_argument('path', nargs = '?', default = getattr(config, 'QUERY_LOG', None))
+    parser.add_argument('--all', action = 'store_true', help = 'list every shape, not just full scans')
+    args = parser.parse_args()
+
+    if not args.path:
+        sys.exit('No query log; set QUERY_LOG in config.py or pass its path.')
+
+    shapes  = query_log.read(args.path)
+    reports = []
+    with mysql_engine.connect() as conn:
+        for s, entry in shapes.items():
+            try:
+                plan = explain(conn, entry)
+            except Exception as e:
+                print('Could not explain: %s\n  %s\n' % (e, s))
+                continue
+
+            scans = query_log.full_scans(plan)
+            if scans or args.all:
+                reports.append((sum(int(x.get('rows') or 0) for x in scans), s, plan, scans))
+
+    for rows, s, plan, scans in sorted(reports, key = lambda x: -x[0]):
+        print('%s\n  %s' % ('FULL SCAN' if scans else 'ok', s))
+        for x in plan:
+            print('    %-28s type=%-7s key=%-24s rows=%-9s possible=%s %s' % (x.get('table'), x.get('type'),
+                x.get('key'), x.get('rows'), x.get('possible_keys'), x.get('Extra') or ''))
+        print('')
+
+    print('%d shapes, %d with full scans.' % (len(shapes), len([x for x in reports if x[3]])))
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,9 @@ import yaml
 sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
 
 from context import config
+from modules.cache import Generation
+import migrate_fulltext
+import migrate_indexes
 
 ## MySQL setup
 mysql_engine = sqlalchemy.create_engine(
@@ -155,3 +158,16 @@ df_wide.to_sql(name = 'event_metadata',
                 'issue': sqlalchemy.types.Text(),
                 'racial_issue': sqlalchemy.types.Text()
             })
+
+## replacing the table drops its indexes, so put them back
+with mysql_engine.connect() as conn:
+    migrate_fulltext.create_fulltext_index(conn, 'event_metadata')
+    migrate_indexes.create_indexes(conn, 'event_metadata')
+
+## tell the app's workers to rebuild their bitmap index and stop using cached candidate searches
+if getattr(config, 'CACHE_DIR', None):
+    Generation(config.CACHE_DIR, 'event_metadata').bump()
+    Generation(config.CACHE_DIR, 'search_candidate').bump()
+elif getattr(config, 'BITMAP_INDEX', False):
+    print("CACHE_DIR isn't set: running workers keep their bitmap index for up to "
+        "BITMAP_MAX_AGE seconds. Restart them to search the new rows at once.")
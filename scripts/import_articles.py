@@ -0,0 +1,176 @@
+"""
+Import articles into article_metadata.
+
+Sources, one article at a time:
+
+  lexisnexis  LexisNexis text exports
+  jsonl       output of split-ln.py, or any file of one JSON record per line
+  solr        Solr dumps: a select/export JSON response, or JSON lines of documents
+  ldc         LDC XML files, or directories of them
+  txt         .txt article files, or directories of them
+
+Rows are written with multi-row INSERTs, --chunk-size rows per statement.
+Articles whose db_id is already in article_metadata are skipped, using the
+index on db_id, which is created if it's missing.
+
+Usage: python scripts/import_articles.py [--chunk-size N] <db_name> <format> path [path ...]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import sqlalchemy
+from sqlalchemy import bindparam
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config, models
+from modules import ingest, paragraphs
+from modules.compress import compress_text
+
+import bulk
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+store_internally = getattr(config, 'STORE_ARTICLES_INTERNALLY', False) == True
+compress         = getattr(config, 'COMPRESS_ARTICLES', False) == True
+
+article_metadata = models.ArticleMetadata.__table__
+
+select_existing = sqlalchemy.text(
+    'SELECT db_id FROM article_metadata WHERE db_id IN :ids').\
+    bindparams(bindparam('ids', expanding = True))
+
+def walk(path, ext):
+    """ Files under a path, or the path itself if it is a file. """
+    if not os.path.isdir(path):
+        yield path
+        return
+
+    for root, _, files in os.walk(path):
+        for fn in sorted(files):
+            if fn.endswith(ext):
+                yield os.path.join(root, fn)
+
+def iter_jsonl(path):
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_solr(path):
+    """ Solr documents from a dumped response, or JSON lines of documents. """
+    ## JSON lines if the first line is a whole document
+    with open(path, 'r') as f:
+        try:
+            is_lines = 'id' in json.loads(f.readline())
+        except ValueError:
+            is_lines = False
+
+    if is_lines:
+        docs = iter_jsonl(path)
+    else:
+        with open(path, 'r') as f:
+            docs = json.load(f)['response']['docs']
+
+    for doc in docs:
+        record = dict(doc)
+        record['INTERNAL_ID'] = doc['id']
+        if isinstance(record.get('DATE'), list):
+            record['DATE'] = record['DATE'][0]
+        if record.get('DATE'):
+            record['DATE'] = record['DATE'].split('T')[0]
+        yield record
+
+def iter_ldc(path):
+    for fn in walk(path, '.xml'):
+        for record in ingest.iter_ldc(fn):
+            yield record
+
+def iter_txt(path):
+    for fn in walk(path, '.txt'):
+        name = os.path.basename(fn)
+        title, meta, paras = paragraphs.parse_txt(fn, paragraphs.filename_meta(name))
+        yield {'INTERNAL_ID': name, 'TITLE': title, 'TEXT': '<br/>'.join(paras), 'FILENAME': name}
+
+readers = {
+    'lexisnexis': ingest.iter_lexisnexis,
+    'jsonl':      iter_jsonl,
+    'solr':       iter_solr,
+    'ldc':        iter_ldc,
+    'txt':        iter_txt
+}
+
+def to_row(db_name, record):
+    text = record.get('TEXT') if store_internally else None
+    row  = {
+        'db_name':     db_name,
+        'db_id':       record['INTERNAL_ID'],
+        'filename':    record.get('FILENAME', record['INTERNAL_ID']),
+        'title':       record.get('TITLE'),
+        'pub_date':    record.get('DATE') or None,
+        'publication': record.get('PUBLICATION'),
+        'text':        text
+    }
+
+    ## text_compressed is only there once migrate_compress_articles.py has added it
+    if compress:
+        row['text']            = None
+        row['text_compressed'] = compress_text(text) if text is not None else None
+    return row
+
+def ensure_db_id_index(conn):
+    exists = conn.execute(sqlalchemy.text(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'article_metadata' "
+        "AND COLUMN_NAME = 'db_id' AND SEQ_IN_INDEX = 1")).scalar()
+    if not exists:
+        print("Creating index on article_metadata.db_id...")
+        conn.execute(sqlalchemy.text('CREATE INDEX ix_article_metadata_db_id ON article_metadata (db_id)'))
+
+def new_rows(conn, rows, chunk_size, skipped):
+    """ Drop rows whose db_id is already stored, or repeated in the input. """
+    seen = set()
+    for chunk in bulk.chunks(rows, chunk_size):
+        existing = set(x[0] for x in conn.execute(select_existing, ids = [r['db_id'] for r in chunk]))
+
+        for row in chunk:
+            if row['db_id'] in existing or row['db_id'] in seen:
+                skipped[0] += 1
+                continue
+            seen.add(row['db_id'])
+            yield row
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Bulk import articles into article_metadata.')
+    parser.add_argument('--chunk-size', type = int, default = 1000, help = 'rows per INSERT')
+    parser.add_argument('db_name')
+    parser.add_argument('format', choices = sorted(readers.keys()))
+    parser.add_argument('paths', nargs = '+')
+    args = parser.parse_args()
+
+    read    = readers[args.format]
+    records = (r for path in args.paths for r in read(path))
+    skipped = [0]
+    rate    = bulk.Rate('articles', every = args.chunk_size * 10)
+
+    with mysql_engine.connect() as conn:
+        ensure_db_id_index(conn)
+
+        rows = new_rows(conn, (to_row(args.db_name, r) for r in records), args.chunk_size, skipped)
+        bulk.insert_rows(conn, article_metadata, rows, chunk_size = args.chunk_size, rate = rate)
+
+    rate.report("Done. ")
+    print("%d duplicate articles skipped." % skipped[0])
+
+if __name__ == '__main__':
+    main()
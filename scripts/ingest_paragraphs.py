@@ -0,0 +1,192 @@
+"""
+Parse every article in article_metadata once and store its cleaned paragraphs
+in article_paragraph, with the title and metadata line in article_ingest.
+With USE_INGESTED_PARAGRAPHS on, prepText then renders straight from these
+tables instead of re-parsing.
+
+Incremental: each article's fingerprint (the same one the interface uses for
+its article cache) is stored with it, and articles whose fingerprint hasn't
+changed are skipped. Safe to rerun at any time.
+
+Usage: python scripts/ingest_paragraphs.py [--force] [--batch-size N]
+"""
+
+import argparse
+import datetime as dt
+import os
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy import bindparam
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config, models
+from modules import paragraphs
+from modules.compress import decompress_text
+from modules.solr_client import SolrClient, SolrError
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+store_internally = getattr(config, 'STORE_ARTICLES_INTERNALLY', False) == True
+compress         = getattr(config, 'COMPRESS_ARTICLES', False) == True
+use_solr         = not store_internally and getattr(config, 'SOLR', False) == True
+
+solr = SolrClient(config.SOLR_ADDR,
+    timeout = getattr(config, 'SOLR_TIMEOUT', 5),
+    retries = getattr(config, 'SOLR_RETRIES', 2)) if use_solr else None
+
+select_articles = sqlalchemy.text(
+    'SELECT id, filename, db_id, title, pub_date, publication%s FROM article_metadata '
+    'WHERE id > :last_id ORDER BY id LIMIT :n' % (
+    (', text, text_compressed' if compress else ', text') if store_internally else ''))
+
+select_ingested = sqlalchemy.text(
+    'SELECT article_id, fingerprint FROM article_ingest WHERE article_id IN :ids').\
+    bindparams(bindparam('ids', expanding = True))
+
+delete_paragraphs = sqlalchemy.text(
+    'DELETE FROM article_paragraph WHERE article_id IN :ids').\
+    bindparams(bindparam('ids', expanding = True))
+
+delete_ingested = sqlalchemy.text(
+    'DELETE FROM article_ingest WHERE article_id IN :ids').\
+    bindparams(bindparam('ids', expanding = True))
+
+insert_paragraphs = sqlalchemy.text(
+    'INSERT INTO article_paragraph (article_id, paragraph_index, text, start_offset, end_offset) '
+    'VALUES (:article_id, :paragraph_index, :text, :start_offset, :end_offset)')
+
+insert_ingested = sqlalchemy.text(
+    'INSERT INTO article_ingest (article_id, fingerprint, title, meta, paragraphs, timestamp) '
+    'VALUES (:article_id, :fingerprint, :title, :meta, :paragraphs, :timestamp)')
+
+
+def row_text(row):
+    if compress and row.text_compressed is not None:
+        return decompress_text(row.text_compressed)
+    return row.text
+
+
+def fingerprint(row):
+    """ Must match articleFingerprint in mpeds_coder.py. """
+    if store_internally:
+        return paragraphs.text_fingerprint(row_text(row))
+    elif use_solr:
+        return row.db_id
+    return paragraphs.file_fingerprint(config.DOC_ROOT + row.filename)
+
+
+def parse(row, solr_docs):
+    """ Returns (title, meta, paras) or None if the article can't be parsed right now. """
+    if store_internally:
+        return row.title, [row.publication, row.pub_date, row.db_id], paragraphs.split_text(row_text(row))
+    elif use_solr:
+        if row.db_id not in solr_docs:
+            return None
+        title, meta, paras = paragraphs.parse_solr_doc(solr_docs[row.db_id])
+        if title == -2:
+            return None
+        return title, meta, paras
+    elif row.filename.endswith('txt'):
+        return paragraphs.parse_txt(config.DOC_ROOT + row.filename, paragraphs.filename_meta(row.filename))
+    elif row.filename.endswith('xml'):
+        return paragraphs.parse_ldc_xml(config.DOC_ROOT + row.filename, paragraphs.filename_meta(row.filename))
+    return None
+
+
+def ingest_batch(conn, rows, force):
+    """ Ingest one batch of article_metadata rows. Returns (ingested, skipped, failed). """
+    ids      = [r.id for r in rows]
+    ingested = {x[0]: x[1] for x in conn.execute(select_ingested, ids = ids)}
+
+    todo = []
+    for r in rows:
+        fp = fingerprint(r)
+        if fp is None:
+            continue
+        if force or ingested.get(r.id) != fp:
+            todo.append((r, fp))
+
+    solr_docs = {}
+    if use_solr and todo:
+        try:
+            solr_docs = solr.get_by_ids([r.db_id for r, _ in todo])
+        except SolrError as e:
+            print("Solr error, skipping batch: %s" % e)
+            return 0, len(rows) - len(todo), len(todo)
+
+    now        = dt.datetime.now()
+    para_rows  = []
+    meta_rows  = []
+    failed     = 0
+    for r, fp in todo:
+        try:
+            parsed = parse(r, solr_docs)
+        except (IOError, OSError, IndexError) as e:
+            print("Cannot parse article %d: %s" % (r.id, e))
+            parsed = None
+
+        if parsed is None:
+            failed += 1
+            continue
+
+        title, meta, paras = parsed
+        paras = paragraphs.clean_paragraphs(paras)
+
+        for i, text, start, end in paragraphs.paragraph_offsets(paras):
+            para_rows.append({'article_id': r.id, 'paragraph_index': i, 'text': text,
+                'start_offset': start, 'end_offset': end})
+
+        meta_rows.append({'article_id': r.id, 'fingerprint': fp, 'title': title,
+            'meta': paragraphs.meta_line(meta), 'paragraphs': len(paras), 'timestamp': now})
+
+    if meta_rows:
+        done = [x['article_id'] for x in meta_rows]
+        with conn.begin():
+            conn.execute(delete_paragraphs, ids = done)
+            conn.execute(delete_ingested, ids = done)
+            if para_rows:
+                conn.execute(insert_paragraphs, para_rows)
+            conn.execute(insert_ingested, meta_rows)
+
+    return len(meta_rows), len(rows) - len(todo), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Store pre-parsed article paragraphs.')
+    parser.add_argument('--force', action = 'store_true', help = 'reparse articles which have not changed')
+    parser.add_argument('--batch-size', type = int, default = 500)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(mysql_engine,
+        tables = [models.ArticleIngest.__table__, models.ArticleParagraph.__table__])
+
+    totals  = [0, 0, 0]
+    last_id = 0
+    t0      = time.time()
+    with mysql_engine.connect() as conn:
+        while True:
+            rows = conn.execute(select_articles, last_id = last_id, n = args.batch_size).fetchall()
+            if not rows:
+                break
+
+            counts = ingest_batch(conn, rows, args.force)
+            totals = [a + b for a, b in zip(totals, counts)]
+            last_id = rows[-1].id
+
+            print("Through article %d: %d ingested, %d unchanged, %d failed (%.1fs)" %
+                (last_id, totals[0], totals[1], totals[2], time.time() - t0))
+
+    print("Done. %d ingested, %d unchanged, %d failed." % tuple(totals))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Convert article bodies in article_metadata between plain text (the text
+column) and compressed blobs (the text_compressed column), in batches.
+
+Adds text_compressed if it isn't there yet. Run it after turning
+COMPRESS_ARTICLES on, which is when the interface starts reading and
+writing that column, or with --decompress before turning it off again.
+Rows written by the interface in the meantime are readable either way, so
+it can be stopped and rerun at any point.
+
+Usage: python scripts/migrate_compress_articles.py [--decompress] [--batch-size N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config
+from modules.compress import compress_text, decompress_text
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+def add_column(conn):
+    exists = conn.execute(sqlalchemy.text(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'article_metadata' "
+        "AND COLUMN_NAME = 'text_compressed'")).scalar()
+    if not exists:
+        print("Adding article_metadata.text_compressed...")
+        conn.execute(sqlalchemy.text('ALTER TABLE article_metadata ADD COLUMN text_compressed MEDIUMBLOB'))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compress or decompress stored article bodies.')
+    parser.add_argument('--decompress', action = 'store_true')
+    parser.add_argument('--batch-size', type = int, default = 500)
+    args = parser.parse_args()
+
+    if args.decompress:
+        select = sqlalchemy.text('SELECT id, text_compressed FROM article_metadata '
+            'WHERE id > :last_id AND text_compressed IS NOT NULL ORDER BY id LIMIT :n')
+        update = sqlalchemy.text('UPDATE article_metadata SET text = :value, text_compressed = NULL WHERE id = :id')
+        convert = decompress_text
+    else:
+        select = sqlalchemy.text('SELECT id, text FROM article_metadata '
+            'WHERE id > :last_id AND text IS NOT NULL ORDER BY id LIMIT :n')
+        update = sqlalchemy.text('UPDATE article_metadata SET text_compressed = :value, text = NULL WHERE id = :id')
+        convert = compress_text
+
+    rows_done = 0
+    bytes_in  = 0
+    bytes_out = 0
+    last_id   = 0
+    t0        = time.time()
+    with mysql_engine.connect() as conn:
+        add_column(conn)
+
+        while True:
+            rows = conn.execute(select, last_id = last_id, n = args.batch_size).fetchall()
+            if not rows:
+                break
+
+            params = []
+            for aid, value in rows:
+                new = convert(value)
+                params.append({'id': aid, 'value': new})
+
+                bytes_in  += len(value) if isinstance(value, bytes) else len(value.encode('utf-8'))
+                bytes_out += len(new) if isinstance(new, bytes) else len(new.encode('utf-8'))
+
+            with conn.begin():
+                conn.execute(update, params)
+
+            rows_done += len(rows)
+            last_id    = rows[-1][0]
+            print("Through article %d: %d rows, %.1f MB -> %.1f MB (%.1fs)" %
+                (last_id, rows_done, bytes_in / 1e6, bytes_out / 1e6, time.time() - t0))
+
+    print("Done. Converted %d rows." % rows_done)
+    if not args.decompress:
+        print("Run OPTIMIZE TABLE article_metadata to give the freed space back to InnoDB.")
+
+if __name__ == '__main__':
+    main()
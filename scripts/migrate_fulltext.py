@@ -0,0 +1,53 @@
+"""
+Create the FULLTEXT indexes used by the adjudication search box, on
+event_metadata and canonical_event, if they don't exist yet. Then set
+FULLTEXT_SEARCH = True in config.py.
+
+generate_event_metadata.py recreates the event_metadata index itself
+whenever it rebuilds that table.
+
+Usage: python scripts/migrate_fulltext.py
+"""
+
+import os
+import sys
+import time
+
+import sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config
+from modules import fulltext
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+def create_fulltext_index(conn, table):
+    """ Add the FULLTEXT index for a table unless it is already there. """
+    name   = 'ft_%s' % table
+    exists = conn.execute(sqlalchemy.text(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND INDEX_NAME = :i"), t = table, i = name).scalar()
+    if exists:
+        print("%s already has %s." % (table, name))
+        return
+
+    t0 = time.time()
+    conn.execute(sqlalchemy.text('ALTER TABLE `%s` ADD FULLTEXT INDEX `%s` (%s)' %
+        (table, name, ', '.join('`%s`' % c for c in fulltext.columns[table]))))
+    print("Created %s on %s in %.1fs." % (name, table, time.time() - t0))
+
+def main():
+    with mysql_engine.connect() as conn:
+        for table in fulltext.columns:
+            create_fulltext_index(conn, table)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Add the indexes and unique constraints declared in models.py which the
+database doesn't have yet. FULLTEXT indexes are left to migrate_fulltext.py.
+
+A unique constraint which existing rows would break is reported and
+skipped, except in the recent_* tables, whose duplicates are stale
+history: only the most recently accessed row of each is kept, as the app
+itself does.
+
+generate_event_metadata.py recreates the event_metadata indexes itself
+whenever it rebuilds that table.
+
+Usage: python scripts/migrate_indexes.py [table ...]
+"""
+
+import os
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config, models
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+## tables where duplicates are deleted rather than blocking the constraint
+prune_duplicates = ['recent_event', 'recent_canonical_event', 'recent_search']
+
+def declared(table):
+    """ Indexes and unique constraints declared on a table, without FULLTEXT indexes. """
+    t = models.Base.metadata.tables[table]
+    items  = [x for x in t.indexes if x.dialect_options['mysql']['prefix'] != 'FULLTEXT']
+    items += [x for x in t.constraints if isinstance(x, sqlalchemy.UniqueConstraint)]
+    return sorted(items, key = lambda x: x.name)
+
+def _key_exprs(item, alias):
+    """ The indexed expression for each column, cut to the prefix MySQL indexes. """
+    lengths = item.dialect_options['mysql']['length'] if isinstance(item, sqlalchemy.Index) else None
+    exprs = []
+    for c in item.columns:
+        n = lengths.get(c.name) if isinstance(lengths, dict) else lengths
+        expr = '%s.`%s`' % (alias, c.name)
+        exprs.append('LEFT(%s, %d)' % (expr, n) if n else expr)
+    return exprs
+
+def _exists(conn, table, name):
+    return conn.execute(sqlalchemy.text(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND INDEX_NAME = :i"), t = table, i = name).scalar()
+
+def _duplicates(conn, table, item):
+    """ Number of keys held by more than one row. Rows with a NULL in the key never clash. """
+    exprs = _key_exprs(item, 't')
+    return conn.execute(sqlalchemy.text(
+        'SELECT COUNT(*) FROM (SELECT 1 FROM `%s` t WHERE %s GROUP BY %s HAVING COUNT(*) > 1) d' %
+        (table, ' AND '.join('t.`%s` IS NOT NULL' % c.name for c in item.columns), ', '.join(exprs)))).scalar()
+
+def _prune(conn, table, item):
+    """ Delete all but the most recently accessed row of each duplicated key. """
+    same = ' AND '.join('%s = %s' % x for x in zip(_key_exprs(item, 'old'), _key_exprs(item, 'new')))
+    return conn.execute(sqlalchemy.text(
+        'DELETE old FROM `%s` old JOIN `%s` new ON %s AND '
+        '(new.last_accessed > old.last_accessed OR (new.last_accessed = old.last_accessed AND new.id > old.id))' %
+        (table, table, same))).rowcount
+
+def create_indexes(conn, table):
+    """ Add any of the table's declared indexes which are missing. """
+    for item in declared(table):
+        if _exists(conn, table, item.name):
+            print("%s already has %s." % (table, item.name))
+            continue
+
+        unique = isinstance(item, sqlalchemy.UniqueConstraint) or item.unique
+        if unique and _duplicates(conn, table, item):
+            if table not in prune_duplicates:
+                print("Skipped %s on %s: %d keys are held by more than one row." %
+                    (item.name, table, _duplicates(conn, table, item)))
+                continue
+            print("Deleted %d duplicate rows from %s." % (_prune(conn, table, item), table))
+
+        t0 = time.time()
+        conn.execute(AddConstraint(item) if isinstance(item, sqlalchemy.UniqueConstraint) else CreateIndex(item))
+        print("Created %s on %s in %.1fs." % (item.name, table, time.time() - t0))
+
+def main():
+    tables = sys.argv[1:] or sorted(models.Base.metadata.tables)
+    with mysql_engine.connect() as conn:
+        for table in tables:
+            create_indexes(conn, table)
+
+if __name__ == '__main__':
+    main()
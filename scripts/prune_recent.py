@@ -0,0 +1,47 @@
+"""
+Keeps only the most recently viewed events and canonical events of each
+coder, RECENT_EVENTS_KEEP of each (50 if unset). The adjudication page
+only shows the last few, so older rows only make the tables bigger.
+
+Run it from cron, e.g. nightly:
+
+  0 3 * * * cd /path/to/mpeds && python scripts/prune_recent.py
+
+Usage: python scripts/prune_recent.py [keep]
+"""
+
+import os
+import sys
+import time
+
+import sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.abspath('.'), 'scripts'))
+
+from context import config, models
+from modules import recent
+
+## MySQL setup
+mysql_engine = sqlalchemy.create_engine(
+    'mysql://%s:%s@localhost/%s?unix_socket=%s&charset=%s' %
+        (config.MYSQL_USER,
+        config.MYSQL_PASS,
+        config.MYSQL_DB,
+        config.MYSQL_SOCK,
+        'utf8mb4'))
+
+tables = [models.RecentEvent.__table__, models.RecentCanonicalEvent.__table__]
+
+def main():
+    keep = int(sys.argv[1]) if len(sys.argv) > 1 else getattr(config, 'RECENT_EVENTS_KEEP', 50)
+    if keep < 1:
+        sys.exit('keep must be at least 1.')
+
+    for table in tables:
+        t0 = time.time()
+        with mysql_engine.begin() as conn:
+            deleted = recent.prune(conn, table, keep)
+        print("Deleted %d rows from %s in %.1fs." % (deleted, table.name, time.time() - t0))
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,45 @@
 # -*- coding: utf-8 -*-
-import json
-import urllib
-import urllib2
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-""" 
-Helper class for querying an Apache Solr database. 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.solr_client import SolrClient, quote_term
+
+"""
+Helper class for querying an Apache Solr database.
+
+Results are paged with cursorMark, so deep result sets cost the same per
+page as shallow ones. The iter* methods are generators which yield one
+document at a time; the get* methods return lists, as they always have.
 """
 
 class Solr:
-    def __init__(self):
-        self.solr_url   = None
+    def __init__(self, rows = 500, workers = 4):
+        self.solr_url = None
+        self.client   = None
+        self.rows     = rows
+        self.workers  = workers
 
 
     def setSolrURL(self, url):
         self.solr_url = url
 
+        ## accept either the core address or its select handler
+        if url.rstrip('/').endswith('/select'):
+            url = url.rstrip('/')[:-len('/select')]
+        self.client = SolrClient(url, timeout = 60)
 
-    def _getDocumentsFromIDChunk(self, ids):
-        ids = [x.encode('utf8') for x in ids]
-        ids_qclause = '"' + '" OR "'.join(ids) + '"'
-        ids_q = 'id: (' + ids_qclause + ')'
-        
-        docs  = self.getDocuments(ids_q)
 
-        return docs
+    def _idQuery(self, ids):
+        return 'id:(%s)' % ' OR '.join(quote_term(x) for x in ids)
 
 
     def buildSolrQuery(self, q_dict):
         ''' Build a query for a Solr request. '''
         q = []
-        for k, v in q_dict.iteritems():
+        for k, v in q_dict.items():
             sub_q = '%s:"%s"' % (k, v)
             q.append(sub_q)
 
@@ -39,85 +49,75 @@ class Solr:
 
     def getResultsFound(self, q, fq = None):
         """ report the number of results found for any given request. """
-        data = {
-            'q':     q,
-            'start': 0,
-            'rows':  10,
-            'wt':    'json'
-        }
-
+        data = {'q': q, 'rows': 0}
         if fq:
             data['fq'] = fq
 
-        data = urllib.urlencode(data)
-        req  = urllib2.Request(self.solr_url, data)
-        res  = urllib2.urlopen(req)
-        res  = json.loads(res.read())
-
-        return res['response']['numFound']
-
+        return self.client.select(data)['response']['numFound']
 
-    def getDocuments(self, q, fq = None):
-        """ makes Solr requests to get article texts """
 
+    def iterDocuments(self, q, fq = None, fl = None, rows = None, verbose = True):
+        """ Generator over every document matching the query, paged with cursorMark. """
         data = {
-            'q':     q,
-            'start': 0,
-            'rows':  10,
-            'wt':    'json',
+            'q':          q,
+            'rows':       rows or self.rows,
+            'sort':       'id asc',
+            'cursorMark': '*'
         }
 
         if fq:
             data['fq'] = fq
+        if fl:
+            data['fl'] = fl
+
+        n = 0
+        while True:
+            res = self.client.select(data)
 
-        data = urllib.urlencode(data)
-        req  = urllib2.Request(self.solr_url, data)
-        res  = urllib2.urlopen(req)
-        res  = json.loads(res.read())
+            if verbose and data['cursorMark'] == '*':
+                print("%d documents found." % res['response']['numFound'])
 
-        numFound = res['response']['numFound']
+            for doc in res['response']['docs']:
+                yield doc
 
-        print("%d documents found." % numFound)
+            n += len(res['response']['docs'])
+            if verbose and n and n % 10000 < len(res['response']['docs']):
+                print('%d documents collected.' % n)
 
-        interval = 100
+            ## the cursor stops moving once everything has been returned
+            if res['nextCursorMark'] == data['cursorMark']:
+                break
+            data['cursorMark'] = res['nextCursorMark']
 
-        ## add 100 to get everything for sure
-        numFound += interval
 
-        articles = []
-        for i in range(0, numFound, interval):
-            data = {
-                'q': q,
-                'rows': interval,
-                'start': i,
-                'wt': 'json'
-            }
+    def getDocuments(self, q, fq = None, fl = None):
+        """ makes Solr requests to get article texts """
+        return list(self.iterDocuments(q, fq = fq, fl = fl))
 
-            if fq:
-                data['fq'] = fq
 
-            data = urllib.urlencode(data)
-            req  = urllib2.Request(self.solr_url, data)
-            res  = urllib2.urlopen(req)
-            res  = json.loads(res.read())
+    def iterDocumentsFromIDs(self, ids, maxclauses = 1024, fl = None):
+        """ Generator over the documents for these ids. Chunks of ids are fetched
+            concurrently, at most self.workers at a time, and yielded in order. """
+        id_chunks = [ids[i:i + maxclauses] for i in range(0, len(ids), maxclauses)]
 
-            articles.extend(res['response']['docs'])
+        def fetch(chunk):
+            return list(self.iterDocuments(self._idQuery(chunk), fl = fl, verbose = False))
 
-            if i % 1000 == 0 and i > 0:
-                print('%d documents collected.' % i)
+        with ThreadPoolExecutor(max_workers = self.workers) as pool:
+            ## keep only a few chunks in flight so memory stays bounded
+            pending = []
+            for i, chunk in enumerate(id_chunks):
+                pending.append(pool.submit(fetch, chunk))
 
-        return articles
+                if len(pending) >= self.workers:
+                    for doc in pending.pop(0).result():
+                        yield doc
+                    print("### Chunk %d of %d" % (i + 2 - self.workers, len(id_chunks)))
 
-    def getDocumentsFromIDs(self, ids, maxclauses=1024):
-        # Chunk trick from https://stackoverflow.com/questions/312443/how-do-you-split-a-list-into-evenly-sized-chunks
-        id_chunks = [ids[i:i + maxclauses] for i
-                     in xrange(0, len(ids), maxclauses)]
+            for future in pending:
+                for doc in future.result():
+                    yield doc
 
-        docs = list()
-        # NB: making copies of this list will use up memory fast!
-        for i in range(len(id_chunks)):
-            print("### Chunk %d of %d" % (i + 1, len(id_chunks)))
-            docs.extend(self._getDocumentsFromIDChunk(id_chunks[i]))
-        
-        return docs
 
+    def getDocumentsFromIDs(self, ids, maxclauses = 1024, fl = None):
+        return list(self.iterDocumentsFromIDs(ids, maxclauses, fl))
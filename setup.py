@@ -10,6 +10,7 @@ import glob
 import json
 
 import config
+from modules.users import users_changed
 
 def addArticlesExample(db_name = 'test'):
 	""" Add articles from example directory. """
@@ -75,6 +76,7 @@ def addUsersExample():
 	db_session.add(User(username = 'coder2p_2', password = 'default', authlevel = 2))
 
 	db_session.commit()
+	users_changed(getattr(config, 'CACHE_DIR', None))
 
 
 def addQueueExample():
@@ -147,7 +147,7 @@ var loadRelationshipListeners = function() {
   // initialize the relationship listeners
   for (var i = 1; i < 4; i++) {
     $("#relationship-key-" + i).autocomplete({
-      minlength: 2,
+      minLength: 2,
       classes: {
         "ui-autocomplete": "ui-autocomplete-adj"
       },
@@ -205,43 +205,24 @@ var loadRelationshipListeners = function() {
         loadGrid(canonical_event_key, getCandidates());
       });
 
-      // add delete listeners to the hierarchy view
-      $('.hierarchy-parent .glyphicon-trash').click(function(e) {
+      // add delete listeners to the hierarchy view, for relationships at any depth
+      $('.hierarchy-wrapper .glyphicon-trash').click(function(e) {
         r = confirm("Are you sure you want to delete this relationship?");
         if (r == true) {
-          var parent_div = $(this).closest('.hierarchy-parent');
+          var rel_div = $(this).parent();
           var req = $.ajax({
             url: $SCRIPT_ROOT + '/delete_canonical_relationship',
             method: "POST",
             data: {
-              id1: $(this).closest('.hierarchy-wrapper').attr('data-id'),
-              id2: parent_div.attr('data-id'),
-              type: parent_div.attr('data-type')
+              id1: rel_div.attr('data-id1'),
+              id2: rel_div.attr('data-id2'),
+              type: rel_div.attr('data-type')
             }
           })
           .done(function() {
-            parent_div.remove();
-            return makeSuccess("Relationship deleted.");
-          })
-          .fail(function() { return makeError(req.responseText); });
-        }
-      });
-
-      $('.hierarchy-child .glyphicon-trash').click(function(e) {
-        r = confirm("Are you sure you want to delete this relationship?");
-        if (r == true) {
-          var child_div = $(this).closest('.hierarchy-child');
-          var req = $.ajax({
-            url: $SCRIPT_ROOT + '/delete_canonical_relationship',
-            method: "POST",
-            data: {
-              id1: child_div.attr('data-id'),
-              id2: $(this).closest('.hierarchy-wrapper').attr('data-id'),
-              type: child_div.attr('data-type')
-            }
-          })
-          .done(function() {
-            child_div.remove();
+            // whatever was shown under it goes too
+            rel_div.next('.sub').remove();
+            rel_div.remove();
             return makeSuccess("Relationship deleted.");
           })
           .fail(function() { return makeError(req.responseText); });
@@ -257,13 +238,14 @@ var loadRelationshipListeners = function() {
  * @returns true if successful, false otherwise.
  */
  var loadSearch = function(search_mode) {
+  var query = $('#' + search_mode + '_search_form, ' + 
+    '#' + search_mode + '_filter_form, ' + 
+    '#' + search_mode + '_sort_form').serialize();
+
   var req = $.ajax({
     url: $SCRIPT_ROOT + '/do_search/' + search_mode,
     type: "POST",
-    data: 
-      $('#' + search_mode + '_search_form, ' + 
-        '#' + search_mode + '_filter_form, ' + 
-        '#' + search_mode + '_sort_form').serialize(),
+    data: query,
     beforeSend: function () {
       $('.flash').removeClass('alert-danger');
       $('.flash').addClass('alert-info');
@@ -272,8 +254,9 @@ var loadRelationshipListeners = function() {
     }
   })
   .done(function() {
-    // Update content block.
+    // Update content block, and keep the query for loading more pages.
     $('#' + search_mode + '-search_block').html(req.responseText); 
+    $('#' + search_mode + '-search_block').data('query', query);
 
     // Update the search button text.
     n_results = req.getResponseHeader('Search-Results');
@@ -306,6 +289,66 @@ var loadRelationshipListeners = function() {
   .fail(function() { return makeError(req.responseText); });
 }
 
+/**
+ * Fills the suggestions for a candidate filter value with the counts of events
+ * for each value of its field, among events matching the rest of the search.
+ * Fields which can't be counted are left without suggestions.
+ */
+var loadFacets = function(i) {
+  var field = $('#candidate_filter_field_' + i).val();
+  var datalist = $('#candidate_filter_values_' + i);
+  if (!field) {
+    datalist.empty();
+    return;
+  }
+
+  var req = $.ajax({
+    url: $SCRIPT_ROOT + '/search_facets/candidate',
+    type: "POST",
+    dataType: "json",
+    data: $('#candidate_search_form, #candidate_filter_form').serialize() + 
+      '&facet_field=' + encodeURIComponent(field) + '&facet_row=' + i
+  })
+  .done(function(data) {
+    datalist.empty();
+    var values = data['result']['data'][field] || [];
+    for (var j = 0; j < values.length; j++) {
+      datalist.append($('<option>').attr('value', values[j][0]).text(values[j][1] + ' events'));
+    }
+  })
+  .fail(function() { datalist.empty(); });
+}
+
+/**
+ * Loads the next page of search results, with the query of the last search,
+ * in place of the "load more" button.
+ */
+var loadMoreSearch = function(load_more) {
+  var search_block = load_more.closest('.candidate-subtab-pane, .canonical-subtab-pane');
+  var search_mode = search_block.attr('id').split('-')[0];
+
+  var req = $.ajax({
+    url: $SCRIPT_ROOT + '/do_search/' + search_mode,
+    type: "POST",
+    data: search_block.data('query') + '&cursor=' + encodeURIComponent(load_more.attr('data-cursor')),
+    beforeSend: function () {
+      load_more.find('a').addClass('disabled').text("Loading...");
+    }
+  })
+  .done(function() {
+    load_more.replaceWith(req.responseText);
+
+    if (search_mode == 'candidate') {
+      markGridEvents();
+      initializeSearchListeners();
+    } else {
+      initializeCanonicalSearchListeners();
+    }
+    return true;
+  })
+  .fail(function() { return makeError(req.responseText); });
+}
+
 /**
  * Prevents the user from submitting the form by pressing enter.
  * @param event The keypress event.
@@ -556,7 +599,7 @@ var updateGridWithCandidateEvent = function(event_id) {
  */
 var initializeSearchListeners = function() {
   // listeners for current search results
-  $('.cand-makeactive').click(function(e) {
+  $('.cand-makeactive').off('click').click(function(e) {
     e.preventDefault();
     var event_desc = $(e.target).closest('.event-desc');
     var event_id = event_desc.attr('data-event');
@@ -577,7 +620,7 @@ var initializeSearchListeners = function() {
  */
 var initializeCanonicalSearchListeners = function() {
   // Listener for canonical event search.
-  $('.canonical-makeactive').click(function (e) {
+  $('.canonical-makeactive').off('click').click(function (e) {
     e.preventDefault();
 
     // get event desc
@@ -597,7 +640,7 @@ var initializeCanonicalSearchListeners = function() {
     }
   });
 
-  $('.canonical-cand-makeactive').click(function (e) {
+  $('.canonical-cand-makeactive').off('click').click(function (e) {
     e.preventDefault()
 
     var event_id = $(e.target).attr('data-event');
@@ -656,6 +699,36 @@ var initializeGridListeners = function() {
     .fail(function() { return makeError(req.responseText); });
   });
 
+  // Add every value of this candidate event to the current canonical event, in one request
+  $('.add-all').click(function(e) {
+    var canonical_event_id = $('div.canonical-event-metadata').attr('id').split('_')[1];
+    if (canonical_event_id == '') {
+      makeError("Please select a canonical event first.");
+      return false;
+    }
+
+    var column = $(e.target).closest('.candidate-event');
+    var req = $.ajax({
+      type: 'POST',
+      url: $SCRIPT_ROOT + '/add_canonical_records',
+      data: {
+        canonical_event_id: canonical_event_id,
+        event_ids: column.attr('data-event')
+      }
+    })
+    .done(function() {
+      var cells = req.responseJSON['result']['data'];
+      $.each(cells, function(i, cell) {
+        var group = $('#canonical-event_' + cell['var']);
+        group.find('.none').remove();
+        group.append(cell['html']);
+        group.children().last().find('a.remove-canonical').click(removeCanonical);
+      });
+      return makeSuccess(cells.length + " values added.");
+    })
+    .fail(function() { return makeError(req.responseText); });
+  });
+
   // Link this event candidate event to the current canonical event
   $('.add-link').click(function(e) {
     var canonical_event_id = $('div.canonical-event-metadata').attr('id').split('_')[1];
@@ -946,6 +1019,20 @@ $(function () {
       loadSearch('candidate'); 
     });
 
+    // Listeners for filter value counts, when a field is picked and when a value is about to be entered.
+    for (var i = 0; i < 4; i++) {
+      (function(i) {
+        $('#candidate_filter_field_' + i).change(function() { loadFacets(i); });
+        $('#candidate_filter_value_' + i).focus(function() { loadFacets(i); });
+      })(i);
+    }
+
+    // Listener for loading more search results, for either search mode.
+    $(document).on('click', '.search-load-more a', function(e) {
+      e.preventDefault();
+      loadMoreSearch($(this).closest('.search-load-more'));
+    });
+
     // Listener for clear button.
     $('.clear-values').each(function() {
       $(this).click(function() {
@@ -970,13 +1057,15 @@ $(function () {
     // Listener for canonical event search
     $('#canonical_search_button').click(function(e) {
       e.preventDefault();
+      var query = $('#canonical_search_form, ' + 
+        '#canonical_filter_form, ' + 
+        '#canonical_sort_form').serialize();
+
       // Get the candidates from the database
       var req = $.ajax({
         url: $SCRIPT_ROOT + '/do_search/canonical',
         type: "POST",
-        data: $('#canonical_search_form, ' + 
-          '#canonical_filter_form, ' + 
-          '#canonical_sort_form').serialize(),
+        data: query,
         beforeSend: function () {
           $('.flash').removeClass('alert-danger');
           $('.flash').addClass('alert-info');
@@ -985,8 +1074,9 @@ $(function () {
           }
       })
       .done(function() {
-        // Update the canonical events in the search list
+        // Update the canonical events in the search list, and keep the query for loading more pages
         $('#canonical-search_block').html(req.responseText);
+        $('#canonical-search_block').data('query', query);
 
         // Update the search button text.
         n_results = req.getResponseHeader('Search-Results');
@@ -0,0 +1,71 @@
+"""
+The app's real models.py, importable without a config.py or MySQL.
+
+The repository root is loaded as a package under a fixed name, with a
+stub config and a database module whose session is bound to SQLite, so
+tests can check queries against the real mapping. models.py still needs
+flask_login and pytz; load() raises ImportError without them.
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+import types
+
+import sqlalchemy
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+ROOT    = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PACKAGE = 'mpeds_app'
+
+## the collation models.py gives article_metadata.text
+COLLATIONS = ['utf8mb4_general_ci']
+
+def engine():
+    """ An in-memory SQLite engine which accepts the MySQL collations models.py names. """
+    e = sqlalchemy.create_engine('sqlite://')
+
+    @sqlalchemy.event.listens_for(e, 'connect')
+    def _collations(dbapi_conn, record):
+        for name in COLLATIONS:
+            dbapi_conn.create_collation(name, lambda a, b: (a.lower() > b.lower()) - (a.lower() < b.lower()))
+
+    return e
+
+
+def create_tables(engine, tables):
+    """ Create tables without their indexes: index names are per table in MySQL,
+        and models.py reuses some, but SQLite's are per database. """
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(sqlalchemy.schema.CreateTable(table))
+
+
+def load(**settings):
+    """ The models module, with config values from settings. Loaded once per process;
+        settings only take effect on the first call. """
+    name = PACKAGE + '.models'
+    if name in sys.modules:
+        return sys.modules[name]
+
+    import flask_login, pytz
+
+    spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, '__init__.py'),
+        submodule_search_locations = [ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+    spec.loader.exec_module(package)
+
+    config = types.ModuleType(PACKAGE + '.config')
+    config.__dict__.update(settings)
+    sys.modules[config.__name__] = config
+
+    database = types.ModuleType(PACKAGE + '.database')
+    database.mysql_engine = engine()
+    database.db_session   = scoped_session(sessionmaker(bind = database.mysql_engine))
+    database.Base         = declarative_base()
+    sys.modules[database.__name__] = database
+
+    return importlib.import_module(name)
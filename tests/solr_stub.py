@@ -0,0 +1,124 @@
+"""
+Stand-in for a Solr core, for exercising the Solr client and loaders offline.
+
+Serves /<core>/select over HTTP/1.1 with keep-alive. Understands the id
+queries the interface issues, i.e. id:"x" and id:("x" OR "y"), plus *:*,
+the rows/start parameters, and cursorMark paging. An optional delay simulates network latency.
+"""
+
+import json
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+id_re = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SolrStub(object):
+    def __init__(self, docs, delay = 0.0, core = 'solr/mpeds2'):
+        self.docs  = {d['id']: d for d in docs}
+        self.order = [d['id'] for d in docs]
+        self.delay = delay
+        self.core  = core
+        self.requests    = 0
+        self.connections = 0
+
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._respond(urlsplit(self.path).query)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self._respond(self.rfile.read(length).decode('utf-8'))
+
+            def _respond(self, query):
+                stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                body = json.dumps(stub.select(parse_qs(query))).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = _Server(('127.0.0.1', 0), Handler)
+        self.url    = 'http://127.0.0.1:%d/%s' % (self.server.server_address[1], core)
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.daemon = True
+
+    def select(self, params):
+        q     = params.get('q', ['*:*'])[0]
+        rows  = int(params.get('rows', [10])[0])
+        start = int(params.get('start', [0])[0])
+
+        if q == '*:*':
+            ids = self.order
+        elif q.startswith('id:'):
+            ids = [x.replace('\\"', '"').replace('\\\\', '\\') for x in id_re.findall(q)]
+            ids = [x for x in ids if x in self.docs]
+        else:
+            ids = []
+
+        ## cursorMark paging: the stub's cursor is just the offset
+        cursor = params.get('cursorMark', [None])[0]
+        if cursor is not None:
+            ids   = sorted(ids)
+            start = 0 if cursor == '*' else int(cursor)
+
+        docs = [self.docs[x] for x in ids[start:start + rows]]
+        res  = {
+            'responseHeader': {'status': 0},
+            'response': {
+                'numFound': len(ids),
+                'start': start,
+                'docs': docs
+            }
+        }
+
+        if cursor is not None:
+            res['nextCursorMark'] = str(start + len(docs)) if docs else cursor
+
+        return res
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_docs(n):
+    """ Generate n fake articles shaped like our Solr documents. """
+    docs = []
+    for i in range(n):
+        docs.append({
+            'id': 'Example-Daily_2016-04-%02d_%06d' % (i % 28 + 1, i),
+            'TITLE': 'Students rally on campus, part %d' % i,
+            'PUBLICATION': 'Example Daily',
+            'DATE': ['2016-04-%02dT00:00:00Z' % (i % 28 + 1)],
+            'TEXT': '<br/>'.join(['Paragraph %d of article %d.' % (j, i) for j in range(12)])
+        })
+    return docs
@@ -0,0 +1,203 @@
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, ForeignKey, Integer, LargeBinary, String, UnicodeText, event
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred, sessionmaker
+
+import models_stub
+from modules.articles import article_ids, article_query
+
+try:
+    app_models = models_stub.load()
+except ImportError:
+    app_models = None
+
+## no list page should need more than this per article row
+MAX_BYTES_PER_ROW = 4096
+
+Base = declarative_base()
+
+class ArticleMetadata(Base):
+    __tablename__ = 'article_metadata'
+    id              = Column(Integer, primary_key = True)
+    title           = Column(String(1024))
+    db_name         = Column(String(64))
+    db_id           = Column(String(255))
+    text_raw        = deferred(Column('text', UnicodeText))
+    text_compressed = deferred(Column(LargeBinary))
+
+class ArticleQueue(Base):
+    __tablename__ = 'article_queue'
+    id         = Column(Integer, primary_key = True)
+    article_id = Column(Integer, ForeignKey('article_metadata.id'))
+    coder_id   = Column(Integer)
+
+## without COMPRESS_ARTICLES there is no text_compressed attribute
+PlainBase = declarative_base()
+
+class PlainArticleMetadata(PlainBase):
+    __tablename__ = 'article_metadata'
+    id       = Column(Integer, primary_key = True)
+    title    = Column(String(1024))
+    db_name  = Column(String(64))
+    text_raw = deferred(Column('text', UnicodeText))
+
+models       = types.SimpleNamespace(ArticleMetadata = ArticleMetadata)
+plain_models = types.SimpleNamespace(ArticleMetadata = PlainArticleMetadata)
+
+class ArticlePayloadTest(unittest.TestCase):
+    """ The article text is only in the SELECT when the caller asks for it. """
+
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind = self.engine)()
+
+        for i in range(1, 6):
+            self.session.add(ArticleMetadata(id = i, title = 'Article %d' % i,
+                db_name = 'first' if i < 4 else 'second', db_id = 'Daily-Cardinal-%d' % i,
+                text_raw = u'Body %d' % i))
+            self.session.add(ArticleQueue(id = i, article_id = i, coder_id = 1))
+        self.session.commit()
+        self.session.expunge_all()
+
+        self.statements = []
+        event.listen(self.engine, 'after_cursor_execute', self._record)
+
+    def tearDown(self):
+        event.remove(self.engine, 'after_cursor_execute', self._record)
+        self.session.close()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append([x[0] for x in cursor.description or []])
+
+    def selected(self):
+        """ Columns of article_metadata in the result of the last statement. """
+        prefix = 'article_metadata_'
+        return [x[len(prefix):] for x in self.statements[-1] if x.startswith(prefix)]
+
+    ## Tests
+    def test_list_query_leaves_out_text(self):
+        self.session.query(ArticleQueue, ArticleMetadata).join(ArticleMetadata).all()
+        self.assertNotIn('text', self.selected())
+        self.assertNotIn('text_compressed', self.selected())
+
+    def test_article_query_without_text(self):
+        articles = article_query(self.session, models).filter(ArticleMetadata.db_name == 'first').all()
+        self.assertEqual([x.id for x in articles], [1, 2, 3])
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn('title', self.selected())
+        self.assertNotIn('text', self.selected())
+        self.assertNotIn('text_compressed', self.selected())
+
+    def test_article_query_with_text(self):
+        article = article_query(self.session, models, text = True).filter_by(id = 2).first()
+        self.assertIn('text', self.selected())
+        self.assertIn('text_compressed', self.selected())
+
+        ## the text is already loaded
+        self.assertEqual(article.text_raw, u'Body 2')
+        self.assertEqual(len(self.statements), 1)
+
+    def test_article_query_without_text_compressed(self):
+        article = article_query(self.session, plain_models, text = True).filter_by(id = 4).first()
+        self.assertEqual(article.text_raw, u'Body 4')
+        self.assertEqual(sorted(self.selected()), ['db_name', 'id', 'text', 'title'])
+
+    def test_article_ids(self):
+        self.assertEqual(sorted(article_ids(self.session, models, db_name = 'second')), [4, 5])
+        self.assertEqual(self.statements[-1], ['article_metadata_id'])
+
+        self.assertEqual(sorted(article_ids(self.session, models,
+            ArticleMetadata.db_id.like('Daily-Cardinal%'), ArticleMetadata.id.in_([1, 5, 9]))), [1, 5])
+        self.assertEqual(self.statements[-1], ['article_metadata_id'])
+        self.assertEqual(self.session.identity_map.keys(), set())
+
+
+@unittest.skipIf(app_models is None, "models.py needs flask_login and pytz")
+class AppModelsPayloadTest(unittest.TestCase):
+    """ The same against the app's own mapping, and the bytes each list endpoint's query fetches. """
+
+    def setUp(self):
+        m = app_models
+        self.engine = models_stub.engine()
+        models_stub.create_tables(self.engine, [m.User.__table__, m.ArticleMetadata.__table__,
+            m.ArticleQueue.__table__, m.EventCreatorQueue.__table__, m.CodeFirstPass.__table__])
+        self.session = sessionmaker(bind = self.engine)()
+
+        self.session.add(m.User('coder1', 'x', 1))
+        for i in range(1, 11):
+            self.session.add(m.ArticleMetadata('article-%d.txt' % i, db_name = 'first', db_id = 'Daily-Cardinal-%d' % i,
+                title = 'Article %d' % i, publication = 'Daily Cardinal', text = u'Students marched. ' * 20000))
+        self.session.flush()
+        for i in range(1, 11):
+            self.session.add(m.ArticleQueue(i, 1))
+            self.session.add(m.EventCreatorQueue(i, 1))
+            self.session.add(m.CodeFirstPass(i, 'protest', 'yes', 1))
+        self.session.commit()
+        self.session.expunge_all()
+
+        self.rows  = 0
+        self.bytes = 0
+        self.text_loaded = 0
+        event.listen(m.ArticleMetadata, 'load', self.count)
+
+    def tearDown(self):
+        event.remove(app_models.ArticleMetadata, 'load', self.count)
+        self.session.close()
+
+    def count(self, target, context):
+        self.rows += 1
+        for k, v in target.__dict__.items():
+            if k.startswith('_'):
+                continue
+            if k in ('text_raw', 'text_compressed'):
+                self.text_loaded += 1
+            self.bytes += len(v.encode('utf-8')) if isinstance(v, str) else len(str(v))
+
+    def check(self, query, endpoint):
+        query.all()
+        self.assertEqual(self.rows, 10, endpoint)
+        self.assertEqual(self.text_loaded, 0, "%s loaded article text" % endpoint)
+        self.assertLessEqual(self.bytes / self.rows, MAX_BYTES_PER_ROW,
+            "%s fetched %d bytes over %d articles" % (endpoint, self.bytes, self.rows))
+
+    def selects_text(self, query):
+        """ Whether the query's SELECT, as MySQL gets it, includes the article text. """
+        sql = str(query.statement.compile(dialect = mysql.dialect()))
+        return 'article_metadata.`text`' in sql.split('FROM')[0]
+
+    ## Tests
+    def test_text_is_deferred(self):
+        m = app_models
+        self.assertFalse(self.selects_text(article_query(self.session, m)))
+        self.assertFalse(self.selects_text(self.session.query(m.ArticleQueue, m.ArticleMetadata).\
+            join(m.ArticleMetadata)))
+        self.assertTrue(self.selects_text(article_query(self.session, m, text = True)))
+
+        article = article_query(self.session, m, text = True).filter_by(id = 3).first()
+        self.assertEqual(self.text_loaded, 1)
+        self.assertTrue(article.text.startswith(u'Students marched.'))
+
+    def test_list_endpoints(self):
+        m = app_models
+        for query, endpoint in [
+                (self.session.query(m.ArticleQueue, m.ArticleMetadata).join(m.ArticleMetadata), 'userArticleList'),
+                (self.session.query(m.EventCreatorQueue, m.ArticleMetadata).join(m.ArticleMetadata), 'userArticleListAdmin'),
+                (self.session.query(m.CodeFirstPass, m.ArticleMetadata).join(m.ArticleMetadata).\
+                    filter(m.CodeFirstPass.variable == 'protest'), 'code2queue'),
+                (article_query(self.session, m), 'articleQuery without text')]:
+            self.rows = self.bytes = self.text_loaded = 0
+            self.session.expunge_all()
+            self.check(query, endpoint)
+
+
+if __name__ == "__main__":
+    unittest.main()
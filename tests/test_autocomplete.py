@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.autocomplete import KeyIndex
+
+class AutocompleteTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        cities = ['Madison', 'Chicago', 'Berkeley', 'Austin', 'AnnArbor', 'Durham']
+        issues = ['Tuition', 'BLM', 'Labor', 'Divestment', 'Racism']
+        self.keys = set('%s_%s_2016%02d%02d' % (rng.choice(cities), rng.choice(issues),
+            rng.randint(1, 12), rng.randint(1, 28)) for _ in range(2000))
+        self.index = KeyIndex(self.keys)
+
+    def _expected(self, term, limit):
+        """ What LIKE '%term%' would find, in the index's order. """
+        t = term.lower()
+        exact  = sorted(k for k in self.keys if k.lower() == t)
+        prefix = sorted((k for k in self.keys if k.lower().startswith(t) and k.lower() != t), key = lambda k: (k.lower(), k))
+        other  = sorted((k for k in self.keys if t in k.lower() and not k.lower().startswith(t)), key = lambda k: (k.lower(), k))
+        return (exact + prefix + other)[:limit]
+
+    ## Tests
+    def test_matches_substring_search(self):
+        for term in ['m', 'ma', 'madison_', 'TUITION', '_blm_', '201603', 'son_Lab', 'ivest', 'nomatch']:
+            for limit in [1, 20, 10000]:
+                self.assertEqual(self.index.search(term, limit), self._expected(term, limit), term)
+
+    def test_exact_match_first(self):
+        index = KeyIndex(['Madison_BLM_2', 'Madison_BLM', 'West_Madison_BLM'])
+        self.assertEqual(index.search('madison_blm'), ['Madison_BLM', 'Madison_BLM_2', 'West_Madison_BLM'])
+
+    def test_add_and_remove(self):
+        key = sorted(self.keys)[0]
+        self.index.remove(key)
+        self.assertNotIn(key, self.index)
+        self.assertNotIn(key, self.index.search(key, 10000))
+        self.assertEqual(len(self.index), len(self.keys) - 1)
+
+        self.index.add('Madison_NewKey_20170101')
+        self.assertEqual(self.index.search('newkey'), ['Madison_NewKey_20170101'])
+
+        ## removing keys which aren't there is fine
+        self.index.remove('not a key')
+        self.assertEqual(self.index.search(''), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
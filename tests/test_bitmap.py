@@ -0,0 +1,109 @@
+import datetime as dt
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.bitmap import BitmapIndex, popcount
+
+def _matches(v, compare, value, null_matches_ne = False):
+    """ One filter on one value, the way MySQL would evaluate it. """
+    if v is None:
+        return compare == 'ne' and null_matches_ne
+    if isinstance(v, dt.date):
+        value = dt.datetime.strptime(value, '%Y-%m-%d').date()
+        return {'eq': v == value, 'ne': v != value, 'lt': v < value,
+            'le': v <= value, 'gt': v > value, 'ge': v >= value}[compare]
+
+    v, value = v.lower(), value.lower()
+    return {'eq': v.rstrip(' ') == value.rstrip(' '), 'ne': v.rstrip(' ') != value.rstrip(' '),
+        'contains': value in v, 'starts': v.startswith(value), 'ends': v.endswith(value)}[compare]
+
+
+class BitmapIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+
+        ## ids with gaps, a common value, rare values and NULLs
+        self.ids  = sorted(rng.sample(range(1, 5000), 1500))
+        self.rows = [{
+            'publication': rng.choice(['Milwaukee Journal', 'milwaukee journal', 'Chicago Tribune'] +
+                ['Paper {}'.format(i) for i in range(40)] + [None]),
+            'form': rng.choice(['March', 'Rally', 'Rally;March', None]),
+            'start_date': rng.choice([None, dt.date(2016, 1, 1) + dt.timedelta(days = rng.randrange(400))])}
+            for _ in self.ids]
+        self.event_ids = [rng.randrange(300) for _ in self.ids]
+        self.flags     = {e: rng.sample(['for-review', 'completed', 'check-date'], rng.randint(1, 2))
+            for e in range(0, 300, 3)}
+
+        self.index = BitmapIndex(self.ids,
+            {c: [r[c] for r in self.rows] for c in ['publication', 'form', 'start_date']},
+            date_columns = ['start_date'], keys = {'event_id': self.event_ids})
+        self.flag_bitmaps = self.index.joined('event_id', self.flags)
+
+    def _expected(self, filters):
+        ids = []
+        for id, row, event_id in zip(self.ids, self.rows, self.event_ids):
+            ## a row matches a flag filter if any of its event's flags does
+            flags = self.flags.get(event_id, [None])
+            if all(any(_matches(x, c, v, True) for x in flags) if f == 'flag' else _matches(row[f], c, v)
+                    for f, c, v in filters):
+                ids.append(id)
+        return ids
+
+    def _all_ids(self, bits):
+        return self.index.page(bits, None, self.index.n)[0]
+
+    ## Tests
+    def test_filters_match_sql(self):
+        cases = [
+            [('publication', 'eq', 'Milwaukee Journal')],
+            [('publication', 'eq', 'MILWAUKEE JOURNAL  ')],
+            [('publication', 'ne', 'Chicago Tribune')],
+            [('publication', 'contains', 'paper 1')],
+            [('publication', 'starts', 'Paper'), ('form', 'ends', 'march')],
+            [('form', 'eq', 'Rally'), ('start_date', 'ge', '2016-03-15'), ('start_date', 'lt', '2016-09-01')],
+            [('start_date', 'le', '2016-02-29')],
+            [('start_date', 'gt', '2016-12-31')],
+            [('flag', 'ne', 'completed'), ('form', 'contains', 'rally')],
+            [('flag', 'eq', 'for-review'), ('publication', 'ne', 'nothing')],
+            [('flag', 'ne', 'for-review'), ('flag', 'ne', 'check-date')],
+            [('publication', 'eq', 'nothing')],
+            []]
+        for filters in cases:
+            bits = self.index.match(filters, extra = {'flag': self.flag_bitmaps}, null_matches_ne = ['flag'])
+            self.assertEqual(self._all_ids(bits), self._expected(filters), filters)
+            self.assertEqual(popcount(bits), len(self._expected(filters)))
+
+    def test_unanswerable(self):
+        for filters in [
+                [('location', 'eq', 'Madison, WI')],
+                [('publication', 'contains', 'Paper_1')],
+                [('publication', 'lt', 'M')],
+                [('start_date', 'eq', 'not a date')]]:
+            self.assertIsNone(self.index.match(filters))
+
+    def test_pages(self):
+        bits     = self.index.match([('form', 'contains', 'rally')])
+        expected = self._expected([('form', 'contains', 'rally')])
+
+        ids      = []
+        after_id = None
+        while True:
+            page, more = self.index.page(bits, after_id, 37)
+            ids.extend(page)
+            if not more:
+                break
+            self.assertEqual(len(page), 37)
+            after_id = page[-1]
+        self.assertEqual(ids, expected)
+
+        ## a cursor id which isn't in the index
+        self.assertEqual(self.index.page(bits, expected[10] + 0.5, 5)[0], expected[11:16])
+        self.assertEqual(self.index.page(0), ([], False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.cache import Derived, DiskCache, Generation, Generations, LRUCache, TieredCache
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    ## Tests
+    def test_lru_evicts_oldest(self):
+        c = LRUCache(maxsize = 2)
+        c.set('a', 1)
+        c.set('b', 2)
+
+        ## touch a so b is the oldest
+        self.assertEqual(c.get('a'), 1)
+        c.set('c', 3)
+
+        self.assertIsNone(c.get('b'))
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.get('c'), 3)
+        self.assertEqual(c.stats()['hits'], 3)
+        self.assertEqual(c.stats()['misses'], 1)
+
+    def test_disk_shared_between_instances(self):
+        DiskCache(self.path, 'article').set((1, 'abc'), (b'text', b'html'))
+
+        ## a second instance stands in for another worker process
+        other = DiskCache(self.path, 'article')
+        self.assertEqual(other.get((1, 'abc')), (b'text', b'html'))
+        self.assertIsNone(other.get((1, 'def')))
+
+    def test_disk_expire(self):
+        disk = DiskCache(self.path, 'search')
+        disk.set('old', 1)
+        disk.set('new', 2)
+        past = time.time() - 120
+        os.utime(disk._filename('old'), (past, past))
+
+        self.assertEqual(disk.expire(60), 1)
+        self.assertIsNone(disk.get('old'))
+        self.assertEqual(disk.get('new'), 2)
+
+        disk.clear()
+        self.assertIsNone(disk.get('new'))
+
+    def test_disk_maxsize(self):
+        disk = DiskCache(self.path, 'article', maxsize = 10)
+        for i in range(10):
+            disk.set(i, i)
+            past = time.time() - 1000 + i
+            os.utime(disk._filename(i), (past, past))
+
+        ## a read keeps 0 from being the least recently used
+        self.assertEqual(disk.get(0), 0)
+
+        ## every maxsize / 10 writes, entries past maxsize go, oldest first
+        disk.set(10, 10)
+        self.assertEqual(len(os.listdir(disk.path)), 10)
+        self.assertIsNone(disk.get(1))
+        self.assertEqual(disk.get(0), 0)
+        self.assertEqual(disk.get(10), 10)
+        self.assertEqual(disk.stats()['evicted'], 1)
+
+    def test_tiered_promotes_disk_hits(self):
+        disk = DiskCache(self.path, 'article')
+        disk.set('k', 'v')
+
+        c = TieredCache(LRUCache(10), disk)
+        self.assertEqual(c.get('k'), 'v')
+        self.assertIn('k', c.memory)
+        self.assertEqual(c.stats()['disk']['hits'], 1)
+
+    def test_generation_shared_between_instances(self):
+        gen   = Generation(self.path, 'search')
+        other = Generation(self.path, 'search')
+        token = gen.current()
+        self.assertEqual(other.current(), token)
+
+        ## a bump in one worker is seen by the others
+        other.bump()
+        self.assertNotEqual(gen.current(), token)
+        self.assertEqual(gen.current(), other.current())
+
+        ## without a path, bumps stay in the process
+        local = Generation()
+        token = local.current()
+        local.bump()
+        self.assertNotEqual(local.current(), token)
+
+    def test_generations_move_with_any(self):
+        events, flags = Generation(self.path, 'events'), Generation(self.path, 'flags')
+        both  = Generations(events, flags)
+        token = both.current()
+        flags.bump()
+        self.assertNotEqual(both.current(), token)
+
+        token = both.current()
+        events.bump()
+        self.assertNotEqual(both.current(), token)
+
+    def test_derived_rebuilds_after_bump(self):
+        gen     = Generation(self.path, 'keys')
+        source  = ['a']
+        derived = Derived(gen, lambda: list(source))
+        self.assertEqual(derived.get(), ['a'])
+
+        ## rebuilt only once the generation moves on
+        source.append('b')
+        self.assertEqual(derived.get(), ['a'])
+        Generation(self.path, 'keys').bump()
+        self.assertEqual(derived.get(), ['a', 'b'])
+        self.assertEqual(derived.builds, 2)
+
+        ## a bump this worker has applied itself doesn't cause a rebuild
+        old = gen.current()
+        derived.peek().append('c')
+        derived.adopt(old, gen.bump())
+        self.assertEqual(derived.get(), ['a', 'b', 'c'])
+        self.assertEqual(derived.builds, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.compress import compress_text, decompress_text
+
+class CompressTest(unittest.TestCase):
+    ## Tests
+    def test_roundtrip(self):
+        text = u'Students at the University of Wisconsin–Madison rallied.<br/>' * 200
+        blob = compress_text(text)
+
+        self.assertLess(len(blob), len(text.encode('utf-8')))
+        self.assertEqual(decompress_text(blob), text)
+        self.assertEqual(decompress_text(compress_text(u'')), u'')
+        self.assertIsNone(decompress_text(None))
+
+    def test_mysql_layout(self):
+        text = u'trailing space '
+        blob = compress_text(text)
+
+        ## length prefix as written by COMPRESS(), and its trailing '.'
+        self.assertEqual(struct.unpack('<I', blob[:4])[0], len(text))
+        self.assertEqual(decompress_text(blob + b'.'), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules import fulltext
+from modules.fulltext import Term
+
+class FulltextTest(unittest.TestCase):
+    ## Tests
+    def test_parse(self):
+        groups = fulltext.parse('tuition AND "sit in" OR protest*')
+        self.assertEqual(groups, [
+            [Term('tuition', 'word'), Term('sit in', 'phrase')],
+            [Term('protest', 'prefix')]])
+
+        ## AND/OR inside quotes are part of the phrase
+        self.assertEqual(fulltext.parse('"law AND order"'), [[Term('law AND order', 'phrase')]])
+
+        ## unquoted words together are a phrase, as with the old substring search
+        self.assertEqual(fulltext.parse('student union'), [[Term('student union', 'phrase')]])
+
+    def test_boolean_query(self):
+        self.assertEqual(fulltext.boolean_query(fulltext.parse('tuition AND "sit in"')), 
+            '+tuition +"sit in"')
+        self.assertEqual(fulltext.boolean_query(fulltext.parse('tuition AND hike OR protest*')), 
+            '(+tuition +hike) (+protest*)')
+
+        ## operators typed into the box are not passed through
+        self.assertEqual(fulltext.boolean_query(fulltext.parse('-(march) @3')), '+"march 3"')
+
+    def test_indexable(self):
+        self.assertTrue(fulltext.indexable(fulltext.parse('tuition OR march')))
+        self.assertFalse(fulltext.indexable(fulltext.parse('UW')))
+        self.assertFalse(fulltext.indexable(fulltext.parse('1968')))
+
+    def test_like_text_keeps_hyphens(self):
+        for search_str, like in [('2016-04-01', '2016-04-01'), ('UW-Madison', 'UW-Madison'),
+            ('Mizzou_2015-11-09', 'Mizzou_2015-11-09'), ('"sit-in at UW-Madison"', 'sit-in at UW-Madison'),
+            ('Mizzou_2015*', 'Mizzou_2015')]:
+            groups = fulltext.parse(search_str)
+            self.assertEqual([[fulltext.like_text(t) for t in x] for x in groups], [[like]])
+
+        ## these go to LIKE rather than the index
+        self.assertFalse(fulltext.indexable(fulltext.parse('2016-04-01')))
+        self.assertFalse(fulltext.indexable(fulltext.parse('UW-Madison')))
+        self.assertFalse(fulltext.indexable(fulltext.parse('Mizzou_2015-11-09')))
+
+        groups = fulltext.parse('UW-Madison AND 2016-04-01 OR "Mizzou_2015-11-09"')
+        self.assertEqual([[fulltext.like_text(t) for t in x] for x in groups],
+            [['UW-Madison', '2016-04-01'], ['Mizzou_2015-11-09']])
+
+        ## boolean mode still gets the cleaned text
+        self.assertEqual(fulltext.boolean_query(fulltext.parse('anti-tuition')), '+"anti tuition"')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules import hierarchy
+from modules.graph import CanonicalGraph
+
+class GraphTest(unittest.TestCase):
+    def setUp(self):
+        self.events = [(i, 'ce-%02d' % i) for i in range(1, 31)]
+
+    def _nearest(self, rows, up):
+        """ {id: shortest depth} of ancestors (up) or descendants of each event, from closure rows. """
+        nearest = {}
+        for (a, x, d) in rows:
+            src, dst = (x, a) if up else (a, x)
+            found = nearest.setdefault(src, {})
+            found[dst] = min(d, found.get(dst, d))
+        return nearest
+
+    ## Tests
+    def test_matches_closure(self):
+        rng   = random.Random(1)
+        graph = CanonicalGraph(self.events)
+        edges = []
+        for _ in range(60):
+            child, parent = rng.randint(1, 30), rng.randint(1, 30)
+            if graph.creates_cycle(child, parent):
+                self.assertIn((child, parent), hierarchy.closure([x[:2] for x in edges] + [(child, parent)])[1])
+                continue
+            rtype = rng.choice(['part-of', 'related'])
+            graph.add_edge(child, parent, rtype)
+            edges.append((child, parent, rtype))
+
+            if rng.random() < 0.3:
+                child, parent, rtype = edges.pop(rng.randrange(len(edges)))
+                graph.remove_edge(child, parent, rtype)
+
+        rows, skipped = hierarchy.closure([x[:2] for x in edges])
+        self.assertEqual(skipped, [])
+        ancestors, descendants = self._nearest(rows, True), self._nearest(rows, False)
+        for id, _ in self.events:
+            self.assertEqual(graph.ancestors(id), ancestors.get(id, {}))
+            self.assertEqual(graph.descendants(id), descendants.get(id, {}))
+            for other in graph.descendants(id):
+                self.assertTrue(graph.is_ancestor(id, other))
+                self.assertFalse(graph.is_ancestor(other, id))
+
+        ## every related pair is in one component, and components don't overlap
+        components = graph.components()
+        where = {x: i for i, c in enumerate(components) for x in c}
+        self.assertEqual(len(where), sum(len(c) for c in components))
+        for child, parent, _ in edges:
+            self.assertEqual(where[child], where[parent])
+            self.assertEqual(graph.component(child), components[where[child]])
+
+    def test_writes(self):
+        graph = CanonicalGraph(self.events[:4], [(2, 1, 'part-of'), (3, 2, 'part-of'), (3, 2, 'related')])
+        self.assertEqual(graph.id_of('ce-03'), 3)
+        self.assertEqual(graph.parents(3), [(2, 'part-of'), (2, 'related')])
+
+        graph.set_event(3, 'renamed')
+        self.assertEqual((graph.id_of('ce-03'), graph.id_of('renamed'), graph.key_of(3)), (None, 3, 'renamed'))
+
+        graph.remove_edge(3, 2, 'part-of')
+        self.assertEqual(graph.parents(3), [(2, 'related')])
+        self.assertEqual(graph.ancestors(3), {2: 1, 1: 2})
+
+        graph.remove_event(2)
+        self.assertEqual((graph.parents(3), graph.children(1), graph.id_of('ce-02')), ([], [], None))
+        self.assertEqual(graph.components(), [])
+        self.assertEqual(len(graph), 3)
+
+        graph.set_event(5, 'ce-05')
+        graph.add_edge(5, 1, 'part-of')
+        graph.add_edge(5, 99, 'part-of')
+        self.assertEqual(graph.components(), [[1, 5]])
+
+    def test_hierarchy_and_tree(self):
+        graph = CanonicalGraph(self.events[:6],
+            [(2, 1, 'part-of'), (3, 2, 'part-of'), (4, 3, 'related'), (5, 2, 'part-of'), (2, 6, 'part-of')])
+
+        data = graph.hierarchy(2)
+        self.assertEqual(sorted(data.events), [1, 3, 4, 5, 6])
+        self.assertEqual([(x.key, r.canonical_id1, r.canonical_id2) for x, r in data.parents[2]],
+            [('ce-01', 2, 1), ('ce-06', 2, 6)])
+        self.assertEqual([x.id for x, _ in data.children[2]], [3, 5])
+        self.assertEqual([(x.id, r.relationship_type) for x, r in data.children[3]], [(4, 'related')])
+        self.assertEqual(graph.hierarchy(99), ({}, {}, {}))
+
+        tree = graph.tree(2)
+        self.assertEqual([x['key'] for x in tree['parents']], ['ce-01', 'ce-06'])
+        self.assertEqual(tree['children'][0]['children'][0], {'id': 4, 'key': 'ce-04', 'type': 'related', 'children': []})
+        self.assertNotIn('children', graph.tree(2, 1)['children'][0])
+        self.assertIsNone(graph.tree(99))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import datetime
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, DateTime, Integer, Text, UnicodeText
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from modules import grid, query_log
+
+Base = declarative_base()
+
+class EventMetadata(Base):
+    __tablename__ = 'event_metadata'
+    id         = Column(Integer, primary_key = True)
+    event_id   = Column(Integer)
+    location   = Column(Text)
+    start_date = Column(Text)
+
+class CodeEventCreator(Base):
+    __tablename__ = 'coder_event_creator'
+    id         = Column(Integer, primary_key = True)
+    article_id = Column(Integer)
+    event_id   = Column(Integer)
+    coder_id   = Column(Integer)
+    variable   = Column(Text)
+    value      = Column(Text)
+    text       = Column(UnicodeText)
+    timestamp  = Column(DateTime)
+
+class EventFlag(Base):
+    __tablename__ = 'event_flag'
+    id        = Column(Integer, primary_key = True)
+    event_id  = Column(Integer)
+    flag      = Column(Text)
+    timestamp = Column(DateTime)
+
+class CanonicalEvent(Base):
+    __tablename__ = 'canonical_event'
+    id          = Column(Integer, primary_key = True)
+    key         = Column(Text)
+    description = Column(UnicodeText)
+    notes       = Column(UnicodeText)
+
+class CanonicalEventLink(Base):
+    __tablename__ = 'canonical_event_link'
+    id           = Column(Integer, primary_key = True)
+    coder_id     = Column(Integer)
+    canonical_id = Column(Integer)
+    cec_id       = Column(Integer)
+    timestamp    = Column(DateTime)
+
+models = types.SimpleNamespace(EventMetadata = EventMetadata, CodeEventCreator = CodeEventCreator,
+    EventFlag = EventFlag, CanonicalEvent = CanonicalEvent, CanonicalEventLink = CanonicalEventLink)
+
+FIELDS    = ['location', 'start_date']
+USERNAMES = {1: 'coder1', 2: 'adj1'}
+NOW       = datetime.datetime(2016, 5, 1, 12, 0)
+
+class GridTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.counter = query_log.QueryCounter(self.engine)
+        self.session = sessionmaker(bind = self.engine)()
+
+        s = self.session
+        for e in range(1, 21):
+            s.add(EventMetadata(id = e, event_id = e, location = 'Place %d' % e, start_date = '2016-05-%02d' % e))
+            s.add(CodeEventCreator(id = e * 10, article_id = 100 + e, event_id = e, coder_id = 1,
+                variable = 'form', value = 'March', timestamp = NOW))
+            s.add(CodeEventCreator(id = e * 10 + 1, article_id = 100 + e, event_id = e, coder_id = 1,
+                variable = 'desc', text = u'Event %d' % e, timestamp = NOW))
+        s.add(EventFlag(id = 1, event_id = 2, flag = 'for-review', timestamp = NOW))
+
+        s.add(CanonicalEvent(id = 1, key = 'ce-1', description = u'A march', notes = None))
+        s.add(CanonicalEvent(id = 2, key = 'ce-empty', description = u'Nothing linked', notes = None))
+        s.add(CodeEventCreator(id = 500, article_id = 900, event_id = 50, coder_id = 2, variable = 'link', value = None))
+        s.add(CodeEventCreator(id = 501, article_id = 901, event_id = 51, coder_id = 3, variable = 'link', value = None))
+        s.add(CanonicalEventLink(id = 1, canonical_id = 1, cec_id = 10, timestamp = NOW))
+        s.add(CanonicalEventLink(id = 2, canonical_id = 1, cec_id = 500, timestamp = NOW))
+        s.add(CanonicalEventLink(id = 3, canonical_id = 1, cec_id = 501, timestamp = NOW))
+        s.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _load(self, ids, key):
+        self.counter.reset()
+        result = grid.load(self.session, models, ids, key, FIELDS, USERNAMES)
+        return result, self.counter.count()
+
+    ## Tests
+    def test_candidate_events(self):
+        result, _ = self._load([1, 2], None)
+        self.assertEqual(result.cand_events[1]['metadata'], {'location': 'Place 1', 'start_date': '2016-05-01'})
+        self.assertEqual(result.cand_events[1]['form'], [('March', 10, NOW)])
+        self.assertEqual(result.cand_events[2]['desc'], [(u'Event 2', 21, NOW)])
+        self.assertEqual(result.flags, {2: 'for-review'})
+        self.assertIsNone(result.canonical_event)
+        self.assertEqual(result.links, [])
+
+    def test_canonical_event(self):
+        result, _ = self._load([], 'ce-1')
+        ce = result.canonical_event
+        self.assertEqual((ce['id'], ce['key'], ce['description']), (1, 'ce-1', u'A march'))
+        self.assertEqual(ce['form'], [(1, 'March', NOW, 1, 0)])
+        self.assertEqual(ce['link'], [(2, None, NOW, 50, 1)])
+
+        ## links count even when their coder is unknown
+        self.assertEqual(result.links, [900, 901])
+
+        result, _ = self._load([], 'ce-empty')
+        self.assertEqual(result.canonical_event,
+            {'id': 2, 'key': 'ce-empty', 'description': u'Nothing linked', 'notes': None})
+        self.assertEqual(self._load([], 'missing')[0][1:3], (None, []))
+
+    def test_constant_queries(self):
+        for n in [1, 5, 20]:
+            result, count = self._load(list(range(1, n + 1)), 'ce-1')
+            self.assertEqual(len(result.cand_events), n)
+            self.assertEqual(count, 2)
+
+            _, count = self._load(list(range(1, n + 1)), None)
+            self.assertEqual(count, 1)
+
+    def test_add_links(self):
+        self.counter.reset()
+        records = grid.records(self.session, models, {500}, [3, 4], ['form'])
+        self.assertEqual([x.id for x in records], [30, 40, 500])
+
+        ## 10 is linked to ce-1 already, and 30 is asked for twice
+        links = [(10, 1), (30, 1), (40, 1), (30, 1), (30, 2)]
+        cels, skipped = grid.add_links(self.session, models, links, 7, NOW)
+        self.assertEqual(self.counter.count(), 4)
+        self.assertEqual(skipped, 1)
+        self.assertEqual([(x.cec_id, x.canonical_id, x.coder_id, x.timestamp) for x in cels],
+            [(30, 1, 7, NOW), (40, 1, 7, NOW), (30, 2, 7, NOW)])
+        self.session.commit()
+
+        cels, skipped = grid.add_links(self.session, models, links, 7, NOW)
+        self.assertEqual((cels, skipped), ([], 4))
+        self.assertEqual(grid.add_links(self.session, models, [], 7, NOW), ([], 0))
+
+    def test_canonical_ids(self):
+        self.counter.reset()
+        self.assertEqual(grid.canonical_ids(self.session, models, [1, 2, 3, 2]), {1, 2})
+        self.assertEqual(self.counter.count(), 1)
+        self.assertEqual(grid.canonical_ids(self.session, models, []), set())
+        self.assertEqual(self.counter.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import random
+import sys
+import types
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Index, Integer, Text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from modules import hierarchy
+
+Base = declarative_base()
+
+class CanonicalEvent(Base):
+    __tablename__ = 'canonical_event'
+    id  = Column(Integer, primary_key = True)
+    key = Column(Text)
+
+class CanonicalEventRelationship(Base):
+    __tablename__ = 'canonical_event_relationship'
+    id                = Column(Integer, primary_key = True)
+    canonical_id1     = Column(Integer)
+    canonical_id2     = Column(Integer)
+    relationship_type = Column(Text)
+
+class CanonicalEventClosure(Base):
+    __tablename__ = 'canonical_event_closure'
+    ancestor_id   = Column(Integer, primary_key = True, autoincrement = False)
+    descendant_id = Column(Integer, primary_key = True, autoincrement = False)
+    depth         = Column(Integer, primary_key = True, autoincrement = False)
+    paths         = Column(Integer, nullable = False)
+
+    __table_args__ = (
+        Index('ix_descendant', 'descendant_id', 'ancestor_id', 'depth'),
+    )
+
+models = types.SimpleNamespace(CanonicalEvent = CanonicalEvent,
+    CanonicalEventRelationship = CanonicalEventRelationship, CanonicalEventClosure = CanonicalEventClosure)
+
+def brute_force(edges):
+    """ Closure rows by walking every path from every event. """
+    parents = {}
+    for child, parent in edges:
+        parents.setdefault(child, []).append(parent)
+
+    rows = Counter()
+    def walk(start, id, depth):
+        for p in parents.get(id, []):
+            rows[(p, start, depth + 1)] += 1
+            walk(start, p, depth + 1)
+    for id in set(x for e in edges for x in e):
+        walk(id, id, 0)
+    return rows
+
+class HierarchyTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind = self.engine)()
+        for i in range(1, 21):
+            self.session.add(CanonicalEvent(id = i, key = 'ce-%02d' % i))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _closure(self):
+        return Counter({(a, x, d): n for a, x, d, n in self.session.query(CanonicalEventClosure.ancestor_id,
+            CanonicalEventClosure.descendant_id, CanonicalEventClosure.depth, CanonicalEventClosure.paths)})
+
+    def _add(self, child, parent, rtype = 'part-of'):
+        self.session.add(CanonicalEventRelationship(canonical_id1 = child, canonical_id2 = parent,
+            relationship_type = rtype))
+        hierarchy.add_edge(self.session, models, child, parent)
+
+    ## Tests
+    def test_random_edits(self):
+        rng   = random.Random(1)
+        edges = []
+        for step in range(300):
+            if edges and rng.random() < 0.35:
+                child, parent = edges.pop(rng.randrange(len(edges)))
+                hierarchy.remove_edge(self.session, models, child, parent)
+            else:
+                child, parent = rng.randint(1, 20), rng.randint(1, 20)
+                cycle = child == parent or any(a == child and x == parent for a, x, _ in brute_force(edges))
+                self.assertEqual(hierarchy.creates_cycle(self.session, models, child, parent), cycle)
+                if cycle:
+                    continue
+                hierarchy.add_edge(self.session, models, child, parent)
+                edges.append((child, parent))
+
+            if step % 25 == 0:
+                self.assertEqual(self._closure(), brute_force(edges))
+        self.assertEqual(self._closure(), brute_force(edges))
+        self.assertEqual(hierarchy.closure(edges), (brute_force(edges), []))
+
+    def test_cycles(self):
+        self._add(2, 1)
+        self._add(3, 2)
+        self.assertTrue(hierarchy.creates_cycle(self.session, models, 1, 3))
+        self.assertTrue(hierarchy.creates_cycle(self.session, models, 3, 3))
+        self.assertFalse(hierarchy.creates_cycle(self.session, models, 3, 1))
+
+        ## a second relationship between the same events is two paths, not a cycle
+        self.assertFalse(hierarchy.creates_cycle(self.session, models, 2, 1))
+        self._add(2, 1, 'related')
+        self.assertEqual(self._closure()[(1, 3, 2)], 2)
+        hierarchy.remove_edge(self.session, models, 2, 1)
+        self.assertEqual(self._closure()[(1, 3, 2)], 1)
+
+        self.assertEqual(hierarchy.closure([(2, 1), (1, 2), (3, 3)])[1], [(1, 2), (3, 3)])
+
+    def test_built(self):
+        self.assertTrue(hierarchy.built(self.session, models))
+
+        ## relationships written before the closure table existed
+        self.session.add(CanonicalEventRelationship(canonical_id1 = 2, canonical_id2 = 1, relationship_type = 'part-of'))
+        self.assertFalse(hierarchy.built(self.session, models))
+
+        hierarchy.rebuild(self.session, models)
+        self.assertTrue(hierarchy.built(self.session, models))
+
+    def test_rebuild_and_load(self):
+        for child, parent in [(2, 1), (3, 2), (4, 3), (5, 4), (6, 2), (2, 7)]:
+            self._add(child, parent)
+        self.session.add(CanonicalEventRelationship(canonical_id1 = 1, canonical_id2 = 5, relationship_type = 'x'))
+        built = self._closure()
+
+        self.assertEqual(hierarchy.rebuild(self.session, models), [(1, 5)])
+        self.assertEqual(self._closure(), built)
+
+        self.assertEqual(hierarchy.ancestors(self.session, models, 5), {4: 1, 3: 2, 2: 3, 1: 4, 7: 4})
+        self.assertEqual(hierarchy.descendants(self.session, models, 2), {3: 1, 4: 2, 5: 3, 6: 1})
+
+        data = hierarchy.load(self.session, models, 2)
+        self.assertEqual(sorted(x.id for x, _ in data.parents[2]), [1, 7])
+        self.assertEqual([x.key for x, _ in data.children[2]], ['ce-03', 'ce-06'])
+        self.assertEqual([x.id for x, _ in data.children[4]], [5])
+        self.assertEqual(hierarchy.load(self.session, models, 20), ({}, {}, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
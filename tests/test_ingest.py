@@ -0,0 +1,93 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules import ingest
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+ln_export = u"""﻿
+                               1 of 2 DOCUMENTS
+
+                           The New York Times
+
+                    April 7, 1997, Monday, FINAL EDITION
+
+Students Rally Against Tuition Increase
+
+BYLINE: By A. Reporter
+
+SECTION: Section B; Page 3
+
+Hundreds of students marched on the
+capitol on Sunday.
+
+The rally was organized by the student union.
+
+LANGUAGE: ENGLISH
+
+                               2 of 2 DOCUMENTS
+
+                 Copyright 1990 The New York Times Company: Abstracts
+
+                           WALL STREET JOURNAL
+
+An abstract which should be skipped.
+"""
+
+ldc_file = b"""<?xml version="1.0" encoding="UTF-8"?>
+<nitf>
+  <head>
+    <pubdata date.publication="19870101T000000" name="The New York Times"/>
+    <docdata><doc-id id-string="0000001"/></docdata>
+  </head>
+  <body>
+    <body.head>
+      <hedline><hl1>Campus Sit-In Ends</hl1></hedline>
+      <byline class="print_byline">By A. Reporter</byline>
+      <dateline>MADISON, Wis., Dec. 31</dateline>
+    </body.head>
+    <body.content>
+      <block class="full_text"><p>First paragraph.</p><p>Second paragraph.</p></block>
+    </body.content>
+  </body>
+</nitf>
+"""
+
+class IngestTest(unittest.TestCase):
+    ## Tests
+    def test_lexisnexis(self):
+        records = list(ingest.iter_lexisnexis(io.StringIO(ln_export)))
+
+        ## the abstract is skipped
+        self.assertEqual(len(records), 1)
+        r = records[0]
+        self.assertEqual(r['PUBLICATION'], 'The New York Times')
+        self.assertEqual(r['DATE'], '1997-04-07')
+        self.assertEqual(r['TITLE'], 'Students Rally Against Tuition Increase')
+        self.assertEqual(r['EDITION'], 'FINAL EDITION')
+        self.assertEqual(r['BYLINE'], 'By A. Reporter')
+        self.assertEqual(r['INTERNAL_ID'], 'The New York Times_1997-04-07_1')
+        self.assertEqual(r['TEXT'].split('<br/>'), 
+            ['Hundreds of students marched on the capitol on Sunday.', 
+             'The rally was organized by the student union.'])
+
+    @unittest.skipIf(lxml is None, "lxml is not installed")
+    def test_ldc(self):
+        r = next(ingest.iter_ldc(io.BytesIO(ldc_file)))
+
+        self.assertEqual(r['TITLE'], 'Campus Sit-In Ends')
+        self.assertEqual(r['DATE'], '1987-01-01')
+        self.assertEqual(r['INTERNAL_ID'], '0000001')
+        self.assertEqual(r['DATELINE'], 'MADISON, Wis., Dec. 31')
+        self.assertEqual(r['TEXT'], 'First paragraph.<br/>Second paragraph.')
+
+
+if __name__ == "__main__":
+    unittest.main()
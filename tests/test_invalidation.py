@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Integer, Text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from modules.invalidation import TableWatcher
+
+Base = declarative_base()
+
+class Flag(Base):
+    __tablename__ = 'event_flag'
+    id   = Column(Integer, primary_key = True)
+    flag = Column(Text)
+
+class Note(Base):
+    __tablename__ = 'note'
+    id   = Column(Integer, primary_key = True)
+    text = Column(Text)
+
+class InvalidationTest(unittest.TestCase):
+    def setUp(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = scoped_session(sessionmaker(bind = engine, autoflush = False))
+
+        self.calls   = []
+        self.watcher = TableWatcher(self.session)
+        self.watcher.watch(['event_flag'], lambda: self.calls.append('flag'))
+
+    def tearDown(self):
+        self.session.remove()
+
+    ## Tests
+    def test_called_after_commit(self):
+        self.session.add(Flag(id = 1, flag = 'for-review'))
+        self.session.flush()
+        self.assertEqual(self.calls, [])
+
+        self.session.commit()
+        self.assertEqual(self.calls, ['flag'])
+
+        ## updates and deletes count too
+        self.session.query(Flag).get(1).flag = 'completed'
+        self.session.commit()
+        self.session.delete(self.session.query(Flag).get(1))
+        self.session.commit()
+        self.assertEqual(self.calls, ['flag', 'flag', 'flag'])
+
+    def test_bulk_delete(self):
+        self.session.add(Flag(id = 1, flag = 'for-review'))
+        self.session.commit()
+
+        self.session.query(Flag).filter(Flag.id == 1).delete()
+        self.session.commit()
+        self.assertEqual(self.calls, ['flag', 'flag'])
+
+    def test_ignores_rollbacks_and_other_tables(self):
+        self.session.add(Flag(id = 1, flag = 'for-review'))
+        self.session.flush()
+        self.session.rollback()
+
+        self.session.add(Note(id = 1, text = 'unrelated'))
+        self.session.commit()
+
+        ## a commit with nothing written
+        self.session.commit()
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
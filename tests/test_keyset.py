@@ -0,0 +1,81 @@
+import datetime as dt
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Date, Integer, MetaData, Table, Text
+from sqlalchemy.orm import sessionmaker
+
+from modules import keyset
+
+class KeysetTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata    = MetaData()
+        self.events = Table('event', metadata,
+            Column('id', Integer, primary_key = True),
+            Column('location', Text),
+            Column('start_date', Date))
+        metadata.create_all(self.engine)
+
+        ## few distinct values, and some NULLs, so ties and NULL ordering both matter
+        rng = random.Random(1)
+        self.rows = [{'id': i,
+            'location': rng.choice(['Madison, WI', 'Chicago, IL', 'Austin, TX', None]),
+            'start_date': rng.choice([dt.date(2016, 1, 1), dt.date(2016, 5, 1), None])}
+            for i in range(1, 201)]
+        with self.engine.begin() as conn:
+            conn.execute(self.events.insert(), self.rows)
+
+        self.session = sessionmaker(bind = self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _all_pages(self, keys, size):
+        query  = self.session.query(*[x[0] for x in keys])
+        ids    = []
+        values = None
+        while True:
+            rows, next_values = keyset.page(query, keys, values, size)
+            ids.extend(x[-1] for x in rows)
+            if next_values is None:
+                return ids
+
+            ## the cursor makes the round trip through the client
+            values = keyset.decode_cursor(keyset.encode_cursor(next_values), len(keys))
+
+    ## Tests
+    def test_pages_match_full_sort(self):
+        t = self.events
+        for keys in [
+                [(t.c.location, 'asc'), (t.c.id, 'asc')],
+                [(t.c.location, 'desc'), (t.c.start_date, 'asc'), (t.c.id, 'asc')],
+                [(t.c.start_date, 'desc'), (t.c.location, 'desc'), (t.c.id, 'asc')]]:
+            expected = [x[-1] for x in self.session.query(*[x[0] for x in keys]).\
+                order_by(*keyset.order_by(keys)).all()]
+
+            for size in [1, 7, 200, 500]:
+                self.assertEqual(self._all_pages(keys, size), expected)
+
+    def test_last_page(self):
+        t = self.events
+        keys = [(t.c.id, 'asc')]
+        rows, next_values = keyset.page(self.session.query(t.c.id), keys, [195], 10)
+        self.assertEqual([x[0] for x in rows], [196, 197, 198, 199, 200])
+        self.assertIsNone(next_values)
+
+    def test_cursor(self):
+        cursor = keyset.encode_cursor(['Madison, WI', dt.date(2016, 1, 1), None, 4])
+        self.assertEqual(keyset.decode_cursor(cursor, 4), ['Madison, WI', '2016-01-01', None, 4])
+
+        for bad in ['', 'not a cursor', keyset.encode_cursor([1, 2])]:
+            self.assertRaises(ValueError, keyset.decode_cursor, bad, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
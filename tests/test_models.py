@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+
+import models_stub
+
+try:
+    app_models = models_stub.load()
+except ImportError:
+    app_models = None
+
+## attributes models.py only maps with some settings
+OPTIONAL = {'ArticleMetadata': ['text_compressed']}
+
+@unittest.skipIf(app_models is None, "models.py needs flask_login and pytz")
+class ModelsTest(unittest.TestCase):
+    """ The models the other tests declare for the modules stay in step with models.py. """
+
+    def fixtures(self):
+        import test_article_payload, test_grid, test_hierarchy, test_paragraphs, test_users
+        for module in [test_grid, test_hierarchy, test_paragraphs]:
+            for name, cls in vars(module.models).items():
+                yield module.__name__, name, cls
+        yield 'test_users', 'User', test_users.User
+        yield 'test_article_payload', 'ArticleMetadata', test_article_payload.ArticleMetadata
+        yield 'test_article_payload', 'ArticleQueue', test_article_payload.ArticleQueue
+
+    ## Tests
+    def test_fixtures_match_models(self):
+        for module, name, cls in self.fixtures():
+            real = getattr(app_models, name)
+            where = '%s.%s' % (module, name)
+            self.assertEqual(cls.__tablename__, real.__tablename__, where)
+
+            columns = {x.key: x.columns[0].name for x in sqlalchemy.inspect(real).column_attrs}
+            for attr in sqlalchemy.inspect(cls).column_attrs:
+                if attr.key in OPTIONAL.get(name, []):
+                    continue
+                self.assertIn(attr.key, columns, '%s.%s is not in models.py' % (where, attr.key))
+                self.assertEqual(attr.columns[0].name, columns[attr.key], '%s.%s' % (where, attr.key))
+
+
+if __name__ == "__main__":
+    unittest.main()
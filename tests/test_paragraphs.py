@@ -0,0 +1,82 @@
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Integer, String, UnicodeText
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from modules import paragraphs, query_log
+
+Base = declarative_base()
+
+class ArticleIngest(Base):
+    __tablename__ = 'article_ingest'
+    article_id  = Column(Integer, primary_key = True)
+    fingerprint = Column(String(64))
+    title       = Column(UnicodeText)
+    meta        = Column(UnicodeText)
+
+class ArticleParagraph(Base):
+    __tablename__ = 'article_paragraph'
+    article_id      = Column(Integer, primary_key = True)
+    paragraph_index = Column(Integer, primary_key = True, autoincrement = False)
+    text            = Column(UnicodeText)
+
+models = types.SimpleNamespace(ArticleIngest = ArticleIngest, ArticleParagraph = ArticleParagraph)
+
+DOC_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'example-articles'))
+
+class ParagraphsTest(unittest.TestCase):
+    ## Tests
+    def test_clean_drops_repeated_lead(self):
+        paras = paragraphs.clean_paragraphs(['LEAD: Students marched.', 'Students marched.', '<b>More</b> text.'])
+        self.assertEqual(paras, ['Students marched.', 'More text.'])
+
+    def test_offsets_index_plain_text(self):
+        paras = ['First paragraph.', 'Second one.', 'Third.']
+        text, html = paragraphs.render('Title', 'meta', paras)
+
+        for i, p, start, end in paragraphs.paragraph_offsets(paras):
+            self.assertEqual(text[start:end], p)
+            self.assertIn("<p id='%d'>%s</p>" % (i, p), html)
+
+    def test_parse_txt(self):
+        fn = sorted(os.listdir(DOC_ROOT))[0]
+        title, meta, paras = paragraphs.parse_txt(os.path.join(DOC_ROOT, fn), paragraphs.filename_meta(fn))
+
+        self.assertEqual(title, 'TRIAL OPENS FOR 11 WHO AIDED CENTRAL AMERICANS')
+        self.assertIn('PUBLICATION: The New York Times', meta)
+        self.assertTrue(len(paras) > 0)
+
+    def test_stored(self):
+        engine  = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        counter = query_log.QueryCounter(engine)
+        session = sessionmaker(bind = engine)()
+
+        session.add(ArticleIngest(article_id = 1, fingerprint = 'abc', title = u'Title', meta = u'meta'))
+        session.add(ArticleIngest(article_id = 2, fingerprint = 'def', title = u'Empty', meta = u''))
+        for i, p in [(1, u'Second.'), (0, u'First.'), (2, u'Third.')]:
+            session.add(ArticleParagraph(article_id = 1, paragraph_index = i, text = p))
+        session.commit()
+
+        counter.reset()
+        self.assertEqual(paragraphs.stored(session, models, 1, 'abc'),
+            (u'Title', u'meta', [u'First.', u'Second.', u'Third.']))
+        self.assertEqual(counter.count(), 1)
+
+        self.assertEqual(paragraphs.stored(session, models, 2, 'def'), (u'Empty', u'', []))
+
+        ## changed since ingest, or never ingested
+        self.assertIsNone(paragraphs.stored(session, models, 1, 'changed'))
+        self.assertIsNone(paragraphs.stored(session, models, 3, 'abc'))
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
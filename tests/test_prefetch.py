@@ -0,0 +1,71 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.cache import Generation
+from modules.prefetch import Prefetcher, queue_changed
+
+class PrefetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dir        = tempfile.mkdtemp()
+        self.prefetcher = Prefetcher(1)
+
+    def tearDown(self):
+        self.prefetcher._executor.shutdown()
+        shutil.rmtree(self.dir)
+
+    def wait(self):
+        ## the executor has one worker, so this runs after everything before it
+        done = threading.Event()
+        self.prefetcher._executor.submit(done.set)
+        self.assertTrue(done.wait(5))
+
+    ## Tests
+    def test_failures_are_logged(self):
+        def fail(is_stale):
+            raise ValueError('no such article')
+
+        with self.assertLogs('modules.prefetch', 'ERROR') as logs:
+            self.prefetcher.schedule((1, '1'), fail)
+            self.wait()
+
+        self.assertIn('no such article', logs.output[0])
+        self.assertEqual(self.prefetcher.stats()['failed'], 1)
+        self.assertEqual(self.prefetcher.stats()['pending'], 0)
+
+    def test_queue_generation(self):
+        generation = Generation(self.dir, 'queue_1')
+        started, resume = threading.Event(), threading.Event()
+        seen = []
+
+        def job(is_stale):
+            started.set()
+            resume.wait(5)
+            seen.append(is_stale())
+
+        self.prefetcher.schedule((1, '1'), job, generation = generation)
+        self.assertTrue(started.wait(5))
+
+        ## another process changes the pass 1 queues
+        queue_changed(self.dir, '1')
+        queue_changed(self.dir, 'ec')
+        resume.set()
+        self.wait()
+
+        self.assertEqual(seen, [True])
+        self.assertEqual(self.prefetcher.stats()['dropped'], 1)
+
+        ## a job scheduled after the change is current
+        self.prefetcher.schedule((1, '1'), job, generation = generation)
+        self.wait()
+        self.assertEqual(seen, [True, False])
+        self.assertEqual(self.prefetcher.stats()['completed'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Integer, MetaData, Table, Text, select
+
+from modules import query_log
+
+class QueryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.path   = tempfile.mkdtemp()
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata    = MetaData()
+        self.events = Table('event', metadata,
+            Column('id', Integer, primary_key = True),
+            Column('location', Text))
+        metadata.create_all(self.engine)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    ## Tests
+    def test_shape(self):
+        self.assertEqual(query_log.shape('SELECT id\n  FROM event WHERE id IN (%s, %s,%s) AND x = %s'),
+            'SELECT id FROM event WHERE id IN (%s) AND x = %s')
+        self.assertEqual(query_log.shape('SELECT id FROM event WHERE id IN (?, ?)'),
+            'SELECT id FROM event WHERE id IN (?)')
+        self.assertTrue(query_log.explainable('  select 1'))
+        self.assertFalse(query_log.explainable('INSERT INTO event (id) VALUES (%s)'))
+
+    def test_records_each_shape_once(self):
+        path = os.path.join(self.path, 'queries.jsonl')
+        query_log.QueryLog(self.engine, path)
+
+        t = self.events
+        with self.engine.connect() as conn:
+            conn.execute(t.insert(), [{'id': i, 'location': 'Madison, WI'} for i in range(10)])
+            conn.execute(select([t.c.id]).where(t.c.id.in_([1, 2]))).fetchall()
+            conn.execute(select([t.c.id]).where(t.c.id.in_([3, 4, 5]))).fetchall()
+            conn.execute(select([t.c.location]).where(t.c.id == 1)).fetchall()
+
+        shapes = query_log.read(path)
+        self.assertEqual(len(shapes), 2)
+
+        ## the first statement seen of each shape, with its parameters
+        entry = [x for s, x in shapes.items() if ' IN ' in s][0]
+        self.assertEqual(entry['parameters'], [1, 2])
+
+    def test_full_scans(self):
+        plan = [
+            {'table': 'e', 'type': 'ALL', 'rows': 90000},
+            {'table': 'f', 'type': 'ref', 'rows': 1},
+            {'table': 'c', 'type': 'index', 'rows': 500},
+            {'table': None, 'type': None, 'rows': None}]
+        self.assertEqual([x['table'] for x in query_log.full_scans(plan)], ['e', 'c'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import datetime
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, select
+from sqlalchemy.dialects import mysql
+
+from modules import recent
+
+T0 = datetime.datetime(2016, 5, 1, 12, 0)
+
+class RecentTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata    = MetaData()
+        self.recent = Table('recent_event', metadata,
+            Column('id', Integer, primary_key = True),
+            Column('coder_id', Integer),
+            Column('event_id', Integer),
+            Column('last_accessed', DateTime))
+        metadata.create_all(self.engine)
+
+    ## Tests
+    def test_upsert(self):
+        sql = str(recent.upsert(self.recent, 'event_id', [(1, 10, T0), (1, 11, T0)]).\
+            compile(dialect = mysql.dialect()))
+        self.assertIn('INSERT INTO recent_event', sql)
+        self.assertIn('ON DUPLICATE KEY UPDATE last_accessed = VALUES(last_accessed)', sql)
+        self.assertEqual(sql.count('(%s, %s, %s)'), 2)
+
+    def test_prune(self):
+        rows = [{'coder_id': c, 'event_id': e, 'last_accessed': T0 + datetime.timedelta(minutes = e % 7)}
+            for c in [1, 2] for e in range(c * 4)]
+        rows += [{'coder_id': 3, 'event_id': e, 'last_accessed': None} for e in range(1, 5)]
+        with self.engine.begin() as conn:
+            conn.execute(self.recent.insert(), rows)
+            self.assertEqual(recent.prune(conn, self.recent, 3), 1 + 5 + 1)
+
+            left = conn.execute(select([self.recent.c.coder_id, self.recent.c.event_id])).fetchall()
+        self.assertEqual(sorted(left), [(1, 1), (1, 2), (1, 3), (2, 4), (2, 5), (2, 6), (3, 2), (3, 3), (3, 4)])
+
+    def test_writer_merges_marks(self):
+        written = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def write(batch):
+            started.set()
+            release.wait()
+            written.append(batch)
+
+        writer = recent.RecentWriter(write)
+        writer.touch('event', 1, [10, 11], T0)
+        started.wait()
+
+        ## the first write is held up, so these all wait for the next one
+        later = T0 + datetime.timedelta(minutes = 1)
+        writer.touch('event', 1, [11, 12], later)
+        writer.touch('event', 1, [12], T0)
+        writer.touch('canonical_event', 2, ['ce-1'], later)
+
+        release.set()
+        writer.wait()
+
+        self.assertEqual(len(written), 2)
+        self.assertEqual(written[0], {'event': [(1, 10, T0), (1, 11, T0)]})
+        self.assertEqual(written[-1]['event'], [(1, 11, later), (1, 12, later)])
+        self.assertEqual(written[-1]['canonical_event'], [(2, 'ce-1', later)])
+        self.assertEqual(writer.stats()['touches'], 4)
+        self.assertEqual(writer.stats()['pending'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
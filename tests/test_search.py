@@ -0,0 +1,137 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Integer, MetaData, Table, Text, and_, distinct, func
+from sqlalchemy.orm import sessionmaker
+
+from modules import keyset, search
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata    = MetaData()
+        self.events = Table('event', metadata,
+            Column('id', Integer, primary_key = True),
+            Column('location', Text),
+            Column('form', Text))
+        self.flags  = Table('event_flag', metadata,
+            Column('id', Integer, primary_key = True),
+            Column('event_id', Integer),
+            Column('flag', Text))
+        metadata.create_all(self.engine)
+
+        rng = random.Random(1)
+        self.rows = [{'id': i,
+            'location': rng.choice(['Madison, WI', 'Chicago, IL', '100% Campus', '100 Campus',
+                'north_side', 'northXside', 'a\\b', None]),
+            'form': rng.choice(['March', 'Rally', None])}
+            for i in range(1, 301)]
+        ## event 1 has two flags
+        self.flag_rows = [{'id': 1, 'event_id': 1, 'flag': 'for-review'}, {'id': 2, 'event_id': 1, 'flag': 'duplicate'},
+            {'id': 3, 'event_id': 2, 'flag': 'for-review'}, {'id': 4, 'event_id': 4, 'flag': 'completed'}]
+        with self.engine.begin() as conn:
+            conn.execute(self.events.insert(), self.rows)
+            conn.execute(self.flags.insert(), self.flag_rows)
+
+        self.session    = sessionmaker(bind = self.engine)()
+        self.statements = search.StatementCache()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _search(self, filters, cursor = None, size = 1000):
+        """ Ids of events matching (field, compare, value) filters, the way the app runs them. """
+        t    = self.events
+        keys = [(t.c.location, 'desc'), (t.c.id, 'asc')]
+        params = {'filter_%d' % i: search.bound_value(c, v) for i, (f, c, v) in enumerate(filters)}
+
+        def build():
+            conditions = [search.compare(t.c[f], c, search.param('filter_%d' % i)) for i, (f, c, _) in enumerate(filters)]
+            cursor_params = keyset.cursor_params(keys, cursor)[0] if cursor is not None else None
+            query = self.session.query(t.c.location, t.c.id).filter(and_(*conditions))
+            return keyset.page_query(query, keys, cursor_params, size).statement
+
+        if cursor is not None:
+            params.update(keyset.cursor_params(keys, cursor)[1])
+        shape = (tuple(x[:2] for x in filters), tuple(x is None for x in cursor) if cursor else None, size)
+        rows  = self.statements.execute(self.session, shape, build, params).fetchall()
+        return keyset.split(rows, size)
+
+    def _expected(self, test):
+        return sorted([x['id'] for x in self.rows if x['location'] is not None and test(x['location'])])
+
+    ## Tests
+    def test_like_matches_literally(self):
+        for compare, value, test in [
+                ('contains', '0%', lambda x: '0%' in x),
+                ('starts', '100%', lambda x: x.startswith('100%')),
+                ('ends', '_side', lambda x: x.endswith('_side')),
+                ('contains', 'a\\b', lambda x: 'a\\b' in x),
+                ('contains', 'madison', lambda x: 'madison' in x.lower())]:
+            rows, _ = self._search([('location', compare, value)])
+            self.assertEqual(sorted(x[-1] for x in rows), self._expected(test), value)
+
+    def test_one_build_per_shape(self):
+        for value in ['Madison', 'Chicago', 'Campus', 'side']:
+            for form in ['March', 'Rally']:
+                rows, _ = self._search([('location', 'contains', value), ('form', 'eq', form)])
+                expected = sorted(x['id'] for x in self.rows
+                    if x['location'] and value.lower() in x['location'].lower() and x['form'] == form)
+                self.assertEqual(sorted(x[-1] for x in rows), expected)
+        self.assertEqual(self.statements.builds, 1)
+
+        self._search([('location', 'ne', 'Madison, WI')])
+        self.assertEqual(self.statements.builds, 2)
+
+    def test_pages(self):
+        filters = [('form', 'ne', 'Rally')]
+        everything, _ = self._search(filters)
+
+        ## NULL locations sort last, so later cursors hold NULLs and need their own statement
+        ids, cursor = [], None
+        while True:
+            rows, cursor = self._search(filters, cursor, 17)
+            ids.extend(x[-1] for x in rows)
+            if cursor is None:
+                break
+            cursor = keyset.decode_cursor(keyset.encode_cursor(cursor), 2)
+        self.assertEqual(ids, [x[-1] for x in everything])
+        self.assertEqual(self.statements.builds, 3)
+
+    def test_flags(self):
+        t, f = self.events, self.flags
+        first_ten = t.c.id <= 10
+
+        def ids(*conditions):
+            query = self.session.query(t.c.id).filter(first_ten, *conditions).order_by(t.c.id)
+            count = self.session.query(func.count(distinct(t.c.id))).filter(first_ten, *conditions).scalar()
+            found = [x[0] for x in query.all()]
+            self.assertEqual(count, len(found))
+            return found
+
+        self.assertEqual(ids(search.flag_filter(t.c.id, f.c, 'eq', 'for-review')), [1, 2])
+        self.assertEqual(ids(search.flag_filter(t.c.id, f.c, 'contains', search.bound_value('contains', 'view'))), [1, 2])
+
+        ## another flag, or none at all, as the bitmap index has it
+        self.assertEqual(ids(search.flag_filter(t.c.id, f.c, 'ne', 'for-review')), [1, 3, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(ids(search.flag_filter(t.c.id, f.c, 'ne', 'completed')), [1, 2, 3, 5, 6, 7, 8, 9, 10])
+
+        ## sorted on its first flag, each event comes once, across pages
+        keys  = [(search.flag_sort(t.c.id, f.c), 'desc'), (t.c.id, 'asc')]
+        query = self.session.query(keys[0][0], t.c.id).filter(first_ten)
+        found, cursor = [], None
+        while True:
+            rows, cursor = keyset.page(query, keys, cursor, 3)
+            found.extend(x[-1] for x in rows)
+            if cursor is None:
+                break
+        self.assertEqual(found, [2, 1, 4, 3, 5, 6, 7, 8, 9, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.solr_client import SolrClient, SolrError
+from solr_stub import SolrStub, make_docs
+
+## scripts/solr.py, loaded by path so scripts/ doesn't shadow our context module
+spec = importlib.util.spec_from_file_location('scripts_solr',
+    os.path.join(os.path.dirname(__file__), '..', 'scripts', 'solr.py'))
+scripts_solr = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scripts_solr)
+
+class SolrClientTest(unittest.TestCase):
+    def setUp(self):
+        self.docs = make_docs(50)
+        self.stub = SolrStub(self.docs).start()
+        self.solr = SolrClient(self.stub.url, timeout = 2, retries = 1)
+
+    def tearDown(self):
+        self.stub.stop()
+
+    ## Tests
+    def test_keepalive(self):
+        for d in self.docs[:10]:
+            res = self.solr.select({'q': 'id:"%s"' % d['id']})
+            self.assertEqual(res['response']['docs'][0]['id'], d['id'])
+
+        ## ten requests over a single connection
+        self.assertEqual(self.stub.requests, 10)
+        self.assertEqual(self.stub.connections, 1)
+
+    def test_get_by_ids_batches(self):
+        ids  = [d['id'] for d in self.docs] + ['missing']
+        docs = self.solr.get_by_ids(ids, chunk_size = 20)
+
+        self.assertEqual(len(docs), 50)
+        self.assertNotIn('missing', docs)
+        self.assertEqual(self.stub.requests, 3)
+
+    def test_cursor_paging(self):
+        sobj = scripts_solr.Solr(rows = 7)
+        sobj.setSolrURL('%s/select' % self.stub.url)
+
+        docs = list(sobj.iterDocuments('*:*', verbose = False))
+        self.assertEqual(sorted(d['id'] for d in docs), sorted(d['id'] for d in self.docs))
+
+        ## 8 pages with documents, and one more to see the cursor stop
+        self.assertEqual(self.stub.requests, 9)
+
+    def test_concurrent_id_chunks(self):
+        sobj = scripts_solr.Solr(workers = 3)
+        sobj.setSolrURL(self.stub.url)
+
+        ids  = [d['id'] for d in self.docs]
+        docs = sobj.getDocumentsFromIDs(ids, maxclauses = 8)
+        self.assertEqual(sorted(d['id'] for d in docs), sorted(ids))
+        self.assertEqual(sobj.getResultsFound('*:*'), 50)
+
+    def test_unreachable(self):
+        self.stub.stop()
+        with self.assertRaises(SolrError):
+            self.solr.select({'q': '*:*'})
+        self.assertEqual(self.solr.stats()['failures'], 1)
+
+        ## so tearDown has something to stop
+        self.stub = SolrStub([]).start()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from sqlalchemy import Column, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from modules.cache import Generation
+from modules.users import UserDirectory, detached, users_changed
+
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = 'user'
+    id        = Column(Integer, primary_key = True)
+    username  = Column(String(64), nullable = False)
+    password  = Column(String(64), nullable = False)
+    authlevel = Column(Integer, nullable = False)
+
+    def __init__(self, username, password, authlevel):
+        self.username  = username
+        self.password  = password
+        self.authlevel = authlevel
+
+class UsersTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind = self.engine)()
+        self.session.add_all([User('admin', 'x', 3), User('coder1', 'y', 1), User('coder2', 'z', 1)])
+        self.session.commit()
+
+        self.directory = UserDirectory(self.session.query(User.id, User.username, User.password, User.authlevel).all())
+        self.session.close()
+
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    ## Tests
+    def test_lookups(self):
+        self.assertEqual(self.directory.names(), {1: 'admin', 2: 'coder1', 3: 'coder2'})
+        self.assertEqual(self.directory.ids()['coder2'], 3)
+        self.assertEqual(self.directory.username(2), 'coder1')
+        self.assertIsNone(self.directory.username(99))
+        self.assertEqual([x.username for x in self.directory.rows() if x.authlevel == 1], ['coder1', 'coder2'])
+
+    def test_merge_without_query(self):
+        user = self.session.merge(detached(User, self.directory.get(2)), load = False)
+        self.assertEqual((user.id, user.username, user.authlevel), (2, 'coder1', 1))
+        self.assertIn(user, self.session)
+        self.assertEqual(self.statements, [])
+
+        ## it is the same object the session would load
+        self.assertIs(self.session.query(User).get(2), user)
+
+    def test_users_changed(self):
+        path = tempfile.mkdtemp()
+        try:
+            ## a worker's generation, and a script writing users with its own session
+            generation = Generation(path, 'users')
+            token = generation.current()
+            users_changed(path)
+            self.assertNotEqual(generation.current(), token)
+        finally:
+            shutil.rmtree(path)
+
+        ## without a shared directory there is nothing to bump
+        users_changed(None)
+
+
+if __name__ == "__main__":
+    unittest.main()